@@ -0,0 +1,149 @@
+"""
+Columnar diff of numeric attributes of Icinga1 and Icinga2 objects.
+
+Objects are aligned once, compared attributes are loaded into one NumPy array per
+attribute and side, and differences are found with vectorized comparisons.
+Requires numpy (pip install icinga-migration-utils[columnar]).
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Icinga1 intervals are configured in minutes (interval_length 60), Icinga2 in seconds
+MINUTES = 60
+
+
+class AttributeMapping(object):
+    """
+    Numeric attribute to compare, with unit conversion to a common unit.
+
+    Example:
+        AttributeMapping('check_interval', icinga1_factor=MINUTES)
+        AttributeMapping('notification_interval', icinga1_attr='notification_interval',
+                         icinga2_attr='interval', icinga1_factor=MINUTES)
+    """
+
+    def __init__(self, name, icinga1_attr=None, icinga2_attr=None, icinga1_factor=1,
+                 icinga2_factor=1):
+        """
+        :param name: name of the difference in results
+        :param icinga1_attr: Icinga1 attribute, defaults to name
+        :param icinga2_attr: Icinga2 attribute (in attrs), defaults to name
+        :param icinga1_factor: factor to convert Icinga1 values to the common unit
+        :param icinga2_factor: factor to convert Icinga2 values to the common unit
+        """
+        self.name = name
+        self.icinga1_attr = icinga1_attr or name
+        self.icinga2_attr = icinga2_attr or name
+        self.icinga1_factor = icinga1_factor
+        self.icinga2_factor = icinga2_factor
+
+    def __repr__(self):
+        return 'AttributeMapping({})'.format(self.name)
+
+
+HOST_ATTRIBUTES = [
+    AttributeMapping('check_interval', icinga1_factor=MINUTES),
+    AttributeMapping('max_check_attempts'),
+    AttributeMapping('retry_interval', icinga1_factor=MINUTES),
+]
+
+SERVICE_ATTRIBUTES = list(HOST_ATTRIBUTES)
+
+
+def _import_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("Columnar compare requires numpy "
+                          "(pip install icinga-migration-utils[columnar])")
+    return numpy
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
+
+
+def align_hosts(icinga1_hosts, icinga2_hosts):
+    """
+    Align hosts by name
+
+    :param icinga1_hosts: Icinga1 hosts by hostname
+    :param icinga2_hosts: Icinga2 hosts by hostname
+    :return: (pairs [(hostname, icinga1 host, icinga2 attrs)], hostnames missing in Icinga2)
+    :rtype: tuple
+    """
+    pairs = []
+    missing = []
+    for hostname in sorted(icinga1_hosts):
+        icinga2_host = icinga2_hosts.get(hostname)
+        if icinga2_host is None:
+            missing.append(hostname)
+        else:
+            pairs.append((hostname, icinga1_hosts[hostname], icinga2_host['attrs']))
+    return pairs, missing
+
+
+def align_services(icinga1_services_by_host, service_index):
+    """
+    Align services by host and matching check command (see matching.ServiceIndex)
+
+    :param icinga1_services_by_host: Icinga1 services by hostname
+    :param service_index: ServiceIndex of Icinga2 services
+    :return: (pairs [('host!service_description', icinga1 service, icinga2 attrs)],
+              keys of services missing in Icinga2)
+    :rtype: tuple
+    """
+    pairs = []
+    missing = []
+    for hostname in sorted(icinga1_services_by_host):
+        for service in icinga1_services_by_host[hostname]:
+            key = '{}!{}'.format(hostname, service['service_description'])
+            matches = service_index.find(
+                hostname, check_command_extracted=service['check_command_extracted'],
+                comment=service.get('check_command'))
+            if matches:
+                pairs.append((key, service, matches[0]['attrs']))
+            else:
+                missing.append(key)
+    return pairs, missing
+
+
+def diff_columns(pairs, attributes):
+    """
+    Diff numeric attributes of aligned objects.
+    Values that are missing or not numeric on both sides are equal.
+
+    :param pairs: [(key, icinga1 object, icinga2 attrs)] (see align_hosts/align_services)
+    :param attributes: AttributeMapping list
+    :return: {attribute name: [(key, icinga1 value, icinga2 value)]} with raw values
+    :rtype: dict
+    """
+    numpy = _import_numpy()
+    result = {}
+    if not pairs:
+        return dict((attribute.name, []) for attribute in attributes)
+
+    for attribute in attributes:
+        icinga1_values = [icinga1_object.get(attribute.icinga1_attr)
+                          for _, icinga1_object, _ in pairs]
+        icinga2_values = [icinga2_attrs.get(attribute.icinga2_attr)
+                          for _, _, icinga2_attrs in pairs]
+        icinga1_column = numpy.fromiter(
+            (_to_float(value) for value in icinga1_values), float, len(pairs))
+        icinga2_column = numpy.fromiter(
+            (_to_float(value) for value in icinga2_values), float, len(pairs))
+        icinga1_column *= attribute.icinga1_factor
+        icinga2_column *= attribute.icinga2_factor
+
+        different = (icinga1_column != icinga2_column) & \
+            ~(numpy.isnan(icinga1_column) & numpy.isnan(icinga2_column))
+        result[attribute.name] = [
+            (pairs[i][0], icinga1_values[i], icinga2_values[i])
+            for i in numpy.flatnonzero(different)]
+        logger.debug("{}: {} of {} different"
+                     .format(attribute.name, len(result[attribute.name]), len(pairs)))
+    return result
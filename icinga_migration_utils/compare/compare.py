@@ -3,29 +3,50 @@ Utilities to compare Icinga1 and Icinga2 config.
 Serves more for demonstration purposes - most of this is highly related to the
 configuration as used by SysEleven.
 """
-import csv
 import json
 import logging
-import re
 import sys
 import textwrap
-from collections import defaultdict, Counter
+from collections import Counter, OrderedDict, defaultdict
 from datetime import datetime
 
-import progressbar
-
-from icinga_migration_utils.icinga1.icinga1 import Icinga1Config
-from icinga_migration_utils.icinga2.icinga2 import Icinga2Config
+from icinga_migration_utils.compare.columnar import (HOST_ATTRIBUTES, SERVICE_ATTRIBUTES,
+                                                     align_hosts, align_services,
+                                                     diff_columns)
+from icinga_migration_utils.compare.contacts import diff_contacts
+from icinga_migration_utils.compare.downtimes import (EXACT, ICINGA1_UNMATCHED,
+                                                      ICINGA2_UNMATCHED, PARTIAL,
+                                                      match_downtimes)
+from icinga_migration_utils.compare.fingerprint import (changed_hosts, fleet_fingerprint,
+                                                       host_fingerprints,
+                                                       service_fingerprints)
+from icinga_migration_utils.compare.sinks import JsonSink, MultiSink, TextSink
+from icinga_migration_utils.compare.state import (CompareState, host_input_digest,
+                                                 service_input_digest)
+from icinga_migration_utils.defaults import default_icinga1, default_icinga2
+from icinga_migration_utils.matching import ServiceIndex, get_comment
 from icinga_migration_utils.migrate import MIGRATION_COMMENT_SUFFIX
-from icinga_migration_utils.utils import format_date, ndict
+from icinga_migration_utils.session import MigrationSession
+from icinga_migration_utils.utils import BatchWriter, emit_yaml, format_date, getpath
+
+logger = logging.getLogger(__name__)
 
-from ruamel import yaml
+# Output formats
+TEXT = 'text'
+JSONL = 'jsonl'
+YAML = 'yaml'
 
 
-logger = logging.getLogger(__name__)
+def _session(icinga1, icinga2, session):
+    if session is None:
+        return MigrationSession(icinga1 or default_icinga1(), icinga2 or default_icinga2())
+    if icinga1 is None and icinga2 is None:
+        return session
+    return MigrationSession(icinga1 or session.icinga1, icinga2 or session.icinga2)
 
 
-def compare_hosts(icinga1=Icinga1Config(), icinga2=Icinga2Config()):
+def compare_hosts(icinga1=None, icinga2=None, columnar=False, attributes=None,
+                  skip_identical=True, state_file=None, sink=None, session=None):
     """
     Compare hosts:
     * check if hosts exist in Icinga2
@@ -34,32 +55,114 @@ def compare_hosts(icinga1=Icinga1Config(), icinga2=Icinga2Config()):
     * Compare max_check_attempts
     * Compare retry_interval
 
-    :param icinga1: Icinga1Config
-    :param icinga2: Icinga2Config
-    :return:
+    :param icinga1: Icinga1Config (shared default if not set)
+    :param icinga2: Icinga2Config (shared default if not set)
+    :param columnar: compare numeric attributes vectorized (requires numpy)
+    :param attributes: AttributeMapping list to compare in columnar mode,
+                       defaults to columnar.HOST_ATTRIBUTES
+    :param skip_identical: only diff hosts with different fingerprints
+                           (not with custom attributes)
+    :param state_file: compare state of the last run (see compare.state), only hosts
+                       with changed inputs are diffed again
+    :param sink: result sink (see compare.sinks). Differences are written to the sink
+                 instead of being returned, hosts are written as they are diffed (unless
+                 columnar or state_file is set)
+    :param session: MigrationSession to share fetched data with other functions
+    :return: {difference: [hostname or (hostname, Icinga1 value, Icinga2 value)]},
+             {difference: count} if sink is set
     """
-    icinga1_hosts = icinga1.get_hosts_dict()
-    icinga2_hosts = icinga2.get_hosts_dict()
+    session = _session(icinga1, icinga2, session)
+    icinga1_hosts = session.icinga1_hosts_dict()
+    icinga2_hosts = session.icinga2_hosts_dict()
+
+    state = None
+    if state_file:
+        state = CompareState(state_file)
+        digests = dict((hostname, host_input_digest(host, icinga2_hosts.get(hostname)))
+                       for hostname, host in icinga1_hosts.items())
+        reused = state.reuse(digests)
+        icinga1_hosts = dict((hostname, host) for hostname, host in icinga1_hosts.items()
+                             if hostname not in reused)
+
+    if skip_identical and not attributes:
+        icinga1_hosts = _skip_identical(icinga1_hosts, *host_fingerprints(
+            icinga1_hosts, dict((hostname, host) for hostname, host in icinga2_hosts.items()
+                                if hostname in icinga1_hosts)))
+
+    if sink and not columnar and state is None:
+        counts = Counter()
+        for hostname, differences in _iter_hosts_detailed(icinga1_hosts, icinga2_hosts):
+            sink.write('hosts', hostname, differences)
+            counts.update(dict((key, len(entries)) for key, entries in differences.items()))
+        sink.flush()
+        return dict(counts)
+
+    if columnar:
+        result = _compare_hosts_columnar(icinga1_hosts, icinga2_hosts,
+                                         attributes or HOST_ATTRIBUTES)
+    else:
+        result = _compare_hosts_detailed(icinga1_hosts, icinga2_hosts)
+
+    if state is not None:
+        for hostname in sorted(reused):
+            for key, entries in reused[hostname].items():
+                for entry in entries:
+                    entry = entry if isinstance(entry, str) else tuple(entry)
+                    _print_host_difference(key, entry)
+                    result[key].append(entry)
+        for entries in result.values():
+            entries.sort(key=lambda entry: entry if isinstance(entry, str) else entry[0])
+
+        delta = state.update(digests, _group_by_name(result))
+        state.save()
+        logger.info("Hosts changed since last run: {} new, {} changed, {} resolved".format(
+            len(delta['new']), len(delta['changed']), len(delta['resolved'])))
+
+    if sink:
+        _write_grouped(sink, 'hosts', result)
+        return dict((key, len(entries)) for key, entries in result.items() if entries)
+    return result
+
+
+def _group_by_name(result):
+    """
+    Group differences by object name
+
+    :param result: {difference: [name or (name, icinga1 value, icinga2 value)]}
+    :return: {name: {difference: [entry]}}
+    :rtype: OrderedDict
+    """
+    grouped = OrderedDict()
+    for key, entries in result.items():
+        for entry in entries:
+            name = entry if isinstance(entry, str) else entry[0]
+            grouped.setdefault(name, defaultdict(list))[key].append(entry)
+    return grouped
 
-    result = defaultdict(list)
 
+def _write_grouped(sink, compare, result):
+    for name, differences in _group_by_name(result).items():
+        sink.write(compare, name, differences)
+    sink.flush()
+
+
+def _iter_hosts_detailed(icinga1_hosts, icinga2_hosts):
+    """
+    Diff hosts one by one
+
+    :return: (hostname, {difference: [entry]}) tuples of hosts with differences
+    """
     compare_attributes = ['check_interval', 'max_check_attempts', 'retry_interval']
 
     for hostname in sorted(icinga1_hosts):
+        differences = defaultdict(list)
         if hostname not in icinga2_hosts:
-            result['missing'].append(hostname)
+            differences['missing'].append(hostname)
             print("{}: {}".format('Missing in Icinga2', hostname))
         else:
             icinga1_host = icinga1_hosts[hostname]
             icinga2_host = icinga2_hosts[hostname]
-
-            if icinga1_host.get('notes') == 'no-sla' \
-                    and not ndict(icinga2_host)['attrs']['vars']['nosla']:
-                result['nosla'].append(hostname)
-                print("{}: {} (Icinga1: {}, Icinga2: {})".format(
-                    "Different SLA: ", hostname,
-                    icinga1_host.get('notes') == 'no-sla',
-                    'nosla' in icinga2_host['attrs']['vars']))
+            _compare_host_sla(differences, hostname, icinga1_host, icinga2_host['attrs'])
 
             for attrib in compare_attributes:
                 icinga1_attrib = float(icinga1_host[attrib])
@@ -69,16 +172,284 @@ def compare_hosts(icinga1=Icinga1Config(), icinga2=Icinga2Config()):
                     icinga1_attrib *= 60
 
                 if icinga1_attrib != icinga2_attrib:
-                    result[attrib].append((hostname, icinga1_host[attrib],
-                                           icinga2_host['attrs'][attrib]))
-                    print("{}: {} (Icinga1: {}, Icinga2: {})".format(
-                        "Different {} ".format(attrib), hostname, icinga1_host[attrib],
-                        icinga2_host['attrs'][attrib]))
+                    differences[attrib].append((hostname, icinga1_host[attrib],
+                                                icinga2_host['attrs'][attrib]))
+                    _print_host_difference(attrib, differences[attrib][-1])
+        if differences:
+            yield hostname, differences
+
+
+def _compare_hosts_detailed(icinga1_hosts, icinga2_hosts):
+    result = defaultdict(list)
+    for hostname, differences in _iter_hosts_detailed(icinga1_hosts, icinga2_hosts):
+        for key, entries in differences.items():
+            result[key].extend(entries)
+    return result
+
+
+def _print_host_difference(key, entry):
+    """
+    Print compare_hosts difference
+
+    :param key: 'missing', 'nosla' or attribute
+    :param entry: hostname or (hostname, Icinga1 value, Icinga2 value)
+    """
+    if key == 'missing':
+        print("{}: {}".format('Missing in Icinga2', entry))
+    elif key == 'nosla':
+        print("{}: {} (Icinga1: {}, Icinga2: {})".format("Different SLA: ", entry, True, False))
+    else:
+        print("{}: {} (Icinga1: {}, Icinga2: {})".format(
+            "Different {} ".format(key), *entry))
+
+
+def _skip_identical(objects, icinga1_fingerprints, icinga2_fingerprints):
+    """
+    Remove hosts with identical fingerprints
+
+    :param objects: by hostname
+    :return: objects of changed hosts
+    """
+    if fleet_fingerprint(icinga1_fingerprints) == fleet_fingerprint(icinga2_fingerprints):
+        logger.info("No drift: fingerprints of all {} hosts match".format(len(objects)))
+        return {}
+    changed = changed_hosts(icinga1_fingerprints, icinga2_fingerprints)
+    logger.info("{} of {} hosts have different fingerprints"
+                .format(len(changed & set(objects)), len(objects)))
+    return dict((hostname, value) for hostname, value in objects.items() if hostname in changed)
+
+
+def _compare_host_sla(result, hostname, icinga1_host, icinga2_attrs):
+    if icinga1_host.get('notes') == 'no-sla' \
+            and not getpath(icinga2_attrs, 'vars.nosla'):
+        result['nosla'].append(hostname)
+        print("{}: {} (Icinga1: {}, Icinga2: {})".format(
+            "Different SLA: ", hostname,
+            icinga1_host.get('notes') == 'no-sla',
+            'nosla' in (icinga2_attrs.get('vars') or {})))
+
+
+def _print_columnar_result(result, attributes):
+    for attribute in attributes:
+        for entry in result[attribute.name]:
+            _print_host_difference(attribute.name, entry)
+
+
+def _compare_hosts_columnar(icinga1_hosts, icinga2_hosts, attributes):
+    result = defaultdict(list)
+    pairs, result['missing'] = align_hosts(icinga1_hosts, icinga2_hosts)
+    for hostname in result['missing']:
+        print("{}: {}".format('Missing in Icinga2', hostname))
+    for hostname, icinga1_host, icinga2_attrs in pairs:
+        _compare_host_sla(result, hostname, icinga1_host, icinga2_attrs)
+
+    result.update(diff_columns(pairs, attributes))
+    _print_columnar_result(result, attributes)
+    return result
+
+
+def compare_service_attributes(icinga1=None, icinga2=None, hostname=None, attributes=None,
+                               sink=None, session=None):
+    """
+    Compare numeric service attributes (columnar, requires numpy).
+    Services are matched by extracted check command or comment.
+
+    :param icinga1: Icinga1Config (shared default if not set)
+    :param icinga2: Icinga2Config (shared default if not set)
+    :param hostname: hostname
+    :param attributes: AttributeMapping list, defaults to columnar.SERVICE_ATTRIBUTES
+    :param sink: result sink (see compare.sinks)
+    :param session: MigrationSession to share fetched data with other functions
+    :return: {'missing': ['host!service_description'],
+              attribute name: [('host!service_description', icinga1 value, icinga2 value)]}
+    """
+    session = _session(icinga1, icinga2, session)
+    icinga1, icinga2 = session.icinga1, session.icinga2
+    attributes = attributes or SERVICE_ATTRIBUTES
+    icinga1_services = icinga1.get_services_by_hostname(hostname=hostname)
+    icinga2_services = icinga2.get_services_by_hostname(host_name=hostname, lazy=True)
+
+    result = defaultdict(list)
+    pairs, result['missing'] = align_services(icinga1_services, ServiceIndex(icinga2_services))
+    for key in result['missing']:
+        print("{}: {}".format('Missing in Icinga2', key))
+
+    result.update(diff_columns(pairs, attributes))
+    _print_columnar_result(result, attributes)
+    if sink:
+        _write_grouped(sink, 'service_attributes', result)
     return result
 
 
-def compare_services(output=None, hostname=None, icinga1=Icinga1Config(),
-                     icinga2=Icinga2Config()):
+def diff_host_services(icinga1_services, icinga1_service_states, icinga2_services):
+    """
+    Diff services of one host. Services are matched by check_command_extracted.
+
+    :param icinga1_services: Icinga1 services of host
+    :param icinga1_service_states: Icinga1 service status of host
+    :param icinga2_services: Icinga2 services of host
+    :return: differences (empty dict if there are none):
+             icinga1_missing_icinga2, notification_states, nosla_diff, notesurl_diff
+    :rtype: dict
+    """
+    # compare extracted check commands
+    icinga1_check_commands = [service['check_command_extracted']
+                              for service in icinga1_services]
+    icinga2_check_commands = [service['check_command_extracted']
+                              for service in icinga2_services]
+
+    # Check services missing by using extracted check_command as key,
+    # filter checks with same comment (once per comment)
+    icinga2_check_commands_set = set(icinga2_check_commands)
+    icinga2_comments = Counter(get_comment(service) for service in icinga2_services)
+    icinga1_missing_icinga2 = []
+    for check_command in icinga1_check_commands:
+        if check_command in icinga2_check_commands_set:
+            continue
+        if icinga2_comments[check_command] > 0:
+            icinga2_comments[check_command] -= 1
+            continue
+        icinga1_missing_icinga2.append(check_command)
+
+    # First service per check command
+    services_icinga1 = {}
+    for service in icinga1_services:
+        services_icinga1.setdefault(service['check_command_extracted'], service)
+    services_icinga2 = {}
+    for service in icinga2_services:
+        services_icinga2.setdefault(service['check_command_extracted'], service)
+    states_icinga1 = {}
+    for state in icinga1_service_states:
+        states_icinga1.setdefault((state['check_command'], state['service_description']), state)
+
+    # Compare notification state if service exists in both systems
+    notification_states = {}
+    nosla_diff = {}
+    notesurl_diff = {}
+
+    for check_command in OrderedDict.fromkeys(icinga1_check_commands + icinga2_check_commands):
+        service_icinga1 = services_icinga1.get(check_command)
+        service_icinga2 = services_icinga2.get(check_command)
+        if not service_icinga1 or not service_icinga2:
+            continue
+
+        icinga1_description = service_icinga1['service_description']
+        icinga1_check_command = service_icinga1['check_command']
+        key = '{} - {}'.format(icinga1_check_command, icinga1_description)
+
+        # Use Icinga1 notifications_enabled from state if exists, otherwise from config.
+        # The object cache has the same '0'/'1' notifications_enabled key as the status
+        # cache (there is no enable_notifications key in Icinga1).
+        icinga1_state = states_icinga1.get((icinga1_check_command, icinga1_description))
+        if icinga1_state:
+            icinga1_notifications_enabled = icinga1_state['notifications_enabled'] == '1'
+        else:
+            icinga1_notifications_enabled = service_icinga1['notifications_enabled'] == '1'
+
+        # If state was modified at runtime, use original state from config
+        # (original_attributes is None for objects never modified at runtime)
+        icinga2_attrs = service_icinga2['attrs']
+        icinga2_notifications_enabled = (icinga2_attrs.get('original_attributes') or {}).get(
+            'enable_notifications', icinga2_attrs['enable_notifications'])
+
+        if icinga1_notifications_enabled != icinga2_notifications_enabled:
+            notification_states[key] = (icinga1_notifications_enabled,
+                                        icinga2_notifications_enabled)
+
+        # compare sla
+        icinga1_nosla = service_icinga1.get('notes', False) == 'no-sla'
+        icinga2_nosla = getpath(service_icinga2, 'attrs.vars.nosla', False)
+        if icinga1_nosla != icinga2_nosla:
+            nosla_diff[key] = (icinga1_nosla, icinga2_nosla)
+
+    host_diff = {}
+    if icinga1_missing_icinga2 or notification_states or nosla_diff:
+        if icinga1_missing_icinga2:
+            host_diff['icinga1_missing_icinga2'] = icinga1_missing_icinga2
+        for name, differences in [('notification_states', notification_states),
+                                  ('nosla_diff', nosla_diff),
+                                  ('notesurl_diff', notesurl_diff)]:
+            if differences:
+                host_diff[name] = [
+                    {'command': key, 'icinga1': value[0], 'icinga2': value[1]}
+                    for key, value in differences.items()]
+    return host_diff
+
+
+def _diff_services_shard(shard):
+    """
+    Diff services for a list of hosts (runs in worker processes)
+
+    :param shard: (hostname, icinga1_services, icinga1_service_states, icinga2_services)
+    :return: (hostname, host_diff) tuples
+    """
+    return [(hostname, diff_host_services(*args)) for hostname, *args in shard]
+
+
+def _iter_services_diffs(hosts, host_diffs, hosts_to_diff, processes=None):
+    """
+    Diff hosts_to_diff (in worker processes if set), yield diffs in order of hosts.
+    Diffs of other hosts are taken from host_diffs (empty if not found).
+
+    :param hosts: (hostname, icinga1_services, icinga1_service_states, icinga2_services)
+    :param host_diffs: known diffs by hostname
+    :param hosts_to_diff: hosts to diff, in order of hosts
+    :param processes: number of worker processes
+    :return: (hostname, host_diff) tuples
+    """
+    pool = None
+    if processes and processes > 1 and len(hosts_to_diff) > 1:
+        shard_size = max(1, len(hosts_to_diff) // (processes * 4))
+        shards = [hosts_to_diff[i:i + shard_size]
+                  for i in range(0, len(hosts_to_diff), shard_size)]
+        from concurrent.futures import ProcessPoolExecutor
+        pool = ProcessPoolExecutor(max_workers=processes)
+        computed = (host_diff for shard_diffs in pool.map(_diff_services_shard, shards)
+                    for host_diff in shard_diffs)
+    else:
+        computed = (host_diff for host in hosts_to_diff
+                    for host_diff in _diff_services_shard([host]))
+
+    pending = set(host[0] for host in hosts_to_diff)
+    try:
+        for hostname, *_ in hosts:
+            if hostname in pending:
+                yield next(computed)
+            else:
+                yield hostname, host_diffs.get(hostname) or {}
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+def write_services_diff(f, hostname, host_diff):
+    """
+    Write differences of one host as text
+
+    :param f: file handle
+    :param hostname: hostname
+    :param host_diff: diff as returned by diff_host_services
+    """
+    f.write('\n' + hostname + '\n')
+    if host_diff.get('icinga1_missing_icinga2'):
+        f.write("Icinga1 services missing in Icinga2:\n")
+        f.writelines([cmd + '\n' for cmd in host_diff['icinga1_missing_icinga2']])
+        f.write('\n')
+
+    for name, title in [('notification_states', "Different notification states:"),
+                        ('nosla_diff', "Different SLA:"),
+                        ('notesurl_diff', "Different notes_url:")]:
+        if host_diff.get(name):
+            f.write(title + '\n')
+            for difference in host_diff[name]:
+                f.write("Service: {0}, Icinga1: {1}, Icinga2: {2}\n"
+                        .format(difference['command'],
+                                difference['icinga1'],
+                                difference['icinga2']))
+
+
+def compare_services(output=None, hostname=None, icinga1=None, icinga2=None, processes=None,
+                     skip_identical=True, incremental=False, sink=None, session=None):
     """
     Compare Services retrieved from Icinga1 (cache file) and Icinga2 (REST API) per host.
 
@@ -105,182 +476,105 @@ def compare_services(output=None, hostname=None, icinga1=Icinga1Config(),
     :param output: output filename (write to stdout if None)
     :type output: str
     :param hostname: Hostname
-    :param icinga1: Icinga1Config
-    :param icinga2: Icinga2Config
-    :return:
+    :param icinga1: Icinga1Config (shared default if not set)
+    :param icinga2: Icinga2Config (shared default if not set)
+    :param processes: diff hosts in this many worker processes (in-process if not set)
+    :type processes: int
+    :param skip_identical: only diff hosts with different service fingerprints
+    :param incremental: only diff hosts whose inputs changed since the last run, reuse the
+                        stored diff for the others. The state is kept in output.state.json,
+                        changes since the last run are written to output.delta.json
+    :param sink: additional result sink (see compare.sinks), e.g. JsonlSink or CsvSink
+    :param session: MigrationSession to share fetched data with other functions
+    :return: {hostname: differences} if neither output nor sink is set, otherwise only
+             {difference: count} (hosts are written as they are diffed, not kept)
     """
+    session = _session(icinga1, icinga2, session)
     logger.info("Retrieving Icinga1 services")
-    icinga1_services_all = icinga1.get_services_by_hostname()
-    icinga1_service_status_all = icinga1.get_servicestatus_by_host()
+    icinga1_services_all = session.icinga1_services_by_host()
+    icinga1_service_status_all = session.icinga1_servicestatus_by_host()
 
     if hostname:
         icinga1_service_status_all = {hostname: icinga1_service_status_all[hostname]}
 
-    icinga2_hosts = icinga2.get_hosts_dict().keys()
+    icinga2_hosts = session.icinga2_hosts_dict().keys()
     if hostname:
         icinga2_hosts = [hostname]
     logger.info("Got {} hosts from Icinga2 API".format(len(icinga2_hosts)))
 
-    diff = {}
+    # Keep the differences for the return value only if they are not written to a file
+    diff = {} if not output and not sink else None
+    counts = Counter()
     logger.info("Retrieving Icinga2 services from API")
-    icinga2_services_all = icinga2.get_services_by_hostname()
+    icinga2_services_all = session.icinga2_services_by_host()
     icinga2_services_count = sum(
         [len(icinga2_services_all[key]) for key in icinga2_services_all.keys()])
     logger.info("Got {} services from Icinga2 API".format(icinga2_services_count))
     total_diff = 0
 
-    if output:
-        f = open(output, 'w')
-    else:
-        f = sys.stdout
-
-    for icinga2_hostname in icinga2_hosts:
-        icinga1_services = icinga1_services_all[icinga2_hostname]
-        icinga1_service_states = icinga1_service_status_all[icinga2_hostname]
-        icinga2_services = icinga2_services_all[icinga2_hostname]
-
-        # Filter out nrpe checks on Icinga2
-        icinga2_services = [service for service in icinga2_services
-                            if service['attrs']['name'] != 'nrpe-health']
-
-        # compare extracted check commands
-        icinga1_check_commands = [service['check_command_extracted']
-                                  for service in icinga1_services]
-        icinga2_check_commands = [service['check_command_extracted']
-                                  for service in icinga2_services]
-
-        # Check services missing by using extracted check_command as key
-        icinga1_missing_icinga2 = \
-            [check_command for check_command in icinga1_check_commands
-             if check_command not in icinga2_check_commands]
-
-        # Filter checks with same comment
-        for icinga2_comment in [ndict(service)['attrs']['vars']['comment']
-                                for service in icinga2_services]:
-            try:
-                icinga1_missing_icinga2.remove(icinga2_comment)
-            except ValueError:
-                pass
-
-        # Compare notification state if service exists in both systems
-        notification_states = {}
-        nosla_diff = {}
-        notesurl_diff = {}
-
-        for check_command in icinga1_check_commands + icinga2_check_commands:
-            service_icinga1 = [service for service in icinga1_services
-                               if service['check_command_extracted'] == check_command]
-            service_icinga2 = [service for service in icinga2_services
-                               if service['check_command_extracted'] == check_command]
-
-            if service_icinga1 and service_icinga2:
-
-                icinga1_description = service_icinga1[0]['service_description']
-                icinga1_check_command = service_icinga1[0]['check_command']
-                key = '{} - {}'.format(icinga1_check_command, icinga1_description)
-
-                # Use Icinga1 enable_notifications from state if exists, otherwise from config
-                icinga1_state = [
-                    state for state in icinga1_service_states
-                    if state['check_command'] == icinga1_check_command
-                    and state['service_description'] == icinga1_description
-                ]
-                if icinga1_state:
-                    icinga1_notifications_enabled = \
-                        icinga1_state[0]['notifications_enabled'] == '1'
-                else:
-                    icinga1_notifications_enabled = service_icinga1[0]['enable_notifications']
-
-                # If state was modified at runtime, use original state from config
-                try:
-                    icinga2_notifications_enabled = service_icinga2[0]['attrs']['original_attributes']['enable_notifications']
-                except KeyError:
-                    icinga2_notifications_enabled = service_icinga2[0]['attrs']['enable_notifications']
-
-                if icinga1_notifications_enabled != icinga2_notifications_enabled:
-                    notification_states[key] = (icinga1_notifications_enabled,
-                                                icinga2_notifications_enabled)
-
-                # compare sla
-                icinga1_nosla = service_icinga1[0].get('notes', False) == 'no-sla'
-                icinga2_nosla = False
-                try:
-                    icinga2_nosla = service_icinga2[0]['attrs']['vars']['nosla']
-                except:
-                    pass
-                if icinga1_nosla != icinga2_nosla:
-                    nosla_diff[key] = (icinga1_nosla, icinga2_nosla)
-
-                # compare notes url. no diff if confluence entry is in Icinga2
-                icinga1_notes = service_icinga1[0].get('notes_url', '')
-                icinga2_notes = service_icinga2[0]['attrs']['notes_url']
-
-        # Write results to file
-        if icinga1_missing_icinga2 or notification_states or nosla_diff:
-            f.write('\n' + icinga2_hostname + '\n')
-            diff[icinga2_hostname] = {}
-            diff[icinga2_hostname]['host_name'] = icinga2_hostname
-
-            if icinga1_missing_icinga2:
-                diff[icinga2_hostname]['icinga1_missing_icinga2'] = icinga1_missing_icinga2
-                f.write("Icinga1 services missing in Icinga2:\n")
-                f.writelines([cmd + '\n' for cmd in icinga1_missing_icinga2])
-                f.write('\n')
-
-            if notification_states:
-                f.write("Different notification states:\n")
-                diff[icinga2_hostname]['notification_states'] = []
-                for key in notification_states:
-                    diff[icinga2_hostname]['notification_states'].extend({
-                        'command': key,
-                        'icinga1': notification_states[key][0],
-                        'icinga2': notification_states[key][1]
-                    })
-                    f.write("Service: {0}, Icinga1: {1}, Icinga2: {2}\n"
-                            .format(key,
-                                    notification_states[key][0],
-                                    notification_states[key][1]))
-            if nosla_diff:
-                f.write("Different SLA:\n")
-                diff[icinga2_hostname]['nosla_diff'] = []
-                for key in nosla_diff:
-                    diff[icinga2_hostname]['nosla_diff'].extend({
-                        'command': key,
-                        'icinga1': nosla_diff[key][0],
-                        'icinga2': nosla_diff[key][1]
-                    })
-                    f.write("Service: {0}, Icinga1: {1}, Icinga2: {2}\n"
-                            .format(key,
-                                    nosla_diff[key][0],
-                                    nosla_diff[key][1]))
-
-            if notesurl_diff:
-                f.write("Different notes_url:\n")
-                diff[icinga2_hostname]['notesurl_diff'] = []
-                for key in notesurl_diff:
-                    diff[icinga2_hostname]['notesurl_diff'].extend({
-                        'command': key,
-                        'icinga1': notesurl_diff[key][0],
-                        'icinga2': notesurl_diff[key][1]
-                    })
-                    f.write("Service: {0}, Icinga1: {1}, Icinga2: {2}\n"
-                            .format(key,
-                                    notesurl_diff[key][0],
-                                    notesurl_diff[key][1]))
-
-            total_diff += len(icinga1_missing_icinga2 +
-                              list(notification_states.keys()))
+    # Filter out nrpe checks on Icinga2
+    hosts = [
+        (icinga2_hostname,
+         icinga1_services_all[icinga2_hostname],
+         icinga1_service_status_all.get(icinga2_hostname, []),
+         [service for service in icinga2_services_all[icinga2_hostname]
+          if service['attrs']['name'] != 'nrpe-health'])
+        for icinga2_hostname in icinga2_hosts]
+
+    state = None
+    host_diffs = {}
+    hosts_to_diff = hosts
+    if incremental:
+        if not output or hostname:
+            raise ValueError("Incremental compare requires an output file and all hosts")
+        state = CompareState(output + '.state.json')
+        digests = OrderedDict((host[0], service_input_digest(*host[1:])) for host in hosts)
+        host_diffs.update(state.reuse(digests))
+        hosts_to_diff = [host for host in hosts if host[0] not in host_diffs]
+
+    if skip_identical:
+        hosts_to_diff = list(_skip_identical(
+            dict((host[0], host) for host in hosts_to_diff),
+            *service_fingerprints(hosts_to_diff)).values())
+
+    text_sink = TextSink(output, formatter=write_services_diff)
+    json_sink = JsonSink(output + '.json') if output else None
+    sinks = MultiSink([text_sink, json_sink, sink])
+
+    # Write results as soon as they are computed
+    for icinga2_hostname, host_diff in _iter_services_diffs(
+            hosts, host_diffs, hosts_to_diff, processes):
+        if state is not None:
+            host_diffs[icinga2_hostname] = host_diff
+        if host_diff:
+            sinks.write('services', icinga2_hostname, host_diff)
+            if diff is not None:
+                diff[icinga2_hostname] = dict(host_name=icinga2_hostname, **host_diff)
+            counts.update(dict((key, len(entries)) for key, entries in host_diff.items()))
+            total_diff += len(host_diff.get('icinga1_missing_icinga2', []) +
+                              host_diff.get('notification_states', []))
 
     logger.info('Found {} service differences'.format(total_diff))
 
-    if output:
-        with open(output + '.json', 'w') as jsonfile:
-            logger.info("Wrote JSON file: {}".format(jsonfile.name))
-            json.dump(diff, jsonfile)
-    return diff
-
-
-def compare_services_manual(hostname=None, icinga1=Icinga1Config(), icinga2=Icinga2Config()):
+    text_sink.close()
+    if json_sink:
+        json_sink.close()
+        logger.info("Wrote JSON file: {}".format(output + '.json'))
+    if sink:
+        sink.flush()
+
+    if state is not None:
+        delta = state.update(digests, host_diffs)
+        state.save()
+        with open(output + '.delta.json', 'w') as jsonfile:
+            logger.info("Wrote changes since last run to {}: {} new, {} changed, {} resolved"
+                        .format(jsonfile.name, len(delta['new']), len(delta['changed']),
+                                len(delta['resolved'])))
+            json.dump(delta, jsonfile)
+    return diff if diff is not None else dict(counts)
+
+
+def compare_services_manual(hostname=None, icinga1=None, icinga2=None, session=None):
     """
     Compare services that cannot be diffed since their check commands are ambiguous.
 
@@ -288,16 +582,19 @@ def compare_services_manual(hostname=None, icinga1=Icinga1Config(), icinga2=Icin
     :param hostname:
     :param icinga1:
     :param icinga2:
+    :param session: MigrationSession to share fetched data with other functions
     :return:
     """
+    session = _session(icinga1, icinga2, session)
+    icinga1, icinga2 = session.icinga1, session.icinga2
     if hostname:
         icinga1_services_all = {hostname: icinga1.get_services(hostname=hostname)}
         icinga2_hostnames = [hostname]
         icinga2_services_all = {hostname: icinga2.get_services(host_name=hostname)}
     else:
-        icinga1_services_all = icinga1.get_services_by_hostname()
-        icinga2_hostnames = icinga2.get_hosts_dict().keys()
-        icinga2_services_all = icinga2.get_services_by_hostname()
+        icinga1_services_all = session.icinga1_services_by_host()
+        icinga2_hostnames = session.icinga2_hosts_dict().keys()
+        icinga2_services_all = session.icinga2_services_by_host()
 
     for hostname in icinga2_hostnames:
         icinga1_services = icinga1_services_all[hostname]
@@ -331,124 +628,175 @@ def compare_services_manual(hostname=None, icinga1=Icinga1Config(), icinga2=Icin
             if icinga2_services:
                 print("Icinga2 - link: {}".format(icinga2.get_url(hostname)))
             for icinga2_service in icinga2_services:
-                icinga2_nosla = False
-                try:
-                    icinga2_nosla = icinga2_service['attrs']['vars']['nosla']
-                except:
-                    pass
+                icinga2_nosla = getpath(icinga2_service, 'attrs.vars.nosla', False)
                 print("\textracted check command: {}; SLA: {}; display name: {}"
                       .format(icinga2_service['check_command_extracted'],
                               icinga2_nosla,
                               icinga2_service['attrs']['display_name']))
 
 
-def compare_downtimes(icinga1=Icinga1Config(), icinga2=Icinga2Config()):
+def _format_downtime(downtime):
+    attrs = downtime.get('attrs', downtime)
+    return "Comment: {}, Start: {}, End: {}".format(
+        attrs['comment'],
+        format_date(datetime.utcfromtimestamp(int(float(attrs['start_time'])))),
+        format_date(datetime.utcfromtimestamp(int(float(attrs['end_time'])))))
+
+
+def _get_icinga2_service_names(session, icinga1_objects):
     """
-    List all downtimes of Icinga1/2, ordered per host
+    Icinga2 service names of the Icinga1 services that objects (downtimes, acks) refer to
 
-    :param icinga1: Icinga1Config
-    :param icinga2: Icinga2Config
-    :return:
+    :param session: MigrationSession
+    :param icinga1_objects: Icinga1 objects with host_name and service_description
+    :return: Icinga2 service name by (hostname, Icinga1 service_description)
+    :rtype: dict
     """
+    keys = set((obj['host_name'], obj['service_description']) for obj in icinga1_objects
+               if obj.get('service_description'))
+    if not keys:
+        return {}
+
+    icinga1_services = dict(
+        ((service['host_name'], service['service_description']), service)
+        for service in session.icinga1_services())
+    icinga2_service_index = session.icinga2_service_index()
+    service_names = {}
+    for key in keys:
+        if key in icinga1_services:
+            services = icinga2_service_index.find(
+                key[0],
+                check_command_extracted=icinga1_services[key]['check_command_extracted'],
+                comment=icinga1_services[key].get('check_command'))
+            if services:
+                service_names[key] = services[0]['attrs']['name']
+    return service_names
+
+
+def compare_downtimes(icinga1=None, icinga2=None, suffix=MIGRATION_COMMENT_SUFFIX,
+                      start_time=None, end_time=None, sink=None, session=None):
+    """
+    Match downtimes of Icinga1/2 per host and service and list exact matches,
+    partially overlapping matches and unmatched downtimes, ordered per host.
+
+    :param icinga1: Icinga1Config (shared default if not set)
+    :param icinga2: Icinga2Config (shared default if not set)
+    :param suffix: migration comment suffix
+    :param start_time: only compare Icinga1 downtimes within this window (unix timestamp)
+    :param end_time: only compare Icinga1 downtimes within this window (unix timestamp)
+    :param sink: result sink (see compare.sinks), differences are keyed by match type
+    :param session: MigrationSession to share fetched data with other functions
+    :return: match result (see compare.downtimes.match_downtimes)
+    :rtype: dict
+    """
+    session = _session(icinga1, icinga2, session)
+    icinga1, icinga2 = session.icinga1, session.icinga2
     output = sys.stdout
 
-    sort_by = 'start_time'
-    icinga1_downtimes = \
-        sorted(icinga1.hostdowntimes + icinga1.servicedowntimes, key=lambda x: x[sort_by])
-    icinga2_downtimes = sorted(icinga2.get_downtimes(), key=lambda x: x['attrs'][sort_by])
-
-    icinga1_hosts = [downtime['host_name'] for downtime in icinga1_downtimes]
-    icinga2_hosts = [downtime['attrs']['host_name'] for downtime in icinga2_downtimes]
-
-    for host in set(icinga1_hosts + icinga2_hosts):
-        downtimes_1 = [downtime for downtime in icinga1_downtimes
-                       if downtime['host_name'] == host]
-        downtimes_2 = [downtime for downtime in icinga2_downtimes
-                       if downtime['attrs']['host_name'] == host]
-
-        if downtimes_1 or downtimes_2:
-            output.write(host + '\n')
-
-        if downtimes_1:
-            output.write("Icinga1:\n")
-            for downtime in downtimes_1:
-                start_time_stamp = datetime.utcfromtimestamp(int(downtime['start_time']))
-                end_time_stamp = datetime.utcfromtimestamp(int(downtime['start_time']))
-                output.write("Comment: {}, Start: {}, End: {}\n"
-                             .format(downtime['comment'],
-                                     format_date(start_time_stamp),
-                                     format_date(end_time_stamp)))
-            output.write('\n')
-
-        if downtimes_2:
-            output.write("Icinga2:\n")
-            for downtime in downtimes_2:
-                start_time_stamp = datetime.utcfromtimestamp(int(downtime['attrs']['start_time']))
-                end_time_stamp = datetime.utcfromtimestamp(int(downtime['attrs']['start_time']))
-                output.write("Comment: {}, Start: {}, End: {}\n"
-                             .format(downtime['attrs']['comment'],
-                                     format_date(start_time_stamp),
-                                     format_date(end_time_stamp)))
-            output.write('\n')
-
-
-def compare_contacts(icinga1=Icinga1Config(), icinga2=Icinga2Config()):
+    if start_time is not None or end_time is not None:
+        icinga1_downtimes = icinga1.get_downtimes_within(
+            start_time or 0, end_time if end_time is not None else sys.maxsize)
+    else:
+        icinga1_downtimes = icinga1.hostdowntimes + icinga1.servicedowntimes
+    icinga2_downtimes = icinga2.get_downtimes()
+
+    service_names = _get_icinga2_service_names(session, icinga1_downtimes)
+    result = match_downtimes(icinga1_downtimes, icinga2_downtimes, service_names, suffix)
+
+    by_host = defaultdict(lambda: defaultdict(list))
+    for match_type in (EXACT, PARTIAL):
+        for icinga1_downtime, icinga2_downtime in result[match_type]:
+            by_host[icinga1_downtime['host_name']][match_type].append(
+                (icinga1_downtime, icinga2_downtime))
+    for downtime in result[ICINGA1_UNMATCHED]:
+        by_host[downtime['host_name']][ICINGA1_UNMATCHED].append(downtime)
+    for downtime in result[ICINGA2_UNMATCHED]:
+        by_host[downtime['attrs']['host_name']][ICINGA2_UNMATCHED].append(downtime)
+
+    for host in sorted(by_host):
+        host_result = by_host[host]
+        output.write(host + '\n')
+        for match_type, title in [(EXACT, "Matching"), (PARTIAL, "Partially matching")]:
+            if host_result[match_type]:
+                output.write(title + ":\n")
+                for icinga1_downtime, icinga2_downtime in host_result[match_type]:
+                    output.write("Icinga1: {}\nIcinga2: {}\n".format(
+                        _format_downtime(icinga1_downtime), _format_downtime(icinga2_downtime)))
+                output.write('\n')
+        for match_type, title in [(ICINGA1_UNMATCHED, "Missing in Icinga2"),
+                                  (ICINGA2_UNMATCHED, "Missing in Icinga1")]:
+            if host_result[match_type]:
+                output.write(title + ":\n")
+                for downtime in sorted(host_result[match_type],
+                                       key=lambda d: float(d.get('attrs', d)['start_time'])):
+                    output.write(_format_downtime(downtime) + '\n')
+                output.write('\n')
+        if sink:
+            sink.write('downtimes', host, dict(
+                (match_type, entries) for match_type, entries in host_result.items() if entries))
+    if sink:
+        sink.flush()
+    return result
+
+
+def compare_contacts(icinga1=None, icinga2=None, sink=None, session=None, normalize=False):
     """
     Compare contacts.
 
     - check if emails from Icinga1 are existing in Icinga2
-    - check if emails and phone numbers (=pager) are correct
+    - check if emails and phone numbers (=pager) are correct, contacts are matched by name
+      or, if renamed, by normalized pager or email
     - check if hosts/services have been assigned the same contacts
-    :param icinga1: Icinga1Config
-    :param icinga2: Icinga2Config
+    :param icinga1: Icinga1Config (shared default if not set)
+    :param icinga2: Icinga2Config (shared default if not set)
+    :param sink: result sink (see compare.sinks)
+    :param session: MigrationSession to share fetched data with other functions
+    :param normalize: ignore formatting differences of pager and email (see diff_contacts)
     :return: compare result
     """
-    diff = defaultdict(list)
-    icinga1_contacts = icinga1.contacts
-    icinga2_contacts = icinga2.get_users()
-
-    for icinga1_contact in icinga1_contacts:
-        icinga2_contact = [icinga2_contact for icinga2_contact in icinga2_contacts
-                           if icinga2_contact['attrs']['name'] == icinga1_contact['contact_name']]
-        if not icinga2_contact:
-            print("Contact missing in Icinga2: alias:'{}', contact_name:'{}', email:'{}'"
-                  .format(icinga1_contact.get('alias', ''), icinga1_contact['contact_name'],
-                          icinga1_contact.get('email', '')))
-
-        if icinga2_contact and 'pager' in icinga1_contact.keys():
-            icinga2_contact = icinga2_contact[0]
-            icinga1_pager = re.sub(r'^00', '', icinga1_contact['pager'])
-            icinga2_pager = icinga2_contact['attrs']['pager']
-
-            if icinga1_pager != icinga2_pager:
-                print("Wrong pager information for {}. Icinga1: {}, Icinga2: {}"
-                      .format(icinga1_contact['contact_name'], icinga1_pager, icinga2_pager))
-                diff['wrong_pager'].append(
-                    (icinga1_contact['contact_name'], icinga1_pager, icinga2_pager))
-
-            icinga1_mail = icinga1_contact.get('email', None)
-            icinga2_mail = ndict(icinga2_contact)['attrs']['email']
-
-            if icinga1_mail and icinga1_mail != icinga2_mail:
-                print("Wrong email information for {}. Icinga1: {}, Icinga2: {}"
-                      .format(icinga1_contact['contact_name'], icinga1_mail, icinga2_mail))
-
-                diff['wrong_email'].append(
-                    (icinga1_contact['contact_name'], icinga1_mail, icinga2_mail))
+    session = _session(icinga1, icinga2, session)
+    icinga1, icinga2 = session.icinga1, session.icinga2
+    icinga1_contacts = dict((contact['contact_name'], contact) for contact in icinga1.contacts)
+    diff = diff_contacts(icinga1_contacts.values(), icinga2.get_users(), normalize=normalize)
+
+    for contact_name in diff['missing']:
+        icinga1_contact = icinga1_contacts[contact_name]
+        print("Contact missing in Icinga2: alias:'{}', contact_name:'{}', email:'{}'"
+              .format(icinga1_contact.get('alias', ''), contact_name,
+                      icinga1_contact.get('email', '')))
+    for contact_name, icinga2_name, matched_by in diff['renamed']:
+        print("Contact {} exists in Icinga2 as {} (matched by {})"
+              .format(contact_name, icinga2_name, matched_by))
+    for contact_name, icinga1_pager, icinga2_pager in diff['wrong_pager']:
+        print("Wrong pager information for {}. Icinga1: {}, Icinga2: {}"
+              .format(contact_name, icinga1_pager, icinga2_pager))
+    for contact_name, icinga1_mail, icinga2_mail in diff['wrong_email']:
+        print("Wrong email information for {}. Icinga1: {}, Icinga2: {}"
+              .format(contact_name, icinga1_mail, icinga2_mail))
+    if sink:
+        _write_grouped(sink, 'contacts', diff)
     return diff
 
 
-def compare_service_contacts(icinga1=Icinga1Config(), icinga2=Icinga2Config(), hostname=None):
+def compare_service_contacts(icinga1=None, icinga2=None, hostname=None, sink=None,
+                             session=None):
     """
     Check if service contacts have been migrated correctly
 
-    :param icinga1: Icinga1Config
-    :param icinga2: Icinga2Config
+    :param icinga1: Icinga1Config (shared default if not set)
+    :param icinga2: Icinga2Config (shared default if not set)
     :param hostname: hostname
+    :param sink: result sink (see compare.sinks)
+    :param session: MigrationSession to share fetched data with other functions
     :return:
     """
+    session = _session(icinga1, icinga2, session)
+    icinga1, icinga2 = session.icinga1, session.icinga2
     icinga1_services = icinga1.get_services(hostname)
-    icinga2_services = icinga2.get_services_by_hostname(host_name=hostname)
+    if hostname:
+        icinga2_service_index = ServiceIndex(icinga2.get_services_by_hostname(host_name=hostname))
+    else:
+        icinga2_service_index = session.icinga2_service_index()
     icinga2_service_notifications = icinga2.get_service_notification_contacts(hostname)
 
     icinga2_contact_excludes = []
@@ -457,6 +805,7 @@ def compare_service_contacts(icinga1=Icinga1Config(), icinga2=Icinga2Config(), h
 
     services_iterator = icinga1_services
     if not hostname:
+        import progressbar
         bar = progressbar.ProgressBar()
         services_iterator = bar(services_iterator)
 
@@ -470,11 +819,10 @@ def compare_service_contacts(icinga1=Icinga1Config(), icinga2=Icinga2Config(), h
                 contact.strip() for contact in icinga1_service.get('contacts').split(',')
             ])
 
-        icinga2_service = [
-            _ for _ in icinga2_services.get(icinga1_service['host_name'], [])
-            if _['check_command_extracted'] == icinga1_service['check_command_extracted']
-            or ndict(_)['attrs']['vars']['comment'] == icinga1_service.get('check_command')
-        ]
+        icinga2_service = icinga2_service_index.find(
+            icinga1_service['host_name'],
+            check_command_extracted=icinga1_service['check_command_extracted'],
+            comment=icinga1_service.get('check_command'))
 
         if icinga2_service:
             icinga2_service = icinga2_service[0]
@@ -492,8 +840,11 @@ def compare_service_contacts(icinga1=Icinga1Config(), icinga2=Icinga2Config(), h
             if icinga1_contacts != ['dummy'] and icinga1_contacts != icinga2_contacts:
                 print("Different notify users for service: {}. Icinga1:{}, Icinga2: {}"
                       .format(service_name, icinga1_contacts, icinga2_contacts))
-                logger.debug("{}".format(icinga1_service))
-                logger.debug("{}".format(icinga2_service))
+                logger.debug(icinga1_service)
+                logger.debug(icinga2_service)
+                if sink:
+                    sink.write('service_contacts', service_name, {
+                        'notify_users': [(key, icinga1_contacts, icinga2_contacts)]})
 
             if icinga1_service.get('contacts') == 'dummy':
                 # Skip if notifications in Icinga2 are disabled
@@ -505,84 +856,159 @@ def compare_service_contacts(icinga1=Icinga1Config(), icinga2=Icinga2Config(), h
                 diff.append((icinga1_service['host_name'],
                              icinga1_service['check_command_extracted']))
                 print("Wrong notification settings for service: {}".format(service_name))
+                if sink:
+                    sink.write('service_contacts', service_name,
+                               {'notification_settings': [key]})
         else:
             logger.warning("Service missing in Icinga2: {}".format(service_name))
+    if sink:
+        sink.flush()
     return diff
 
 
-def compare_acknowledged_problems(output=None, icinga1=Icinga1Config(),
-                                  icinga2=Icinga2Config()):
+def compare_acknowledged_problems(output=None, icinga1=None, icinga2=None, output_format=TEXT,
+                                  sink=None, session=None):
     """
-    List all acknowledged problems per host as JSON result
-
-    :param output:
-    :param icinga1: Icinga1Config
-    :param icinga2: Icinga2Config
-    :return:
+    List all acknowledged problems per host, Icinga1 and Icinga2 acks are paired per
+    host and service.
+
+    Output formats:
+    * TEXT: per host, Icinga1 and Icinga2 acks as indented JSON
+    * JSONL: one compact JSON object per host/service, written incrementally:
+      {"host_name": ..., "service_name": ..., "icinga1": [...], "icinga2": [...]}
+
+    :param output: output file, leave empty to print
+    :param icinga1: Icinga1Config (shared default if not set)
+    :param icinga2: Icinga2Config (shared default if not set)
+    :param output_format: TEXT or JSONL
+    :param sink: additional result sink (see compare.sinks), differences per host:
+                 {'acknowledgements': [(service_name, icinga1 acks, icinga2 acks)]}
+    :param session: MigrationSession to share fetched data with other functions
+    :return: number of acknowledged hosts/services
+    :rtype: int
     """
-    icinga1_acks = [status for status in icinga1.status
-                    if status.get('problem_has_been_acknowledged', '0') == '1']
-
-    icinga2_acks = icinga2.get_acknowledgements()
-
-    all_hosts = [ack['host_name'] for ack in icinga1_acks] + \
-                [status['attrs']['host_name'] for status in icinga2_acks]
+    session = _session(icinga1, icinga2, session)
+    icinga1, icinga2 = session.icinga1, session.icinga2
+    if output_format not in (TEXT, JSONL):
+        raise ValueError("Unknown output format '{}'".format(output_format))
+
+    icinga1_acks = defaultdict(list)
+    for status in icinga1.status:
+        if status.get('problem_has_been_acknowledged', '0') == '1':
+            icinga1_acks[status['host_name']].append(status)
+
+    icinga2_acks = defaultdict(list)
+    for ack in icinga2.get_acknowledgements():
+        icinga2_acks[ack['attrs']['host_name']].append(ack)
+
+    service_names = _get_icinga2_service_names(
+        session, [ack for acks in icinga1_acks.values() for ack in acks])
+
+    f = open(output, 'w') if output else sys.stdout
+    count = 0
+    try:
+        for host in sorted(set(icinga1_acks) | set(icinga2_acks)):
+            # Pair acks per service (None for host acks), Icinga2 service names
+            pairs = OrderedDict()
+            for ack in icinga1_acks[host]:
+                service_name = ack.get('service_description')
+                if service_name:
+                    service_name = service_names.get((host, service_name), service_name)
+                pairs.setdefault(service_name, ([], []))[0].append(ack)
+            for ack in icinga2_acks[host]:
+                service_name = ack['attrs'].get('service_name') or None
+                pairs.setdefault(service_name, ([], []))[1].append(ack)
+            count += len(pairs)
+            if sink:
+                sink.write('acknowledgements', host, {'acknowledgements': [
+                    (service_name, acks_1, acks_2)
+                    for service_name, (acks_1, acks_2) in pairs.items()]})
+
+            if output_format == JSONL:
+                for service_name, (acks_1, acks_2) in pairs.items():
+                    f.write(json.dumps(
+                        {'host_name': host, 'service_name': service_name,
+                         'icinga1': acks_1, 'icinga2': acks_2},
+                        separators=(',', ':')) + '\n')
+                continue
 
-    if output:
-        f = open(output, 'w')
-    else:
-        f = sys.stdout
-
-    for host in set(all_hosts):
-        acks_1 = [ack for ack in icinga1_acks if ack['host_name'] == host]
-        acks_2 = [ack for ack in icinga2_acks if ack['attrs']['host_name'] == host]
-        if acks_1 or acks_2:
             f.write(host + '\n')
+            acks_1 = [ack for acks, _ in pairs.values() for ack in acks]
+            acks_2 = [ack for _, acks in pairs.values() for ack in acks]
+            if acks_1:
+                f.write("Icinga1:\n")
+                for ack in acks_1:
+                    f.write(json.dumps(ack, indent=4))
+                f.write('\n')
 
-        if acks_1:
-            f.write("Icinga1:\n")
-            for ack in acks_1:
-                f.write(json.dumps(ack, indent=4))
-            f.write('\n')
-
-        if acks_2:
-            f.write("Icinga2:\n")
-            for ack in acks_2:
-                f.write(json.dumps(ack, indent=4))
-            f.write('\n')
+            if acks_2:
+                f.write("Icinga2:\n")
+                for ack in acks_2:
+                    f.write(json.dumps(ack, indent=4))
+                f.write('\n')
+    finally:
+        if f is not sys.stdout:
+            f.close()
+        if sink:
+            sink.flush()
+    return count
 
 
-def pretty_print_services(stream=sys.stdout, hostname=None, icinga1=Icinga1Config(),
-                          icinga2=Icinga2Config()):
+def pretty_print_services(stream=sys.stdout, hostname=None, icinga1=None, icinga2=None,
+                          output_format=YAML, use_ruamel=False, session=None):
     """
     Pretty print all services of Icinga1 and Icinga2.
 
+    Output formats:
+    * YAML: per host and system, services as YAML keyed by extracted check command
+    * JSONL: one compact JSON object per service:
+      {"host_name": ..., "source": "icinga1", "check_command_extracted": ..., "service": {...}}
+
     :param stream: file handle, leave empty to print
     :param hostname: hostname
-    :param icinga1: Icinga1Config
-    :param icinga2: Icinga2Config
+    :param icinga1: Icinga1Config (shared default if not set)
+    :param icinga2: Icinga2Config (shared default if not set)
+    :param output_format: YAML or JSONL
+    :param use_ruamel: dump YAML with ruamel.yaml instead of the fast emitter (slow)
+    :param session: MigrationSession to share fetched data with other functions
     :return:
     """
+    session = _session(icinga1, icinga2, session)
+    icinga1, icinga2 = session.icinga1, session.icinga2
+    if output_format not in (YAML, JSONL):
+        raise ValueError("Unknown output format '{}'".format(output_format))
+
     if hostname:
         services_1_all = icinga1.get_services_by_hostname(host_name=hostname)
         services_2_all = icinga2.get_services_by_hostname(host_name=hostname)
     else:
-        services_1_all = icinga1.get_services_by_hostname()
-        services_2_all = icinga2.get_services_by_hostname()
+        services_1_all = session.icinga1_services_by_host()
+        services_2_all = session.icinga2_services_by_host()
 
     hostnames = [hostname] if hostname else list(services_1_all.keys())
 
-    for hostname in hostnames:
-        print(hostname, file=stream)
-
-        print('  Icinga1:', file=stream)
-        for service in services_1_all.get(hostname, []):
-            print('    ' + service['check_command_extracted'] + ':', file=stream)
-            pretty_service = yaml.dump(service, None, default_flow_style=False)
-            print(textwrap.indent(pretty_service, '      '), file=stream)
-
-        print('  Icinga2:', file=stream)
-        for service in services_2_all.get(hostname, []):
-            print('    ' + service['check_command_extracted'] + ':', file=stream)
-            pretty_service = yaml.dump(service, None, default_flow_style=False)
-            print(textwrap.indent(pretty_service, '      '), file=stream)
+    with BatchWriter(stream) as writer:
+        for hostname in hostnames:
+            if output_format == JSONL:
+                for source, services in (('icinga1', services_1_all.get(hostname, [])),
+                                         ('icinga2', services_2_all.get(hostname, []))):
+                    for service in services:
+                        writer.write(json.dumps(
+                            {'host_name': hostname, 'source': source,
+                             'check_command_extracted': service['check_command_extracted'],
+                             'service': service}, separators=(',', ':')) + '\n')
+                continue
+
+            writer.write(hostname + '\n')
+            for title, services in (('  Icinga1:', services_1_all.get(hostname, [])),
+                                    ('  Icinga2:', services_2_all.get(hostname, []))):
+                writer.write(title + '\n')
+                for service in services:
+                    writer.write('    ' + service['check_command_extracted'] + ':\n')
+                    if use_ruamel:
+                        from ruamel import yaml
+                        pretty_service = textwrap.indent(
+                            yaml.dump(service, None, default_flow_style=False), '      ')
+                    else:
+                        pretty_service = emit_yaml(service, '      ')
+                    writer.write(pretty_service + '\n')
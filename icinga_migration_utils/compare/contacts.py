@@ -0,0 +1,132 @@
+"""
+Match Icinga1 contacts and Icinga2 users.
+"""
+import re
+from collections import defaultdict
+
+PAGER_SEPARATORS_REGEX = re.compile(r'[\s\-/().]')
+
+
+def normalize_pager(pager):
+    """
+    Normalize phone number for comparison: '0049 171-123 456' => '49171123456'
+
+    :param pager: phone number
+    :return: normalized phone number or None
+    """
+    if not pager:
+        return None
+    pager = PAGER_SEPARATORS_REGEX.sub('', pager)
+    if pager.startswith('+'):
+        pager = pager[1:]
+    elif pager.startswith('00'):
+        pager = pager[2:]
+    return pager or None
+
+
+def normalize_email(email):
+    """
+    Normalize email address for comparison
+
+    :param email: email address
+    :return: normalized email address or None
+    """
+    if not email:
+        return None
+    return email.strip().lower() or None
+
+
+class UserIndex(object):
+    """
+    Hash indexes of Icinga2 users by name, normalized pager and normalized email.
+    """
+
+    def __init__(self, users):
+        """
+        :param users: Icinga2 users
+        """
+        self.by_name = {}
+        self.by_pager = defaultdict(list)
+        self.by_email = defaultdict(list)
+        for user in users:
+            attrs = user['attrs']
+            self.by_name[attrs['name']] = user
+            pager = normalize_pager(attrs.get('pager'))
+            if pager:
+                self.by_pager[pager].append(user)
+            email = normalize_email(attrs.get('email'))
+            if email:
+                self.by_email[email].append(user)
+
+    def find(self, name, pager=None, email=None):
+        """
+        Find user by name, fall back to an unambiguous pager or email match
+
+        :param name: user name
+        :param pager: phone number
+        :param email: email address
+        :return: (user, matched by 'name', 'pager' or 'email') or (None, None)
+        :rtype: tuple
+        """
+        user = self.by_name.get(name)
+        if user is not None:
+            return user, 'name'
+        for key, index, value in (('pager', self.by_pager, normalize_pager(pager)),
+                                  ('email', self.by_email, normalize_email(email))):
+            users = index.get(value, []) if value else []
+            if len(users) == 1:
+                return users[0], key
+        return None, None
+
+
+def diff_contacts(icinga1_contacts, icinga2_users, normalize=False):
+    """
+    Diff Icinga1 contacts and Icinga2 users in a single pass.
+
+    Renamed users are found by normalized pager or email. Pager and email are compared
+    exactly (after stripping a leading 00 of the Icinga1 pager) unless normalize is set.
+
+    :param icinga1_contacts: Icinga1 contacts
+    :param icinga2_users: Icinga2 users
+    :param normalize: compare normalized pager and email, ignoring separators, the
+        international prefix (+ or 00) and the case and surrounding whitespace of emails
+    :return: {'missing': [contact_name],
+              'renamed': [(contact_name, icinga2 name, matched by)],
+              'wrong_pager': [(contact_name, icinga1 pager, icinga2 pager)],
+              'wrong_email': [(contact_name, icinga1 email, icinga2 email)]}
+    :rtype: dict
+    """
+    index = UserIndex(icinga2_users)
+    diff = defaultdict(list)
+
+    for contact in icinga1_contacts:
+        contact_name = contact['contact_name']
+        icinga1_pager = contact.get('pager')
+        icinga1_email = contact.get('email')
+        user, matched_by = index.find(contact_name, icinga1_pager, icinga1_email)
+        if user is None:
+            diff['missing'].append(contact_name)
+            continue
+        attrs = user['attrs']
+        if matched_by != 'name':
+            diff['renamed'].append((contact_name, attrs['name'], matched_by))
+
+        icinga2_pager = attrs.get('pager')
+        if icinga1_pager is not None:
+            icinga1_pager = re.sub(r'^00', '', icinga1_pager)
+            if normalize:
+                wrong_pager = normalize_pager(icinga1_pager) != normalize_pager(icinga2_pager)
+            else:
+                wrong_pager = icinga1_pager != icinga2_pager
+            if wrong_pager:
+                diff['wrong_pager'].append((contact_name, icinga1_pager, icinga2_pager))
+
+        icinga2_email = attrs.get('email')
+        if icinga1_email:
+            if normalize:
+                wrong_email = normalize_email(icinga1_email) != normalize_email(icinga2_email)
+            else:
+                wrong_email = icinga1_email != icinga2_email
+            if wrong_email:
+                diff['wrong_email'].append((contact_name, icinga1_email, icinga2_email))
+    return diff
@@ -0,0 +1,73 @@
+"""
+Match Icinga1 and Icinga2 downtimes.
+"""
+from collections import defaultdict
+
+from icinga_migration_utils.intervals import IntervalIndex
+from icinga_migration_utils.migrate import MIGRATION_COMMENT_SUFFIX
+
+EXACT = 'exact'
+PARTIAL = 'partial'
+ICINGA1_UNMATCHED = 'icinga1_unmatched'
+ICINGA2_UNMATCHED = 'icinga2_unmatched'
+
+
+def _interval(downtime):
+    attrs = downtime.get('attrs', downtime)
+    return int(float(attrs['start_time'])), int(float(attrs['end_time']))
+
+
+def match_downtimes(icinga1_downtimes, icinga2_downtimes, service_names=None,
+                    suffix=MIGRATION_COMMENT_SUFFIX):
+    """
+    Pair Icinga1 downtimes with overlapping Icinga2 downtimes of the same host/service
+    whose comment matches (with or without migration suffix).
+
+    :param icinga1_downtimes: Icinga1 host and service downtimes
+    :param icinga2_downtimes: Icinga2 downtimes
+    :param service_names: Icinga2 service name by (hostname, Icinga1 service_description),
+                          service descriptions are used if not found
+    :param suffix: migration comment suffix
+    :return: {'exact': [(icinga1, icinga2)], 'partial': [(icinga1, icinga2)],
+              'icinga1_unmatched': [icinga1], 'icinga2_unmatched': [icinga2]}
+    :rtype: dict
+    """
+    service_names = service_names or {}
+
+    icinga2_by_object = defaultdict(list)
+    for downtime in icinga2_downtimes:
+        attrs = downtime['attrs']
+        icinga2_by_object[(attrs['host_name'], attrs.get('service_name') or None)].append(
+            downtime)
+    indexes = dict((key, IntervalIndex(downtimes, _interval))
+                   for key, downtimes in icinga2_by_object.items())
+
+    result = {EXACT: [], PARTIAL: [], ICINGA1_UNMATCHED: [], ICINGA2_UNMATCHED: []}
+    matched = set()
+    for downtime in icinga1_downtimes:
+        host_name = downtime['host_name']
+        service_name = downtime.get('service_description')
+        if service_name:
+            service_name = service_names.get((host_name, service_name), service_name)
+        index = indexes.get((host_name, service_name))
+
+        comments = (downtime['comment'], downtime['comment'] + suffix)
+        start_time, end_time = _interval(downtime)
+        candidates = [
+            candidate for candidate in (index.overlapping(start_time, end_time) if index else [])
+            if id(candidate) not in matched and candidate['attrs']['comment'] in comments]
+
+        exact = [candidate for candidate in candidates
+                 if _interval(candidate) == (start_time, end_time)]
+        if exact:
+            result[EXACT].append((downtime, exact[0]))
+            matched.add(id(exact[0]))
+        elif candidates:
+            result[PARTIAL].append((downtime, candidates[0]))
+            matched.add(id(candidates[0]))
+        else:
+            result[ICINGA1_UNMATCHED].append(downtime)
+
+    result[ICINGA2_UNMATCHED] = [downtime for downtime in icinga2_downtimes
+                                 if id(downtime) not in matched]
+    return result
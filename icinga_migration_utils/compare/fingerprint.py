@@ -0,0 +1,167 @@
+"""
+Per-host fingerprints of compared fields, to skip identical hosts in compares.
+
+Icinga1 and Icinga2 objects are normalized to the same canonical form with the rules
+compare_hosts and compare_services use (unit conversion, extracted check command,
+notification state, SLA), then hashed. Equal host fingerprints mean the detailed
+diff would not find differences; different fingerprints may still diff clean (e.g.
+services matched by comment or extra Icinga2 services).
+
+Host fingerprints are combined into a fleet fingerprint: if both sides have the same
+fleet fingerprint, there is no drift at all.
+"""
+import hashlib
+import json
+
+from icinga_migration_utils.utils import getpath
+
+# Icinga1 host attributes compared by compare_hosts and the factor to convert to Icinga2
+HOST_FIELDS = [('check_interval', 60), ('max_check_attempts', 1), ('retry_interval', 60)]
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def fingerprint(value):
+    """
+    Hash of JSON serializable value
+
+    :param value: canonical value
+    :return: hex digest
+    :rtype: str
+    """
+    return hashlib.sha1(
+        json.dumps(value, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+def icinga1_host_fields(host):
+    """
+    Canonical compared fields of an Icinga1 host
+
+    :param host: Icinga1 host
+    :rtype: list
+    """
+    fields = [_to_float(host.get(attr)) for attr, _ in HOST_FIELDS]
+    fields = [None if value is None else value * factor
+              for value, (_, factor) in zip(fields, HOST_FIELDS)]
+    return fields + [host.get('notes') == 'no-sla']
+
+
+def icinga2_host_fields(host):
+    """
+    Canonical compared fields of an Icinga2 host
+
+    :param host: Icinga2 host
+    :rtype: list
+    """
+    attrs = host['attrs']
+    fields = [_to_float(attrs.get(attr)) for attr, _ in HOST_FIELDS]
+    return fields + [bool(getpath(attrs, 'vars.nosla'))]
+
+
+def icinga1_service_fields(services, service_states):
+    """
+    Canonical compared fields of the Icinga1 services of a host
+
+    :param services: Icinga1 services of host (with check_command_extracted)
+    :param service_states: Icinga1 service status of host
+    :return: sorted [check command, notifications enabled, no SLA], first service per
+             check command
+    :rtype: list
+    """
+    states = {}
+    for state in service_states:
+        states.setdefault((state['check_command'], state['service_description']), state)
+
+    fields = {}
+    for service in services:
+        if service['check_command_extracted'] in fields:
+            continue
+        state = states.get((service['check_command'], service['service_description']))
+        notifications_enabled = (state or service).get('notifications_enabled') == '1'
+        fields[service['check_command_extracted']] = [
+            service['check_command_extracted'], notifications_enabled,
+            service.get('notes', False) == 'no-sla']
+    return sorted(fields.values(), key=json.dumps)
+
+
+def icinga2_service_fields(services):
+    """
+    Canonical compared fields of the Icinga2 services of a host
+
+    :param services: Icinga2 services of host (with check_command_extracted)
+    :return: sorted [check command, notifications enabled, no SLA], first service per
+             check command
+    :rtype: list
+    """
+    fields = {}
+    for service in services:
+        if service['check_command_extracted'] in fields:
+            continue
+        attrs = service['attrs']
+        try:
+            notifications_enabled = attrs['original_attributes']['enable_notifications']
+        except (KeyError, TypeError):
+            notifications_enabled = attrs.get('enable_notifications')
+        nosla = getpath(attrs, 'vars.nosla', False)
+        fields[service['check_command_extracted']] = [
+            service['check_command_extracted'], notifications_enabled, nosla]
+    return sorted(fields.values(), key=json.dumps)
+
+
+def fleet_fingerprint(host_fingerprints):
+    """
+    Combine host fingerprints into one fingerprint
+
+    :param host_fingerprints: fingerprint by hostname
+    :rtype: str
+    """
+    return fingerprint(sorted(host_fingerprints.items()))
+
+
+def changed_hosts(icinga1_fingerprints, icinga2_fingerprints):
+    """
+    Hosts with different fingerprints or only on one side
+
+    :param icinga1_fingerprints: fingerprint by hostname
+    :param icinga2_fingerprints: fingerprint by hostname
+    :rtype: set
+    """
+    return set(hostname for hostname in set(icinga1_fingerprints) | set(icinga2_fingerprints)
+               if icinga1_fingerprints.get(hostname) != icinga2_fingerprints.get(hostname))
+
+
+def host_fingerprints(icinga1_hosts, icinga2_hosts):
+    """
+    Fingerprints of the host fields compared by compare_hosts
+
+    :param icinga1_hosts: Icinga1 hosts by hostname
+    :param icinga2_hosts: Icinga2 hosts by hostname
+    :return: (Icinga1 fingerprint by hostname, Icinga2 fingerprint by hostname)
+    :rtype: tuple
+    """
+    return (dict((hostname, fingerprint(icinga1_host_fields(host)))
+                 for hostname, host in icinga1_hosts.items()),
+            dict((hostname, fingerprint(icinga2_host_fields(host)))
+                 for hostname, host in icinga2_hosts.items()))
+
+
+def service_fingerprints(hosts):
+    """
+    Fingerprints of the services of each host compared by compare_services
+
+    :param hosts: (hostname, icinga1_services, icinga1_service_states, icinga2_services)
+    :return: (Icinga1 fingerprint by hostname, Icinga2 fingerprint by hostname)
+    :rtype: tuple
+    """
+    icinga1_fingerprints = {}
+    icinga2_fingerprints = {}
+    for hostname, icinga1_services, icinga1_service_states, icinga2_services in hosts:
+        icinga1_fingerprints[hostname] = fingerprint(
+            icinga1_service_fields(icinga1_services, icinga1_service_states))
+        icinga2_fingerprints[hostname] = fingerprint(icinga2_service_fields(icinga2_services))
+    return icinga1_fingerprints, icinga2_fingerprints
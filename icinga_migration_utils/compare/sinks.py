@@ -0,0 +1,225 @@
+"""
+Result sinks for compare functions.
+
+Compare functions write the differences of each host (or contact, service...) to a
+sink as soon as they are computed. Sinks buffer records and write them in batches,
+so partial results are available while the compare is still running.
+
+Example:
+    with MultiSink([JsonlSink('services.jsonl'), CsvSink('services.csv')]) as sink:
+        compare_services(sink=sink)
+"""
+import csv
+import json
+import sys
+
+CSV_COLUMNS = ['compare', 'name', 'difference', 'object', 'icinga1', 'icinga2']
+
+
+class ResultSink(object):
+    """
+    Base class: buffers records and writes them in batches of batch_size.
+    Subclasses implement _write_batch.
+    """
+
+    def __init__(self, output=None, batch_size=100):
+        """
+        :param output: filename or file object, stdout if not set
+        :param batch_size: records to buffer before writing
+        """
+        self.batch_size = batch_size
+        self.batch = []
+        self.count = 0
+        if output is None or hasattr(output, 'write'):
+            self.f = output or sys.stdout
+            self.owns_file = False
+        else:
+            self.f = open(output, 'w', newline='')
+            self.owns_file = True
+
+    def write(self, compare, name, differences):
+        """
+        Write differences of an object
+
+        :param compare: compare type, e.g. 'services'
+        :param name: hostname, contact name, ...
+        :param differences: {difference: [entry]}
+        """
+        self.batch.append((compare, name, differences))
+        self.count += 1
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.batch:
+            self._write_batch(self.batch)
+            self.batch = []
+        self.f.flush()
+
+    def _write_batch(self, records):
+        raise NotImplementedError
+
+    def close(self):
+        self.flush()
+        if self.owns_file:
+            self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class TextSink(ResultSink):
+    """
+    Human readable text, formatted by formatter(f, name, differences)
+    """
+
+    def __init__(self, output=None, formatter=None, batch_size=100):
+        super(TextSink, self).__init__(output, batch_size)
+        self.formatter = formatter or write_differences
+
+    def _write_batch(self, records):
+        for compare, name, differences in records:
+            self.formatter(self.f, name, differences)
+
+
+class JsonSink(ResultSink):
+    """
+    One JSON object {name: {'host_name': name, difference: [entry]}}, written
+    incrementally (the format of the compare_services JSON file)
+    """
+
+    def __init__(self, output=None, batch_size=100):
+        super(JsonSink, self).__init__(output, batch_size)
+        self.written = 0
+        self.f.write('{')
+
+    def _write_batch(self, records):
+        chunks = []
+        for compare, name, differences in records:
+            chunks.append('{}{}: {}'.format(
+                ', ' if self.written else '',
+                json.dumps(name), json.dumps(dict(host_name=name, **differences))))
+            self.written += 1
+        self.f.write(''.join(chunks))
+
+    def close(self):
+        self.flush()
+        self.f.write('}')
+        super(JsonSink, self).close()
+
+
+class JsonlSink(ResultSink):
+    """
+    One compact JSON object per line: {"compare": ..., "name": ..., "differences": {...}}
+    """
+
+    def _write_batch(self, records):
+        self.f.write(''.join(
+            json.dumps({'compare': compare, 'name': name, 'differences': differences},
+                       separators=(',', ':')) + '\n'
+            for compare, name, differences in records))
+
+
+def _csv_value(value):
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return json.dumps(value)
+
+
+def flatten_differences(differences):
+    """
+    Flatten differences to (difference, object, icinga1, icinga2) rows
+
+    :param differences: {difference: [entry]}, entries are names, (object, icinga1,
+                        icinga2) tuples or dicts with command/icinga1/icinga2
+    :rtype: list
+    """
+    rows = []
+    for difference, entries in differences.items():
+        for entry in entries:
+            if isinstance(entry, dict):
+                row = (entry.get('command', entry.get('name')), entry.get('icinga1'),
+                       entry.get('icinga2'))
+            elif isinstance(entry, (list, tuple)) and len(entry) == 3:
+                row = tuple(entry)
+            elif isinstance(entry, (list, tuple)) and len(entry) == 2:
+                row = (None,) + tuple(entry)
+            else:
+                row = (entry, None, None)
+            rows.append((difference,) + tuple(_csv_value(value) for value in row))
+    return rows
+
+
+class CsvSink(ResultSink):
+    """
+    One row per difference, columns: compare, name, difference, object, icinga1, icinga2
+    """
+
+    def __init__(self, output=None, batch_size=100):
+        super(CsvSink, self).__init__(output, batch_size)
+        self.writer = csv.writer(self.f)
+        self.writer.writerow(CSV_COLUMNS)
+
+    def _write_batch(self, records):
+        self.writer.writerows(
+            (compare, name) + row
+            for compare, name, differences in records
+            for row in flatten_differences(differences))
+
+
+class MultiSink(object):
+    """
+    Write to several sinks
+    """
+
+    def __init__(self, sinks):
+        self.sinks = [sink for sink in sinks if sink is not None]
+
+    def write(self, compare, name, differences):
+        for sink in self.sinks:
+            sink.write(compare, name, differences)
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def open_sink(output):
+    """
+    Open sink by file extension: .jsonl, .csv, .json or text
+
+    :param output: filename
+    :rtype: ResultSink
+    """
+    for extension, sink_class in (('.jsonl', JsonlSink), ('.csv', CsvSink),
+                                  ('.json', JsonSink)):
+        if output.endswith(extension):
+            return sink_class(output)
+    return TextSink(output)
+
+
+def write_differences(f, name, differences):
+    """
+    Write differences as text
+
+    :param f: file handle
+    :param name: hostname, contact name, ...
+    :param differences: {difference: [entry]}
+    """
+    f.write(name + '\n')
+    for difference, object_name, icinga1, icinga2 in flatten_differences(differences):
+        f.write("  {}: {} (Icinga1: {}, Icinga2: {})\n".format(
+            difference, object_name, icinga1, icinga2))
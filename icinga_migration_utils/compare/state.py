@@ -0,0 +1,142 @@
+"""
+Persisted compare state for incremental compares.
+
+The state holds a digest of the diff inputs of every host and the diff of the last
+run. Hosts whose digest did not change reuse the stored diff, only the others are
+diffed again. The delta to the previous run is stored as well.
+"""
+import json
+import logging
+import os
+
+from icinga_migration_utils.compare.fingerprint import fingerprint
+
+logger = logging.getLogger(__name__)
+
+STATE_VERSION = 1
+
+# Fields read by compare_hosts/diff_host_services, other fields (e.g. last check
+# results) change all the time and must not invalidate the stored diff
+ICINGA1_HOST_FIELDS = ['check_interval', 'max_check_attempts', 'retry_interval', 'notes']
+ICINGA2_HOST_FIELDS = ['check_interval', 'max_check_attempts', 'retry_interval', 'vars']
+ICINGA1_SERVICE_FIELDS = ['check_command', 'check_command_extracted', 'service_description',
+                          'notifications_enabled', 'notes']
+ICINGA1_SERVICE_STATE_FIELDS = ['check_command', 'service_description',
+                                'notifications_enabled']
+ICINGA2_SERVICE_FIELDS = ['name', 'enable_notifications', 'original_attributes', 'vars']
+
+
+def _project(obj, fields):
+    return [obj.get(field) for field in fields]
+
+
+def host_input_digest(icinga1_host, icinga2_host):
+    """
+    Digest of the inputs compare_hosts reads for a host
+
+    :param icinga1_host: Icinga1 host
+    :param icinga2_host: Icinga2 host or None
+    :rtype: str
+    """
+    return fingerprint([
+        _project(icinga1_host, ICINGA1_HOST_FIELDS),
+        _project(icinga2_host['attrs'], ICINGA2_HOST_FIELDS) if icinga2_host else None])
+
+
+def service_input_digest(icinga1_services, icinga1_service_states, icinga2_services):
+    """
+    Digest of the inputs diff_host_services reads for a host (order matters)
+
+    :param icinga1_services: Icinga1 services of host
+    :param icinga1_service_states: Icinga1 service status of host
+    :param icinga2_services: Icinga2 services of host
+    :rtype: str
+    """
+    return fingerprint([
+        [_project(service, ICINGA1_SERVICE_FIELDS) for service in icinga1_services],
+        [_project(state, ICINGA1_SERVICE_STATE_FIELDS) for state in icinga1_service_states],
+        [[service['check_command_extracted']] + _project(service['attrs'], ICINGA2_SERVICE_FIELDS)
+         for service in icinga2_services]])
+
+
+class CompareState(object):
+    """
+    Host digests and diffs of the last compare run, stored as JSON.
+
+    Example:
+        state = CompareState('services.txt.state.json')
+        diffs = state.reuse(digests)        # unchanged hosts
+        ...                                 # diff the other hosts
+        delta = state.update(digests, diffs)
+        state.save()
+    """
+
+    def __init__(self, path):
+        """
+        :param path: state file
+        """
+        self.path = path
+        self.hosts = {}
+        self.delta = {}
+        if os.path.exists(path):
+            self.load()
+
+    def load(self):
+        with open(self.path) as f:
+            data = json.load(f)
+        if data.get('version') != STATE_VERSION:
+            logger.warning("Ignoring compare state {} with version {}"
+                           .format(self.path, data.get('version')))
+            return
+        self.hosts = data['hosts']
+        logger.info("Loaded compare state of {} hosts from {}"
+                    .format(len(self.hosts), self.path))
+
+    def save(self):
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump({'version': STATE_VERSION, 'hosts': self.hosts, 'delta': self.delta}, f)
+        os.replace(self.path + '.tmp', self.path)
+
+    def reuse(self, digests):
+        """
+        Stored diffs of hosts whose digest did not change
+
+        :param digests: input digest by hostname
+        :return: diff by hostname (empty diff for hosts without differences)
+        :rtype: dict
+        """
+        reused = dict((hostname, self.hosts[hostname]['diff']) for hostname, digest
+                      in digests.items()
+                      if hostname in self.hosts and self.hosts[hostname]['digest'] == digest)
+        logger.info("Reusing stored diff of {} of {} hosts".format(len(reused), len(digests)))
+        return reused
+
+    def update(self, digests, diffs):
+        """
+        Replace state with the current run, compute the delta to the last run
+
+        :param digests: input digest by hostname
+        :param diffs: diff by hostname, hosts without differences may be left out
+        :return: delta: {'new': {hostname: diff}, 'changed': {hostname: diff},
+                         'resolved': [hostname]}
+        :rtype: dict
+        """
+        previous = dict((hostname, host['diff']) for hostname, host in self.hosts.items())
+        current = dict((hostname, diffs.get(hostname) or {}) for hostname in digests)
+
+        self.delta = {'new': {}, 'changed': {}, 'resolved': []}
+        for hostname in sorted(set(previous) | set(current)):
+            before = previous.get(hostname) or {}
+            after = json.loads(json.dumps(current.get(hostname) or {}))
+            if before == after:
+                continue
+            if not after:
+                self.delta['resolved'].append(hostname)
+            elif not before:
+                self.delta['new'][hostname] = after
+            else:
+                self.delta['changed'][hostname] = after
+
+        self.hosts = dict((hostname, {'digest': digest, 'diff': current[hostname]})
+                          for hostname, digest in digests.items())
+        return self.delta
@@ -0,0 +1,57 @@
+"""
+Shared default Icinga1Config and Icinga2Config instances.
+
+The configs (and the Icinga2 API client) are built on first use and then shared by all
+functions called without explicit configs, so importing the package does not read
+~/.icingadiffrc, build clients or import the API client libraries.
+"""
+import threading
+
+_lock = threading.Lock()
+_configs = {}
+
+
+def _shared(name, factory):
+    config = _configs.get(name)
+    if config is None:
+        with _lock:
+            config = _configs.get(name)
+            if config is None:
+                config = _configs[name] = factory()
+    return config
+
+
+def _build_icinga1():
+    from icinga_migration_utils.icinga1.icinga1 import Icinga1Config
+    return Icinga1Config()
+
+
+def _build_icinga2():
+    from icinga_migration_utils.icinga2.icinga2 import Icinga2Config
+    return Icinga2Config()
+
+
+def default_icinga1():
+    """
+    Shared Icinga1Config, built on first call
+
+    :rtype: Icinga1Config
+    """
+    return _shared('icinga1', _build_icinga1)
+
+
+def default_icinga2():
+    """
+    Shared Icinga2Config, built on first call (reads ~/.icingadiffrc or ICINGADIFF_CONFIG)
+
+    :rtype: Icinga2Config
+    """
+    return _shared('icinga2', _build_icinga2)
+
+
+def reset_defaults():
+    """
+    Drop the shared configs, the next call builds new ones (e.g. after config changes)
+    """
+    with _lock:
+        _configs.clear()
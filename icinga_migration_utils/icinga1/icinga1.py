@@ -8,6 +8,9 @@ import os
 import re
 from collections import defaultdict
 
+from icinga_migration_utils.intervals import IntervalIndex
+from icinga_migration_utils.matching import annotate_icinga1_service
+
 logger = logging.getLogger(__name__)
 
 OBJECT_CACHE_REGEX = r'define\s+(?P<object_type>\w+)\s+\{\n' \
@@ -121,6 +124,7 @@ class Icinga1Config(object):
         self._objects = []
         self._hostdowntimes = []
         self._servicedowntimes = []
+        self._downtime_index = None
         self._service_acknowledgements = []
         self._host_acknowledgements = []
         self._contacts = []
@@ -136,10 +140,12 @@ class Icinga1Config(object):
         :return: 
         """
         if not self._objects:
+            # assign when complete, concurrent readers must not see a partial list
+            objects = []
             for objects_file in glob.glob(self.objects_files):
                 source = re.findall(r'(monitoring[\d]+)\.cache', objects_file)[0]
-                self._objects.extend(
-                    parse_icinga_cache(objects_file, source, OBJECT_CACHE_REGEX))
+                objects.extend(parse_icinga_cache(objects_file, source, OBJECT_CACHE_REGEX))
+            self._objects = objects
         if not self._objects:
             raise Exception("Error - no objects found in object cache files ({})"
                             .format(self.objects_files))
@@ -156,10 +162,12 @@ class Icinga1Config(object):
         :return: 
         """
         if not self._status:
+            # assign when complete, concurrent readers must not see a partial list
+            status = []
             for status_file in glob.glob(self.status_files):
                 source = re.findall(r'(monitoring[\d]+)\.cache', status_file)[0]
-                self._status.extend(
-                    parse_icinga_cache(status_file, source, STATUS_FILE_REGEX))
+                status.extend(parse_icinga_cache(status_file, source, STATUS_FILE_REGEX))
+            self._status = status
         if not self._status:
             raise Exception("Error - no objects found in status cache files"
                             .format(self.status_files))
@@ -324,6 +332,8 @@ class Icinga1Config(object):
             event_handler
             notes
             notes_url 
+        Computed attributes:
+            check_command_extracted (see matching.extract_check_command)
                        
         :param hostname: hostname
         :param kwargs: filter for services by key-value
@@ -332,7 +342,8 @@ class Icinga1Config(object):
         """
         if hostname:
             kwargs['host_name'] = hostname
-        return self._get_objects(ObjectType.SERVICE, **kwargs)
+        return [annotate_icinga1_service(service)
+                for service in self._get_objects(ObjectType.SERVICE, **kwargs)]
 
     def get_services_by_hostname(self, **kwargs):
         """
@@ -359,6 +370,38 @@ class Icinga1Config(object):
             if downtime['host_name'] == hostname
         ]
 
+    @property
+    def downtime_index(self):
+        """
+        Interval index of host and service downtimes on start_time/end_time
+
+        :rtype: IntervalIndex
+        """
+        if self._downtime_index is None:
+            self._downtime_index = IntervalIndex(
+                self.hostdowntimes + self.servicedowntimes,
+                lambda downtime: (int(downtime['start_time']), int(downtime['end_time'])))
+        return self._downtime_index
+
+    def get_downtimes_active_at(self, timestamp):
+        """
+        Get host and service downtimes active at a point in time
+
+        :param timestamp: unix timestamp
+        :return: downtimes ordered by start_time
+        """
+        return self.downtime_index.at(int(timestamp))
+
+    def get_downtimes_within(self, start_time, end_time):
+        """
+        Get host and service downtimes overlapping a time window
+
+        :param start_time: unix timestamp
+        :param end_time: unix timestamp
+        :return: downtimes ordered by start_time
+        """
+        return self.downtime_index.overlapping(int(start_time), int(end_time))
+
     @property
     def hostdowntimes(self):
         """
@@ -0,0 +1,130 @@
+"""
+Load balancing of Icinga2 API reads across HA endpoints.
+"""
+import itertools
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+ROUND_ROBIN = 'round_robin'
+LEAST_OUTSTANDING = 'least_outstanding'
+
+
+class Endpoint(object):
+    """
+    Icinga2 API endpoint with health state
+    """
+
+    def __init__(self, url, client):
+        self.url = url
+        self.client = client
+        self.healthy = True
+        self.outstanding = 0
+        self.failed_at = None
+
+    def __repr__(self):
+        return 'Endpoint({})'.format(self.url)
+
+
+class EndpointPool(object):
+    """
+    Spread requests across healthy endpoints, either round robin or to the endpoint with
+    the least outstanding requests. Endpoints failing with connection errors or timeouts
+    are taken out of rotation and health checked again after health_check_interval
+    seconds.
+    """
+
+    def __init__(self, endpoints, strategy=ROUND_ROBIN, health_check_interval=30):
+        """
+        :param endpoints: Endpoint objects
+        :param strategy: ROUND_ROBIN or LEAST_OUTSTANDING
+        :param health_check_interval: seconds until a failed endpoint is checked again
+        """
+        if strategy not in (ROUND_ROBIN, LEAST_OUTSTANDING):
+            raise ValueError("Unknown load balancing strategy '{}'".format(strategy))
+        self.endpoints = list(endpoints)
+        self.strategy = strategy
+        self.health_check_interval = health_check_interval
+        self.lock = threading.Lock()
+        self._cycle = itertools.cycle(range(len(self.endpoints)))
+
+    def check(self, endpoint):
+        """
+        Health check endpoint (GET /v1/status)
+
+        :rtype: bool
+        """
+        try:
+            endpoint.client.status.list()
+        except Exception as error:
+            logger.warning("Health check failed for {}: {}".format(endpoint.url, error))
+            endpoint.failed_at = time.monotonic()
+            return False
+        logger.info("Endpoint {} is healthy again".format(endpoint.url))
+        endpoint.healthy = True
+        endpoint.failed_at = None
+        return True
+
+    def _recheck(self):
+        now = time.monotonic()
+        for endpoint in self.endpoints:
+            if not endpoint.healthy and now - endpoint.failed_at >= self.health_check_interval:
+                self.check(endpoint)
+
+    def _select(self, exclude):
+        candidates = [endpoint for endpoint in self.endpoints
+                      if endpoint.healthy and endpoint not in exclude]
+        if not candidates:
+            return None
+        with self.lock:
+            if self.strategy == LEAST_OUTSTANDING:
+                endpoint = min(candidates, key=lambda e: e.outstanding)
+            else:
+                for _ in range(len(self.endpoints)):
+                    endpoint = self.endpoints[next(self._cycle)]
+                    if endpoint in candidates:
+                        break
+            endpoint.outstanding += 1
+        return endpoint
+
+    def mark_failed(self, endpoint, error):
+        logger.error("Endpoint {} failed, taking it out of rotation: {}"
+                     .format(endpoint.url, error))
+        endpoint.healthy = False
+        endpoint.failed_at = time.monotonic()
+
+    def call(self, request):
+        """
+        Perform request on a healthy endpoint, fail over to the next one on connection
+        errors and timeouts.
+
+        :param request: callable(client)
+        :return: result of request
+        """
+        from requests.exceptions import ConnectionError, Timeout
+
+        self._recheck()
+        tried = []
+        error = None
+        while True:
+            endpoint = self._select(tried)
+            if endpoint is None:
+                break
+            tried.append(endpoint)
+            try:
+                return request(endpoint.client)
+            except (ConnectionError, Timeout) as e:
+                error = e
+                self.mark_failed(endpoint, e)
+            finally:
+                with self.lock:
+                    endpoint.outstanding -= 1
+
+        if error is None:
+            # All endpoints marked unhealthy - try them anyway instead of failing right away
+            for endpoint in self.endpoints:
+                if self.check(endpoint):
+                    return self.call(request)
+        raise error or ConnectionError("No healthy Icinga2 API endpoint available")
@@ -1,19 +1,29 @@
 import configparser
 import logging
 import os
+import re
 import sys
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
 
-import progressbar
-from icinga2api.client import Client
 from icinga_migration_utils.icinga2 import HostNotFoundException
-from icinga_migration_utils.utils import ndict
-from requests.exceptions import ChunkedEncodingError
+from icinga_migration_utils.icinga2.endpoints import ROUND_ROBIN, Endpoint, EndpointPool
+from icinga_migration_utils.logs import LazyMessage, timed_operation
+from icinga_migration_utils.matching import annotate_icinga2_service
+from icinga_migration_utils.utils import getpath
 
 logger = logging.getLogger(__name__)
 
 DEFAULT_CONFIG_FILE = '~/.icingadiffrc'
 
+# Maximum number of objects per filter-based bulk request
+BULK_CHUNK_SIZE = 500
+
+OBJECT_NAME_REGEX = re.compile(r"object '([^']+)'")
+
+# Attributes fetched when querying for *all* services
+SERVICE_ATTRS = ['check_command', 'name', 'vars', 'enable_notifications',
+                 'last_check_result', 'notes_url', 'display_name']
+
 
 class Icinga2Error(Exception):
     pass
@@ -26,7 +36,11 @@ class Icinga2Config(object):
     OS environment parameters:
        ICINGADIFF_CONFIG: alternative configuration file (defaults to ~/.icingadiffrc)
     """
-    def __init__(self, config=None):
+    def __init__(self, config=None, client=None):
+        """
+        :param config: configuration (defaults to ICINGADIFF_CONFIG or ~/.icingadiffrc)
+        :param client: pre-built icinga2api client (built from config if not set)
+        """
         if not config:
             config_environ = os.environ.get('ICINGADIFF_CONFIG')
 
@@ -39,7 +53,8 @@ class Icinga2Config(object):
                 sys.exit("Please configure icingadiff first (see README.md)".format(cfg_file))
             config = configparser.RawConfigParser()
             config.read(cfg_file)
-        url = config['icinga2_web']['url']
+        urls = [url.strip() for url in config['icinga2_web']['url'].split(',') if url.strip()]
+        url = config['icinga2_web'].get('primary_url') or urls[0]
         username = config['icinga2_web']['username']
         password = config['icinga2_web']['password']
         self.retries = int(config['icinga2_web'].get('retries', 5))
@@ -47,25 +62,127 @@ class Icinga2Config(object):
         if type(config) == configparser.RawConfigParser:
             timeout = config['icinga2_web'].getint('timeout', 30)
             ignore_insecure_requests = config.getboolean('icinga2_web', 'ignore_insecure_requests')
+            local_joins = config['icinga2_web'].getboolean('local_joins', False)
+            health_check_interval = config['icinga2_web'].getint('health_check_interval', 30)
         else:
             timeout = config['icinga2_web'].get('timeout', 30)
             ignore_insecure_requests = config['icinga2_web']\
                 .get('ignore_insecure_requests', True)
+            local_joins = config['icinga2_web'].get('local_joins', False)
+            health_check_interval = config['icinga2_web'].get('health_check_interval', 30)
+        load_balancing = config['icinga2_web'].get('load_balancing', ROUND_ROBIN)
 
         self.config = config
-        self.client = Client(url, username=username, password=password,
-                             ignore_insecure_requests=ignore_insecure_requests, timeout=timeout)
+        self.url = url
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.ignore_insecure_requests = ignore_insecure_requests
+        self.local_joins = local_joins
+        self.mirror = None
+        self._http_session = None
+        self._join_hosts = {}
+        self._join_host_attrs = set()
+        self._user_index = None
+        # Writes go to the primary endpoint, reads are spread across all endpoints
+        if client is None:
+            client = self._build_client(url)
+        self.client = client
+        endpoints = [Endpoint(url, client)] + [
+            Endpoint(read_url, self._build_client(read_url))
+            for read_url in urls if read_url != url]
+        self.endpoints = EndpointPool(endpoints, strategy=load_balancing,
+                                      health_check_interval=health_check_interval)
+
+    def _build_client(self, url):
+        from icinga2api.client import Client
+
+        return Client(url, username=self.username, password=self.password,
+                      ignore_insecure_requests=self.ignore_insecure_requests,
+                      timeout=self.timeout)
+
+    def use_mirror(self, follow=True, **kwargs):
+        """
+        Answer read requests (hosts, services, downtimes, acknowledgements) from a local
+        mirror instead of querying the API for every call.
+
+        :param follow: keep the mirror current from the event stream in a background thread
+        :param kwargs: passed to Icinga2Mirror
+        :return: mirror
+        :rtype: Icinga2Mirror
+        """
+        from icinga_migration_utils.icinga2.mirror import Icinga2Mirror
+
+        mirror = Icinga2Mirror(self, **kwargs)
+        if follow:
+            mirror.start()
+        else:
+            mirror.load()
+        self.mirror = mirror
+        return mirror
 
     def get_objects_list(self, *args, **kwargs):
+        from requests.exceptions import ChunkedEncodingError
+
         for i in range(0, self.retries+1):
             try:
-                return self.client.objects.list(*args, **kwargs)
+                return self.endpoints.call(
+                    lambda client: client.objects.list(*args, **kwargs))
             except ChunkedEncodingError:
                 logger.error("Error getting objects (retry: {}/{})".format(i, self.retries))
         raise Icinga2Error("Failed getting objects with {} retries".format(self.retries))
 
+    def list_objects(self, object_type, joins=None, **kwargs):
+        """
+        List objects. If local_joins is enabled, host and service joins are not performed
+        by the API (which repeats the host for every object) but attached locally from
+        hosts fetched once per Icinga2Config.
+        The result has the same ['joins']['host'][...] layout either way.
+
+        :param object_type: object type, e.g. 'Service'
+        :param joins: joins, e.g. ['host.name', 'host.address']
+        :param kwargs: arguments for get_objects_list (attrs, filter, filter_vars)
+        :return: objects
+        """
+        if not self.local_joins or not joins or joins is True \
+                or any(join.split('.')[0] not in ('host', 'service') for join in joins):
+            return self.get_objects_list(object_type=object_type, joins=joins, **kwargs)
+
+        host_attrs = [join.split('.', 1)[1] for join in joins if join.startswith('host.')]
+        service_attrs = [join.split('.', 1)[1] for join in joins if join.startswith('service.')]
+        key_attrs = ['host_name'] + (['service_name'] if service_attrs else [])
+        if kwargs.get('attrs'):
+            kwargs['attrs'] = list(kwargs['attrs']) + [
+                attr for attr in key_attrs if attr not in kwargs['attrs']]
+
+        objects = self.get_objects_list(object_type=object_type, **kwargs)
+        hosts = self.get_join_hosts(host_attrs)
+        for obj in objects:
+            host = hosts.get(obj['attrs'].get('host_name'), {})
+            obj['joins'] = {'host': dict((attr, host.get(attr)) for attr in host_attrs)}
+            if service_attrs:
+                # Only the service name is available without fetching services
+                obj['joins']['service'] = {'name': obj['attrs'].get('service_name') or None}
+        return objects
+
+    def get_join_hosts(self, attrs):
+        """
+        Get host attributes used for local joins by hostname.
+        Hosts are fetched once and refetched only if new attributes are requested.
+
+        :param attrs: host attributes
+        :return: {'hostname': {attr: value}}
+        :rtype: dict
+        """
+        if not self._join_hosts or not set(attrs) <= self._join_host_attrs:
+            self._join_host_attrs |= set(attrs) | {'name'}
+            hosts = self.get_objects_list(object_type='Host',
+                                          attrs=sorted(self._join_host_attrs))
+            self._join_hosts = dict((host['attrs']['name'], host['attrs']) for host in hosts)
+        return self._join_hosts
+
     def get_services(self, host_address=None, attrs=None, joins=None, host_name=None,
-                     service_name=None):
+                     service_name=None, lazy=False):
         """
         Retrieve Icinga2 services from API.
         Attributes need to be reduced if trying to get all services.
@@ -75,15 +192,23 @@ class Icinga2Config(object):
         :param attrs: Attributes to fetch from API
         :param joins: Joins to perform
         :param service_name: Service name
+        :param lazy: only fetch name and host_name, load other attributes on first access
+                     (check_command_extracted is set by ServiceIndex in this case)
         :return:
         """
         filters = []
         filter_vars = {}
 
+        if self.mirror is not None:
+            services = self.mirror.get_services(host_address=host_address, host_name=host_name,
+                                                service_name=service_name)
+            return [annotate_icinga2_service(service) for service in services]
+
         # Reduce attributes by default if querying for *all* services, otherwise it might fail
-        if attrs is None and not host_name:
-            attrs = ['check_command', 'name', 'vars', 'enable_notifications',
-                     'last_check_result', 'notes_url', 'display_name']
+        if lazy:
+            attrs = ['name', 'host_name']
+        elif attrs is None and not host_name:
+            attrs = SERVICE_ATTRS
 
         if not joins:
             joins = ['host.address', 'host.name']
@@ -101,10 +226,15 @@ class Icinga2Config(object):
             filter_vars['service_name'] = service_name
 
         filters = ' && '.join(filters)
-        services = self.get_objects_list(
+        if lazy:
+            from icinga_migration_utils.icinga2.lazy import lazy_list
+            return lazy_list(self, 'Service', attrs, joins=joins, filter=filters,
+                             filter_vars=filter_vars)
+
+        services = self.list_objects(
             object_type='Service', joins=joins, filter=filters, attrs=attrs,
             filter_vars=filter_vars)
-        return services
+        return [annotate_icinga2_service(service) for service in services]
 
     def get_services_by_hostname(self, **kwargs):
         """
@@ -123,15 +253,19 @@ class Icinga2Config(object):
             raise HostNotFoundException("Host '{}' not found".format(host_name))
         return hosts[0]
 
-    def get_hosts(self, attrs=None, host_name=None, joins=None):
+    def get_hosts(self, attrs=None, host_name=None, joins=None, lazy=False):
         """
         Get hosts
 
         :param attrs: attributes
         :param host_name: host name
         :param joins: specifify joins (set to True for all joins)
+        :param lazy: only fetch name, load other attributes on first access
         :return:
         """
+        if self.mirror is not None:
+            return self.mirror.get_hosts(host_name=host_name)
+
         query_dict = {
             'object_type': 'Host',
             'attrs': attrs,
@@ -142,7 +276,11 @@ class Icinga2Config(object):
                 'filter': 'host.name==hostname',
                 'filter_vars': {'hostname': host_name},
             })
-        return self.client.objects.list(**query_dict)
+        if lazy:
+            from icinga_migration_utils.icinga2.lazy import lazy_list
+            query_dict.pop('attrs')
+            return lazy_list(self, attrs=['name'], **query_dict)
+        return self.get_objects_list(**query_dict)
 
     def get_hosts_dict(self, **kwargs):
         """
@@ -167,6 +305,9 @@ class Icinga2Config(object):
         :param query:
         :return:
         """
+        if self.mirror is not None:
+            return self.mirror.get_downtimes(**query)
+
         query_filter = None
         filter_vars = None
         if query:
@@ -178,7 +319,7 @@ class Icinga2Config(object):
                 filter_vars[key] = query[key]
             query_filter = ' && '.join(query_filters)
         logger.debug("Filter: {}, filter vars: {}".format(query_filter, filter_vars))
-        downtimes = self.client.objects.list(
+        downtimes = self.list_objects(
             object_type='Downtime', joins=['host.address', 'host.name', 'service.name'],
             filter=query_filter, filter_vars=filter_vars
         )
@@ -202,9 +343,10 @@ class Icinga2Config(object):
             except:
                 message = ''
             logger.info("Created downtime - response: '{}'".format(message))
-            logger.debug("Got response: {0}".format(response))
+            logger.debug(LazyMessage("Got response: {0}", response))
         else:
             logger.error("Error adding downtime is {} missing in Icinga2?".format(host_name))
+        return response
 
     def schedule_service_downtime(self, host_name, service_name, downtime_author,
                                   downtime_comment, downtime_start_time, downtime_end_time,
@@ -226,10 +368,11 @@ class Icinga2Config(object):
             except:
                 message = ''
             logger.info("Created downtime - response: '{}'".format(message))
-            logger.debug("Got response: {0}".format(response))
+            logger.debug(LazyMessage("Got response: {0}", response))
         else:
             logger.error("Error adding downtime is {}!{} missing in Icinga2?"
                          .format(host_name, service_name))
+        return response
 
     def get_service_problems(self):
         """
@@ -237,7 +380,7 @@ class Icinga2Config(object):
 
         :return: 
         """
-        return self.client.objects.list(
+        return self.list_objects(
             object_type='Service', joins=['host.address'],
             filter='service.state!=ServiceOK')
 
@@ -252,6 +395,10 @@ class Icinga2Config(object):
         :param service_name:
         :return:
         """
+        if self.mirror is not None:
+            return self.mirror.get_acknowledgements(host_name=host_name, author=author,
+                                                    comment=comment, service_name=service_name)
+
         filters = []
         filter_vars = {}
         if host_name:
@@ -267,7 +414,7 @@ class Icinga2Config(object):
             filters.append('service.name==servicename')
             filter_vars['servicename'] = service_name
         filters = ' && '.join(filters)
-        return self.client.objects.list(
+        return self.list_objects(
             'Comment',
             joins=['host.name'],
             filter=filters,
@@ -339,7 +486,7 @@ class Icinga2Config(object):
             filter_vars['pager'] = pager
         filters = ' && '.join(filters)
 
-        return self.client.objects.list(
+        return self.get_objects_list(
             object_type='User', filter=filters, filter_vars=filter_vars)
 
     def get_notifications(self, attrs=None, hostname=None, filter_customer_notifications=False):
@@ -390,7 +537,7 @@ class Icinga2Config(object):
         filters.append('service.name==null')
         filters = ' && '.join(filters)
 
-        return self.client.objects.list(
+        return self.get_objects_list(
             'Notification',
             filter=filters,
             filter_vars=filter_vars,
@@ -429,22 +576,45 @@ class Icinga2Config(object):
 
         filters += ' && service.name!=null'
 
-        return self.client.objects.list(
+        return self.get_objects_list(
             'Notification',
             filter=filters,
             filter_vars=filter_vars,
             attrs=attrs
         )
 
+    def get_user_index(self, refresh=False):
+        """
+        Icinga2 users by name and user names by group, fetched once and cached.
+        User records ({'name', 'email', 'groups'}) are shared, do not modify them.
+
+        :param refresh: fetch users again
+        :return: (users by name, user names by group)
+        :rtype: tuple
+        """
+        if self._user_index is None or refresh:
+            users_by_name = OrderedDict()
+            members_by_group = defaultdict(list)
+            for user in self.get_users():
+                attrs = user['attrs']
+                users_by_name[user['name']] = {
+                    'name': attrs['name'],
+                    'email': attrs['email'],
+                    'groups': attrs['groups']}
+                for group in attrs['groups'] or []:
+                    members_by_group[group].append(user['name'])
+            self._user_index = (users_by_name, dict(members_by_group))
+        return self._user_index
+
     def get_service_notification_contacts(self, hostname=None):
         """
         Extract users and groups from all service notifications
 
         :param hostname: hostname
-        :return:
+        :return: {'host' or 'host!service': {'users': [user], 'groups': [group]}}
         """
         result = defaultdict(dict)
-        icinga2_users = self.get_users()
+        users_by_name, members_by_group = self.get_user_index()
         notifications = self.get_notifications(
             attrs=['users', 'user_groups', 'host_name', 'service_name'],
             hostname=hostname,
@@ -454,71 +624,49 @@ class Icinga2Config(object):
         # Very long running operation when applied for all hosts - show progressbar
         notification_iterator = notifications
         if not hostname:
-            bar = progressbar.ProgressBar()
+            import progressbar
+            bar = progressbar.ProgressBar(max_value=len(notifications), widgets=[
+                progressbar.Percentage(), ' ', progressbar.Bar(), ' ',
+                progressbar.AdaptiveTransferSpeed(unit='notifications', prefixes=('',)), ' ',
+                progressbar.AdaptiveETA()])
             notification_iterator = bar(notifications)
 
         # Iterate through all notifications
         for notification in notification_iterator:
             key = "{}".format(notification['attrs']['host_name'])
-            usernames = []
-            users = []
-            groups = []
-
-            notification_groups = notification['attrs']['user_groups']
-            if notification_groups:
-                groups.extend(notification_groups)
-
-            notification_users = notification['attrs']['users']
-            if notification_users:
-                usernames.extend(notification_users)
+            groups = list(notification['attrs']['user_groups'] or [])
+            usernames = list(notification['attrs']['users'] or [])
 
             # merge host and service notifications
             if notification['attrs']['service_name']:
                 key += "!{}".format(notification['attrs']['service_name'])
 
-            for username in usernames:
-                users.extend([
-                    {'name': user['attrs']['name'],
-                     'email': user['attrs']['email'],
-                     'groups': user['attrs']['groups']}
-                    for user in icinga2_users
-                    if user['attrs']['name'] == username])
-
             for group in groups:
-                users.extend([
-                    {'name': user['attrs']['name'],
-                     'email': user['attrs']['email'],
-                     'groups': user['attrs']['groups']}
-                    for user in icinga2_users
-                    if group in user['attrs']['groups']])
+                usernames.extend(members_by_group.get(group, []))
+            users = [users_by_name[username] for username in usernames
+                     if username in users_by_name]
 
             result[key] = {'users': users, 'groups': groups}
 
         # Iterate through all services with custom notifications
         services_with_overrides = [
             service for service in self.get_services(
-                attrs=['vars', 'check_command', 'name', 'host_name'])
-            if ndict(service)['attrs']['vars']['notifications']['users']
+                attrs=['vars', 'check_command', 'name', 'host_name'], host_name=hostname)
+            if getpath(service, 'attrs.vars.notifications.users')
         ]
-        if hostname:
-            services_with_overrides = [
-                service for service in services_with_overrides
-                if service['attrs']['host_name'] == hostname
-            ]
         for service in services_with_overrides:
             if service['name'] not in result.keys():
                 result[service['name']] = {'users': [], 'groups': []}
 
             for username in service['attrs']['vars']['notifications']['users']:
-                user = [{
-                    'name': x['attrs']['name'],
-                    'email': x['attrs']['email'],
-                    'groups': x['attrs']['groups']}
-                    for x in icinga2_users if x['name'] == username][0]
-                result[service['name']]['users'].append(user)
+                if username not in users_by_name:
+                    logger.warning("Unknown notification user '{}' for service {}"
+                                   .format(username, service['name']))
+                    continue
+                result[service['name']]['users'].append(users_by_name[username])
 
         return dict(result)
-    
+
     def set_active_checks(self, hostname, enabled, comment=None, author=None):
         """
         Toggle active checks for host and all related services.
@@ -545,7 +693,7 @@ class Icinga2Config(object):
             name=hostname,
             attrs={'attrs': {'enable_active_checks': enabled}}
         )
-        logger.debug("Set active host checks result: {}".format(result))
+        logger.debug(LazyMessage("Set active host checks result: {}", result))
 
         # Remove comment when active checks are enabled again, otherwise add comment
         if enabled:
@@ -554,7 +702,7 @@ class Icinga2Config(object):
                 filter='host.name==hostname && comment==comment',
                 filter_vars={'hostname': hostname, 'comment': comment},
             )
-            logger.debug("Remove comment result: {}".format(result))
+            logger.debug(LazyMessage("Remove comment result: {}", result))
         else:
             result = self.client.actions.add_comment(
                 object_type='Host',
@@ -562,25 +710,15 @@ class Icinga2Config(object):
                 filter_vars={'hostname': hostname},
                 author=author,
                 comment=comment)
-            logger.debug("Add comment result: {}".format(result))
+            logger.debug(LazyMessage("Add comment result: {}", result))
 
-        # Set active checks for all related services
-        services = self.client.objects.list(
-            object_type='Service',
-            filter='host.name==hostname',
-            filter_vars={'hostname': hostname},
-            attrs=['name']
-        )
-        service_names = [service['name'] for service in services]
-        for servicename in service_names:
-            logger.info("{} active checks for service '{}'"
-                        .format('Enabling' if enabled else 'Disabling', servicename))
-            result = self.client.objects.update(
-                object_type='Service',
-                name=servicename,
-                attrs={'attrs': {'enable_active_checks': enabled}}
-            )
-            logger.debug("Set active service checks result: {}".format(result))
+        # Set active checks for all related services with a single request
+        result = self.update_objects(
+            'Service', 'host.name==hostname', {'hostname': hostname},
+            {'enable_active_checks': enabled})
+        logger.info("{} active checks for {} services"
+                    .format('Enabled' if enabled else 'Disabled', len(result['results'])))
+        logger.debug(LazyMessage("Set active service checks result: {}", result))
 
     def set_host_notifications(self, hostname, enabled, notes):
         """
@@ -607,3 +745,209 @@ class Icinga2Config(object):
         return self.client.objects.update(
             'Service', obj, {'attrs': {'enable_notifications': enabled, 'notes': notes}}
         )
+
+    def update_objects(self, object_type, filter, filter_vars, attrs):
+        """
+        Modify attributes of all objects matching filter with a single request
+
+        :param object_type: object type, e.g. 'Service'
+        :param filter: filter expression
+        :param filter_vars: filter variables
+        :param attrs: attributes to set
+        :return: response
+        """
+        # icinga2api only updates objects by name
+        return self._post('objects/{}s'.format(object_type.lower()), {
+            'filter': filter,
+            'filter_vars': filter_vars,
+            'attrs': attrs,
+        })
+
+    def _post(self, path, payload):
+        """
+        POST to the API of the primary endpoint, for requests icinga2api doesn't offer.
+        Uses a requests session with the credentials of the client.
+
+        :param path: path relative to the API url, e.g. 'objects/services'
+        :param payload: JSON body
+        :return: response
+        :rtype: dict
+        """
+        import requests
+
+        if self._http_session is None:
+            session = requests.Session()
+            session.auth = (self.username, self.password)
+            session.verify = not self.ignore_insecure_requests
+            session.headers['Accept'] = 'application/json'
+            self._http_session = session
+        url = '{}/{}'.format(self.url.rstrip('/'), path)
+        response = self._http_session.post(url, json=payload, timeout=self.timeout)
+        if response.status_code >= 400:
+            raise Icinga2Error("Request to {} failed with status {}: {}"
+                               .format(url, response.status_code, response.text))
+        return response.json()
+
+    def _bulk(self, request, object_type, operations):
+        """
+        Group operations with identical parameters (and host for services) and perform
+        one filter-based request per group.
+
+        :param request: callable(filter, filter_vars, **params) performing the request
+        :param object_type: 'Host' or 'Service'
+        :param operations: dicts with host_name, service_name (for services) and parameters
+        :return: result per object, None if the object was not matched
+        :rtype: dict {host_name or (host_name, service_name): result}
+        """
+        groups = OrderedDict()
+        for operation in operations:
+            params = tuple(sorted(
+                (key, value) for key, value in operation.items()
+                if key not in ('host_name', 'service_name')))
+            if object_type == 'Service':
+                key = (operation['host_name'], operation['service_name'])
+                group = (operation['host_name'], params)
+            else:
+                key = operation['host_name']
+                group = params
+            groups.setdefault(group, []).append(key)
+
+        results = OrderedDict()
+        for group, keys in groups.items():
+            for i in range(0, len(keys), BULK_CHUNK_SIZE):
+                chunk = keys[i:i + BULK_CHUNK_SIZE]
+                if object_type == 'Service':
+                    filter_vars = {'hostname': group[0],
+                                   'servicenames': [key[1] for key in chunk]}
+                    with timed_operation('bulk_service', group[0], objects=len(chunk)):
+                        response = request(
+                            filter='host.name==hostname && service.name in servicenames',
+                            filter_vars=filter_vars, **dict(group[1]))
+                    by_name = dict(('{}!{}'.format(*key), key) for key in chunk)
+                else:
+                    with timed_operation('bulk_host', chunk[0], objects=len(chunk)):
+                        response = request(
+                            filter='host.name in hostnames', filter_vars={'hostnames': chunk},
+                            **dict(group))
+                    by_name = dict((key, key) for key in chunk)
+
+                for key in chunk:
+                    results[key] = None
+                for result in response.get('results', []):
+                    match = OBJECT_NAME_REGEX.search(result.get('status', ''))
+                    name = match.group(1) if match else result.get('name')
+                    if name in by_name:
+                        results[by_name[name]] = result
+                logger.debug(LazyMessage("Bulk request for {} objects - response: {}",
+                                         len(chunk), response))
+
+        for key, result in results.items():
+            if result is None or result.get('code') != 200:
+                logger.error("Bulk request failed for {}: {}".format(key, result))
+        return results
+
+    def acknowledge_services(self, acknowledgements):
+        """
+        Acknowledge services in bulk
+
+        :param acknowledgements: dicts with host_name, service_name, author, comment
+        :return: result per (host_name, service_name)
+        """
+        def request(filter, filter_vars, **params):
+            return self.client.actions.acknowledge_problem(
+                'Service', filter=filter, filter_vars=filter_vars, **params)
+        return self._bulk(request, 'Service', acknowledgements)
+
+    def acknowledge_hosts(self, acknowledgements):
+        """
+        Acknowledge hosts in bulk
+
+        :param acknowledgements: dicts with host_name, author, comment
+        :return: result per host_name
+        """
+        def request(filter, filter_vars, **params):
+            return self.client.actions.acknowledge_problem(
+                'Host', filter=filter, filter_vars=filter_vars, **params)
+        return self._bulk(request, 'Host', acknowledgements)
+
+    def schedule_service_downtimes(self, downtimes):
+        """
+        Schedule service downtimes in bulk
+
+        :param downtimes: dicts with host_name, service_name, author, comment, start_time,
+                          end_time, duration, fixed
+        :return: result per (host_name, service_name)
+        """
+        def request(filter, filter_vars, **params):
+            return self.client.actions.schedule_downtime(
+                object_type='Service', filter=filter, filter_vars=filter_vars, **params)
+        return self._bulk(request, 'Service', downtimes)
+
+    def schedule_host_downtimes(self, downtimes):
+        """
+        Schedule host downtimes in bulk
+
+        :param downtimes: dicts with host_name, author, comment, start_time, end_time,
+                          duration, fixed
+        :return: result per host_name
+        """
+        def request(filter, filter_vars, **params):
+            return self.client.actions.schedule_downtime(
+                object_type='Host', filter=filter, filter_vars=filter_vars, **params)
+        return self._bulk(request, 'Host', downtimes)
+
+    def set_services_notifications(self, services, enabled, notes):
+        """
+        Set enable_notifications for services in bulk
+
+        :param services: (hostname, servicename) tuples
+        :param enabled: enabled
+        :param notes: notes
+        :return: result per (hostname, servicename)
+        """
+        def request(filter, filter_vars, **params):
+            return self.update_objects('Service', filter, filter_vars, params)
+        return self._bulk(request, 'Service', [
+            {'host_name': hostname, 'service_name': servicename,
+             'enable_notifications': enabled, 'notes': notes}
+            for hostname, servicename in services])
+
+    def set_hosts_notifications(self, hostnames, enabled, notes):
+        """
+        Set enable_notifications for hosts in bulk
+
+        :param hostnames: hostnames
+        :param enabled: enabled
+        :param notes: notes
+        :return: result per hostname
+        """
+        def request(filter, filter_vars, **params):
+            return self.update_objects('Host', filter, filter_vars, params)
+        return self._bulk(request, 'Host', [
+            {'host_name': hostname, 'enable_notifications': enabled, 'notes': notes}
+            for hostname in hostnames])
+
+    def set_hosts_active_checks(self, hostnames, enabled):
+        """
+        Toggle active checks for hosts and all their services in bulk
+        (without adding or removing comments, see set_active_checks).
+
+        :param hostnames: hostnames
+        :param enabled: Enable or disable
+        :type enabled: bool
+        :return: result per hostname
+        """
+        def request(filter, filter_vars, **params):
+            return self.update_objects('Host', filter, filter_vars, params)
+        results = self._bulk(request, 'Host', [
+            {'host_name': hostname, 'enable_active_checks': enabled}
+            for hostname in hostnames])
+
+        hostnames = list(hostnames)
+        for i in range(0, len(hostnames), BULK_CHUNK_SIZE):
+            result = self.update_objects(
+                'Service', 'host.name in hostnames',
+                {'hostnames': hostnames[i:i + BULK_CHUNK_SIZE]},
+                {'enable_active_checks': enabled})
+            logger.debug(LazyMessage("Set active service checks result: {}", result))
+        return results
@@ -0,0 +1,128 @@
+"""
+Lazy attribute hydration for Icinga2 objects.
+
+Objects are listed with a minimal set of attributes. When an attribute is accessed that
+has not been fetched, it is loaded with one follow-up request for all objects of the
+same listing, not one request per object.
+"""
+import logging
+import threading
+
+from icinga_migration_utils.icinga2.icinga2 import BULK_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class LazyAttrs(dict):
+    """
+    Attribute dictionary of a lazily listed Icinga2 object
+    """
+
+    def __init__(self, batch, name, attrs):
+        super(LazyAttrs, self).__init__(attrs)
+        self._batch = batch
+        self._name = name
+
+    def __missing__(self, key):
+        self._batch.hydrate(key)
+        if dict.__contains__(self, key):
+            return dict.__getitem__(self, key)
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        if not dict.__contains__(self, key):
+            self._batch.hydrate(key)
+        return dict.__contains__(self, key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __reduce__(self):
+        # pickle/copy as plain dict
+        return dict, (dict(self),)
+
+
+class LazyBatch(object):
+    """
+    Objects of one listing, hydrated together
+    """
+
+    def __init__(self, icinga2, object_type, query, objects):
+        """
+        :param icinga2: Icinga2Config
+        :param object_type: object type, e.g. 'Service'
+        :param query: filter/filter_vars/joins used for the listing
+        :param objects: objects as returned by the listing
+        """
+        self.icinga2 = icinga2
+        self.object_type = object_type
+        self.query = query
+        self.hydrated = set()
+        self.lock = threading.Lock()
+        self.objects = {}
+        for obj in objects:
+            obj['attrs'] = LazyAttrs(self, obj['name'], obj['attrs'])
+            self.objects[obj['name']] = obj
+
+    def hydrate(self, attr):
+        """
+        Load attribute for all objects of this batch
+
+        :param attr: attribute name
+        """
+        with self.lock:
+            if attr in self.hydrated:
+                return
+            self.hydrated.add(attr)
+
+            pending = [name for name, obj in self.objects.items()
+                       if not dict.__contains__(obj['attrs'], attr)]
+            if not pending:
+                return
+            logger.debug("Hydrating {}.{} for {} objects"
+                         .format(self.object_type, attr, len(pending)))
+
+            if len(pending) == len(self.objects):
+                # Same query as the listing - one request for all objects
+                queries = [dict(self.query)]
+            else:
+                name_filter = '{}.__name in names'.format(self.object_type.lower())
+                queries = [
+                    {'filter': name_filter,
+                     'filter_vars': {'names': pending[i:i + BULK_CHUNK_SIZE]}}
+                    for i in range(0, len(pending), BULK_CHUNK_SIZE)]
+
+            for query in queries:
+                query.pop('joins', None)
+                try:
+                    results = self.icinga2.get_objects_list(
+                        object_type=self.object_type, attrs=[attr], **query)
+                except Exception as error:
+                    # e.g. invalid attribute - leave it missing
+                    logger.debug("Could not hydrate {}.{}: {}"
+                                 .format(self.object_type, attr, error))
+                    return
+                for result in results:
+                    obj = self.objects.get(result['name'])
+                    if obj is not None and attr in result['attrs']:
+                        dict.__setitem__(obj['attrs'], attr, result['attrs'][attr])
+
+
+def lazy_list(icinga2, object_type, attrs, **query):
+    """
+    List objects with minimal attributes, load other attributes on first access.
+
+    :param icinga2: Icinga2Config
+    :param object_type: object type, e.g. 'Service'
+    :param attrs: attributes to fetch right away
+    :param query: filter, filter_vars and joins
+    :return: objects
+    :rtype: list
+    """
+    query = dict((key, value) for key, value in query.items() if value)
+    objects = icinga2.get_objects_list(object_type=object_type, attrs=attrs, **query)
+    LazyBatch(icinga2, object_type, query, objects)
+    return objects
@@ -0,0 +1,309 @@
+"""
+Local mirror of Icinga2 state.
+
+Hosts, services, downtimes and comments are bulk loaded once and kept current from
+the Icinga2 event stream (/v1/events), so repeated reads don't hit the API.
+"""
+import json
+import logging
+import threading
+
+import requests
+
+from icinga_migration_utils.icinga2.icinga2 import SERVICE_ATTRS, Icinga2Error
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE = 'icinga-migration-utils-mirror'
+
+EVENT_TYPES = [
+    'StateChange',
+    'AcknowledgementSet',
+    'AcknowledgementCleared',
+    'CommentAdded',
+    'CommentRemoved',
+    'DowntimeAdded',
+    'DowntimeRemoved',
+    'ObjectCreated',
+    'ObjectDeleted',
+]
+
+# Service attributes kept in the mirror in addition to SERVICE_ATTRS
+MIRROR_SERVICE_ATTRS = SERVICE_ATTRS + [
+    'host_name', 'state', 'state_type', 'acknowledgement', 'original_attributes']
+
+
+class Icinga2Mirror(object):
+    """
+    In-memory copy of Icinga2 hosts, services, downtimes and comments.
+
+    Objects are stored in the same format as returned by the API. Read methods return
+    copies including the joins requested by Icinga2Config, events applied later don't
+    change the returned objects.
+    """
+
+    def __init__(self, icinga2, queue=DEFAULT_QUEUE, service_attrs=None, reconnect_delay=5):
+        """
+        :param icinga2: Icinga2Config used for the bulk load and the event stream
+        :param queue: event stream queue name
+        :param service_attrs: service attributes to mirror
+        :param reconnect_delay: seconds to wait before reconnecting to the event stream
+        """
+        self.icinga2 = icinga2
+        self.queue = queue
+        self.service_attrs = service_attrs or MIRROR_SERVICE_ATTRS
+        self.reconnect_delay = reconnect_delay
+        self.hosts = {}
+        self.services = {}
+        self.downtimes = {}
+        self.comments = {}
+        self.events_applied = 0
+        self.lock = threading.RLock()
+        self._response = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._loaded = threading.Event()
+
+    def _objects(self, object_type):
+        return {
+            'Host': self.hosts,
+            'Service': self.services,
+            'Downtime': self.downtimes,
+            'Comment': self.comments,
+        }.get(object_type)
+
+    def _fetch(self, object_type, name=None):
+        kwargs = {'object_type': object_type}
+        if name:
+            kwargs['name'] = name
+        if object_type == 'Service':
+            kwargs['attrs'] = self.service_attrs
+        return self.icinga2.get_objects_list(**kwargs)
+
+    def load(self):
+        """
+        Bulk load all mirrored objects (one request per object type)
+        """
+        objects = {}
+        for object_type in ['Host', 'Service', 'Downtime', 'Comment']:
+            objects[object_type] = {obj['name']: obj for obj in self._fetch(object_type)}
+
+        with self.lock:
+            self.hosts = objects['Host']
+            self.services = objects['Service']
+            self.downtimes = objects['Downtime']
+            self.comments = objects['Comment']
+        self._loaded.set()
+        logger.info("Mirrored {} hosts, {} services, {} downtimes, {} comments".format(
+            len(self.hosts), len(self.services), len(self.downtimes), len(self.comments)))
+
+    def apply_event(self, event):
+        """
+        Update mirror from a single event stream message
+
+        :param event: decoded event
+        :type event: dict
+        """
+        event_type = event.get('type')
+        created = None
+        if event_type == 'ObjectCreated' and self._objects(event.get('object_type')) is not None:
+            # fetch without holding the lock, readers are not blocked by the request
+            created = self._fetch(event['object_type'], event['object_name'])
+
+        with self.lock:
+            if event_type == 'StateChange':
+                obj = self._get_checkable(event)
+                if obj is not None:
+                    obj['attrs']['state'] = event.get('state')
+                    obj['attrs']['state_type'] = event.get('state_type')
+                    obj['attrs']['last_check_result'] = event.get('check_result')
+
+            elif event_type == 'AcknowledgementSet':
+                obj = self._get_checkable(event)
+                if obj is not None:
+                    obj['attrs']['acknowledgement'] = event.get('acknowledgement_type', 1)
+
+            elif event_type == 'AcknowledgementCleared':
+                obj = self._get_checkable(event)
+                if obj is not None:
+                    obj['attrs']['acknowledgement'] = 0
+
+            elif event_type in ('CommentAdded', 'DowntimeAdded'):
+                key = 'comment' if event_type == 'CommentAdded' else 'downtime'
+                self._add(key.capitalize(), event[key])
+
+            elif event_type in ('CommentRemoved', 'DowntimeRemoved'):
+                key = 'comment' if event_type == 'CommentRemoved' else 'downtime'
+                self._objects(key.capitalize()).pop(_full_name(event[key]), None)
+
+            elif event_type == 'ObjectCreated':
+                objects = self._objects(event.get('object_type'))
+                for obj in created or []:
+                    objects[obj['name']] = obj
+
+            elif event_type == 'ObjectDeleted':
+                objects = self._objects(event.get('object_type'))
+                if objects is not None:
+                    objects.pop(event['object_name'], None)
+
+            else:
+                logger.debug("Ignoring event type '{}'".format(event_type))
+                return
+            self.events_applied += 1
+
+    def _get_checkable(self, event):
+        if event.get('service'):
+            return self.services.get('{}!{}'.format(event['host'], event['service']))
+        return self.hosts.get(event['host'])
+
+    def _add(self, object_type, attrs):
+        name = _full_name(attrs)
+        attrs = dict((key, value) for key, value in attrs.items() if not key.startswith('__'))
+        self._objects(object_type)[name] = {
+            'name': name,
+            'type': object_type,
+            'attrs': attrs,
+            'joins': {},
+            'meta': {},
+        }
+
+    def _subscribe(self):
+        url = '{}/events'.format(self.icinga2.url.rstrip('/'))
+        return requests.post(
+            url,
+            auth=(self.icinga2.username, self.icinga2.password),
+            headers={'Accept': 'application/json'},
+            json={'types': EVENT_TYPES, 'queue': self.queue},
+            verify=not self.icinga2.ignore_insecure_requests,
+            timeout=(self.icinga2.timeout, None),
+            stream=True,
+        )
+
+    def follow(self, reconnect=True):
+        """
+        Subscribe to the event stream, bulk load and apply events until stopped.
+        The subscription is opened before loading, so no events get lost in between.
+
+        :param reconnect: reconnect (and reload) when the stream ends
+        """
+        while not self._stop.is_set():
+            try:
+                self._response = self._subscribe()
+                self._response.raise_for_status()
+                self.load()
+                for line in self._response.iter_lines():
+                    if self._stop.is_set():
+                        break
+                    if line:
+                        self.apply_event(json.loads(line.decode('utf-8')))
+            except (requests.RequestException, ValueError) as error:
+                if self._stop.is_set():
+                    break
+                logger.error("Event stream error: {}".format(error))
+            finally:
+                if self._response is not None:
+                    self._response.close()
+                    self._response = None
+
+            if not reconnect:
+                break
+            self._stop.wait(self.reconnect_delay)
+
+    def start(self):
+        """
+        Follow the event stream in a background thread.
+        Returns when the initial bulk load is done.
+        """
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.follow, name='icinga2-mirror', daemon=True)
+        self._thread.start()
+        while not self._loaded.wait(0.1):
+            if not self._thread.is_alive():
+                raise Icinga2Error("Could not load Icinga2 mirror")
+
+    def stop(self):
+        """
+        Stop following the event stream
+        """
+        self._stop.set()
+        if self._response is not None:
+            self._response.close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def get_hosts(self, host_name=None):
+        with self.lock:
+            if host_name:
+                host = self.hosts.get(host_name)
+                return [_copy(host)] if host else []
+            return [_copy(host) for host in self.hosts.values()]
+
+    def get_services(self, host_address=None, host_name=None, service_name=None):
+        with self.lock:
+            services = []
+            for service in self.services.values():
+                attrs = service['attrs']
+                if host_name and attrs.get('host_name') != host_name:
+                    continue
+                if service_name and attrs.get('name') != service_name:
+                    continue
+                host = self.hosts.get(attrs.get('host_name'), {}).get('attrs', {})
+                if host_address and host.get('address') != host_address:
+                    continue
+                services.append(_copy(service, {'host': {'name': host.get('name'),
+                                                         'address': host.get('address')}}))
+            return services
+
+    def get_downtimes(self, **query):
+        # Accept Icinga2Config.schedule_service_downtime argument names as well
+        query = dict((key.replace('downtime_', '', 1), value) for key, value in query.items())
+        with self.lock:
+            downtimes = []
+            for downtime in self.downtimes.values():
+                attrs = downtime['attrs']
+                if all(attrs.get(key) == value for key, value in query.items()):
+                    downtimes.append(_copy(downtime, self._joins(downtime, service=True)))
+            return downtimes
+
+    def get_acknowledgements(self, host_name=None, author=None, comment=None,
+                             service_name=None):
+        query = {'host_name': host_name, 'author': author, 'text': comment,
+                 'service_name': service_name}
+        query = dict((key, value) for key, value in query.items() if value)
+        with self.lock:
+            comments = []
+            for obj in self.comments.values():
+                if all(obj['attrs'].get(key) == value for key, value in query.items()):
+                    comments.append(_copy(obj, self._joins(obj)))
+            return comments
+
+    def _joins(self, obj, service=False):
+        host = self.hosts.get(obj['attrs'].get('host_name'), {}).get('attrs', {})
+        joins = {'host': {'name': host.get('name'), 'address': host.get('address')}}
+        if service:
+            joins['service'] = {'name': obj['attrs'].get('service_name') or None}
+        return joins
+
+
+def _copy(obj, joins=None):
+    """
+    Copy of a mirrored object (events replace attribute values, attrs are copied)
+
+    :param obj: mirrored object
+    :param joins: joins to set on the copy
+    """
+    obj = dict(obj, attrs=dict(obj['attrs']))
+    if joins is not None:
+        obj['joins'] = joins
+    return obj
+
+
+def _full_name(attrs):
+    """
+    Full object name of a comment or downtime as sent with events
+    """
+    if attrs.get('__name'):
+        return attrs['__name']
+    parts = [attrs.get('host_name'), attrs.get('service_name'), attrs.get('name')]
+    return '!'.join(part for part in parts if part)
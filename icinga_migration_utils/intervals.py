@@ -0,0 +1,76 @@
+"""
+Static interval index for time range queries (e.g. downtimes active at a time).
+"""
+from bisect import bisect_right
+
+
+class IntervalIndex(object):
+    """
+    Index of items with a (start, end) interval.
+
+    Items are sorted by start time, a segment tree holds the maximum end time per
+    range, so overlap queries take O(log n + k) for k results.
+
+    Example:
+        index = IntervalIndex(downtimes, lambda d: (int(d['start_time']), int(d['end_time'])))
+        index.overlapping(start, end)
+    """
+
+    def __init__(self, items, key):
+        """
+        :param items: items to index
+        :param key: callable returning (start, end) of an item
+        """
+        entries = sorted(((key(item), item) for item in items), key=lambda entry: entry[0])
+        self.starts = [interval[0] for interval, item in entries]
+        self.ends = [interval[1] for interval, item in entries]
+        self.items = [item for interval, item in entries]
+        self.tree = [None] * (4 * len(self.items))
+        if self.items:
+            self._build(1, 0, len(self.items))
+
+    def __len__(self):
+        return len(self.items)
+
+    def _build(self, node, lo, hi):
+        if hi - lo == 1:
+            self.tree[node] = self.ends[lo]
+        else:
+            mid = (lo + hi) // 2
+            self.tree[node] = max(self._build(2 * node, lo, mid),
+                                  self._build(2 * node + 1, mid, hi))
+        return self.tree[node]
+
+    def overlapping(self, start, end):
+        """
+        Get items overlapping interval [start, end] (bounds inclusive)
+
+        :return: items ordered by start time
+        :rtype: list
+        """
+        # only items starting before end can overlap
+        limit = bisect_right(self.starts, end)
+        result = []
+        if not limit:
+            return result
+
+        stack = [(1, 0, len(self.items))]
+        while stack:
+            node, lo, hi = stack.pop()
+            if lo >= limit or self.tree[node] < start:
+                continue
+            if hi - lo == 1:
+                result.append(lo)
+            else:
+                mid = (lo + hi) // 2
+                stack.append((2 * node + 1, mid, hi))
+                stack.append((2 * node, lo, mid))
+        return [self.items[i] for i in result]
+
+    def at(self, timestamp):
+        """
+        Get items whose interval contains timestamp
+
+        :rtype: list
+        """
+        return self.overlapping(timestamp, timestamp)
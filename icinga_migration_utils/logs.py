@@ -0,0 +1,183 @@
+"""
+Lazily formatted and structured logging.
+
+Debug messages of whole objects (services, API responses) are expensive to format,
+LazyMessage and LazyYaml defer formatting until a handler emits the record, so
+nothing is formatted when the level is disabled:
+
+    logger.debug(LazyYaml(service, '    '))
+    logger.debug(LazyMessage("Got response: {}", response))
+
+Operations (writes to Icinga2) are logged with log_operation/timed_operation to the
+'icinga_migration_utils.operations' logger. Records carry the operation as structured
+data, which OperationLogHandler writes as one JSON object per line:
+
+    with operation_log('migration.jsonl'):
+        migrate_service_notification_states(simulate=False)
+"""
+import contextlib
+import json
+import logging
+import threading
+import time
+
+from icinga_migration_utils.utils import BatchWriter, pretty_print_dict
+
+OPERATIONS_LOGGER = 'icinga_migration_utils.operations'
+
+operations_logger = logging.getLogger(OPERATIONS_LOGGER)
+
+
+class LazyMessage(object):
+    """
+    Message formatted with str.format when the record is emitted
+    """
+
+    def __init__(self, fmt, *args, **kwargs):
+        self.fmt = fmt
+        self.args = args
+        self.kwargs = kwargs
+
+    def __str__(self):
+        return self.fmt.format(*self.args, **self.kwargs)
+
+
+class LazyYaml(object):
+    """
+    Dictionary pretty printed as YAML (see pretty_print_dict) when the record is emitted
+    """
+
+    def __init__(self, d, indent=''):
+        self.d = d
+        self.indent = indent
+
+    def __str__(self):
+        return pretty_print_dict(self.d, self.indent).rstrip('\n')
+
+
+def _json_value(value):
+    try:
+        json.dumps(value)
+    except (TypeError, ValueError):
+        return str(value)
+    return value
+
+
+def log_operation(operation, obj, result='ok', duration=None, level=logging.INFO, **fields):
+    """
+    Log an operation as structured record (nothing is built if the level is disabled)
+
+    :param operation: operation, e.g. 'set_service_notifications'
+    :param obj: object the operation was performed on, e.g. hostname
+    :param result: 'ok', 'error' or another short result
+    :param duration: duration in seconds
+    :param level: log level
+    :param fields: additional JSON serializable fields
+    """
+    if not operations_logger.isEnabledFor(level):
+        return
+    data = {'operation': operation, 'object': _json_value(obj), 'result': result,
+            'duration': None if duration is None else round(duration, 6)}
+    data.update((key, _json_value(value)) for key, value in fields.items())
+    operations_logger.log(
+        level, LazyMessage("{operation} {object}: {result}", **data),
+        extra={'operation': data})
+
+
+@contextlib.contextmanager
+def timed_operation(operation, obj, **fields):
+    """
+    Log operation with its duration, result is 'error' (with the error) if the block raises
+
+    Example:
+        with timed_operation('schedule_host_downtime', hostname):
+            icinga2.schedule_host_downtime(...)
+
+    :param operation: operation
+    :param obj: object the operation is performed on
+    :param fields: additional JSON serializable fields
+    """
+    start = time.monotonic()
+    try:
+        yield
+    except Exception as error:
+        log_operation(operation, obj, 'error', time.monotonic() - start,
+                      level=logging.ERROR, error=str(error), **fields)
+        raise
+    log_operation(operation, obj, 'ok', time.monotonic() - start, **fields)
+
+
+class OperationLogHandler(logging.Handler):
+    """
+    Write operation records as JSON lines:
+    {"time": ..., "level": ..., "operation": ..., "object": ..., "result": ...,
+     "duration": ..., ...}
+
+    Records without operation data are ignored.
+    """
+
+    def __init__(self, path, batch_size=100):
+        """
+        :param path: JSONL file, appended to
+        :param batch_size: records to buffer before writing
+        """
+        super(OperationLogHandler, self).__init__()
+        self.f = open(path, 'a')
+        self.writer = BatchWriter(self.f, batch_size)
+
+    def emit(self, record):
+        data = getattr(record, 'operation', None)
+        if data is None:
+            return
+        try:
+            entry = {'time': round(record.created, 6), 'level': record.levelname}
+            entry.update(data)
+            self.writer.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        self.acquire()
+        try:
+            self.writer.flush()
+            self.f.flush()
+        finally:
+            self.release()
+
+    def close(self):
+        self.acquire()
+        try:
+            if not self.f.closed:
+                self.writer.flush()
+                self.f.close()
+        finally:
+            self.release()
+        super(OperationLogHandler, self).close()
+
+
+_operation_log_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def operation_log(path, level=logging.INFO):
+    """
+    Write operations logged within the block to a JSONL file
+
+    :param path: JSONL file, appended to
+    :param level: minimum level of operations to write
+    :return: OperationLogHandler
+    """
+    handler = OperationLogHandler(path)
+    handler.setLevel(level)
+    with _operation_log_lock:
+        previous_level = operations_logger.level
+        if not operations_logger.isEnabledFor(level):
+            operations_logger.setLevel(level)
+        operations_logger.addHandler(handler)
+    try:
+        yield handler
+    finally:
+        with _operation_log_lock:
+            operations_logger.removeHandler(handler)
+            operations_logger.setLevel(previous_level)
+        handler.close()
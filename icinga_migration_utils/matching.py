@@ -0,0 +1,132 @@
+"""
+Match Icinga1 and Icinga2 services.
+
+Services are matched per host by their extracted check command
+(check_command_extracted) or by the Icinga2 custom variable 'comment' that holds the
+Icinga1 check command of migrated services.
+"""
+import functools
+import re
+from collections import defaultdict
+
+from icinga_migration_utils.utils import CHECK_COMMAND_MAP, getter, getpath
+
+# All CHECK_COMMAND_MAP patterns in one regex, one named group per pattern
+CHECK_COMMAND_MAP_REGEX = re.compile('|'.join(
+    '(?P<cmd{}>{})'.format(i, pattern) for i, pattern in enumerate(CHECK_COMMAND_MAP)))
+CHECK_COMMAND_MAP_NAMES = dict(
+    ('cmd{}'.format(i), name) for i, name in enumerate(CHECK_COMMAND_MAP.values()))
+
+_get_comment = getter('attrs.vars.comment')
+
+
+@functools.lru_cache(maxsize=None)
+def extract_check_command(check_command, nrpe_command=None):
+    """
+    Extract comparable check command:
+    * Icinga1: 'check_nrpe!check_disk!...' => 'check_disk', 'check_tcp!22' => 'check_tcp'
+    * Icinga2: 'nrpe' with vars.nrpe_command 'check_disk' => 'check_disk'
+    Commands matching a CHECK_COMMAND_MAP pattern are replaced by the mapped name.
+
+    :param check_command: Icinga1 check_command or Icinga2 check_command attribute
+    :param nrpe_command: Icinga2 vars.nrpe_command
+    :return: extracted check command
+    :rtype: str
+    """
+    if not check_command:
+        return None
+    args = check_command.split('!')
+    command = args[0]
+    if command.startswith('check_nrpe') and len(args) > 1:
+        command = args[1]
+    elif command == 'nrpe' and nrpe_command:
+        command = nrpe_command
+
+    match = CHECK_COMMAND_MAP_REGEX.fullmatch(command)
+    if match:
+        return CHECK_COMMAND_MAP_NAMES[match.lastgroup]
+    return command
+
+
+def annotate_icinga1_service(service):
+    """
+    Set check_command_extracted for an Icinga1 service (once)
+
+    :param service: Icinga1 service
+    :return: service
+    """
+    if 'check_command_extracted' not in service:
+        service['check_command_extracted'] = extract_check_command(service.get('check_command'))
+    return service
+
+
+def annotate_icinga2_service(service):
+    """
+    Set check_command_extracted for an Icinga2 service (once)
+
+    :param service: Icinga2 service
+    :return: service
+    """
+    if 'check_command_extracted' not in service:
+        attrs = service['attrs']
+        service['check_command_extracted'] = extract_check_command(
+            attrs.get('check_command'), getpath(attrs, 'vars.nrpe_command'))
+    return service
+
+
+def get_comment(service):
+    """
+    Icinga2 vars.comment of service
+
+    :param service: Icinga2 service
+    :return: comment or None
+    """
+    return _get_comment(service) or None
+
+
+class ServiceIndex(object):
+    """
+    Per-host hash indexes of Icinga2 services on check_command_extracted and comment.
+
+    Example:
+        index = ServiceIndex(icinga2.get_services_by_hostname())
+        services = index.find('host1', check_command_extracted='check_disk')
+    """
+
+    def __init__(self, services_by_host):
+        """
+        :param services_by_host: Icinga2 services by hostname
+        :type services_by_host: dict
+        """
+        self.by_command = defaultdict(list)
+        self.by_comment = defaultdict(list)
+        for host_name, services in services_by_host.items():
+            for position, service in enumerate(services):
+                annotate_icinga2_service(service)
+                self.by_command[(host_name, service['check_command_extracted'])].append(
+                    (position, service))
+                comment = get_comment(service)
+                if comment:
+                    self.by_comment[(host_name, comment)].append((position, service))
+
+    def find(self, host_name, check_command_extracted=None, comment=None):
+        """
+        Find Icinga2 services of host by extracted check command or comment.
+        More than one result means the match is ambiguous.
+
+        :param host_name: hostname
+        :param check_command_extracted: extracted check command to match
+        :param comment: value of vars.comment to match
+        :return: matching services in Icinga2 order
+        :rtype: list
+        """
+        matches = []
+        if check_command_extracted:
+            matches.extend(self.by_command.get((host_name, check_command_extracted), []))
+        if comment:
+            matches.extend(self.by_comment.get((host_name, comment), []))
+        if len(matches) > 1:
+            matches = sorted(dict((id(service), (position, service))
+                                  for position, service in matches).values(),
+                             key=lambda match: match[0])
+        return [service for position, service in matches]
@@ -1,15 +1,15 @@
 import logging
 
-from icinga_migration_utils.icinga1.icinga1 import Icinga1Config
-from icinga_migration_utils.icinga2.icinga2 import Icinga2Config
 from icinga_migration_utils.migrate import MIGRATION_COMMENT_SUFFIX
-from icinga_migration_utils.utils import ndict
+from icinga_migration_utils.migrate.executor import submit_write, wait_writes
+from icinga_migration_utils.session import MigrationSession
 
 logger = logging.getLogger(__name__)
 
 
 def migrate_service_acknowledgements(simulate=True, suffix=MIGRATION_COMMENT_SUFFIX,
-                                     hostname=None):
+                                     hostname=None, executor=None, snapshot=None,
+                                     session=None):
     """
     Migrate all service acknowledgements or only service acknowledgements
     related to one hostname.
@@ -20,23 +20,28 @@ def migrate_service_acknowledgements(simulate=True, suffix=MIGRATION_COMMENT_SUF
     :type suffix: str
     :param hostname: hostname to migrate acks for
     :type hostname: str
+    :param executor: WriteExecutor to perform writes with (write serially if not set)
+    :param snapshot: Icinga2Snapshot to check for existing acks (loaded if not set)
+    :param session: MigrationSession to share fetched data with other functions
     :return:
     """
     result = []
-    icinga1 = Icinga1Config()
-    icinga2 = Icinga2Config()
+    session = session or MigrationSession()
+    icinga2 = session.icinga2
 
-    icinga1_services = icinga1.get_services_by_hostname()
-    icinga2_services_all = icinga2.get_services_by_hostname()
-    icinga2_hosts = icinga2.get_hosts_dict()
+    icinga1_services = session.icinga1_services_by_host()
+    icinga2_service_index = session.icinga2_service_index()
+    icinga2_hosts = session.icinga2_hosts_dict()
+    if snapshot is None and not simulate:
+        snapshot = session.snapshot(suffix)
 
-    migrate_count = 0
+    writes = []
 
     if hostname:
-        icinga1_acks = [ack for ack in icinga1.service_acknowledgements
+        icinga1_acks = [ack for ack in session.icinga1_service_acknowledgements()
                         if ack['host_name'] == hostname]
     else:
-        icinga1_acks = [ack for ack in icinga1.service_acknowledgements]
+        icinga1_acks = list(session.icinga1_service_acknowledgements())
 
     for ack in icinga1_acks:
         ack_hostname = ack['host_name']
@@ -50,11 +55,10 @@ def migrate_service_acknowledgements(simulate=True, suffix=MIGRATION_COMMENT_SUF
         assert len(services_icinga1) == 1
         service_icinga1 = services_icinga1[0]
 
-        services_icinga2 = [
-            service for service in icinga2_services_all[ack_hostname]
-            if service['check_command_extracted'] == service_icinga1['check_command_extracted']
-            or ndict(service)['attrs']['vars']['comment'] == service_icinga1['check_command_extracted']
-        ]
+        services_icinga2 = icinga2_service_index.find(
+            ack_hostname,
+            check_command_extracted=service_icinga1['check_command_extracted'],
+            comment=service_icinga1['check_command_extracted'])
         if not services_icinga2:
             logger.error("Could not find Service: {}!{}".format(
                 ack_hostname, service_icinga1['check_command_extracted']))
@@ -65,27 +69,35 @@ def migrate_service_acknowledgements(simulate=True, suffix=MIGRATION_COMMENT_SUF
                             .format(ack_hostname, service_icinga1['check_command_extracted']))
             else:
 
-                if icinga2.get_acknowledgements(
-                        host_name=ack_hostname,
-                        author=ack['author'],
-                        service_name=icinga2_service_name,
-                        comment=ack['comment_data'] + suffix):
+                if snapshot.has_acknowledgement(
+                        ack_hostname, icinga2_service_name, ack['author'],
+                        ack['comment_data'] + suffix):
                     logger.warning("Acknowledgement {} already exists - skipping".format(ack))
                 else:
-                    result = icinga2.acknowledge_service(
+                    future = submit_write(
+                        executor, ack_hostname, icinga2.acknowledge_service,
                         host_name=ack_hostname,
                         service_name=icinga2_service_name,
                         author=ack['author'],
                         comment=ack['comment_data'] + suffix
                     )
-                    if result:
-                        migrate_count += 1
+                    snapshot.track_acknowledgement(
+                        future, ack_hostname, icinga2_service_name, ack['author'],
+                        ack['comment_data'] + suffix)
+                    writes.append((future, "service acknowledgement {}!{}"
+                                   .format(ack_hostname, icinga2_service_name)))
+
+    results = wait_writes(writes)
+    migrate_count = len([result for result in results if result])
+    if results:
+        result = results[-1]
     logger.info("Migrated {} service acknowledgements".format(migrate_count))
     return result
 
 
 def migrate_host_acknowledgements(simulate=True, suffix=MIGRATION_COMMENT_SUFFIX,
-                                  hostname=None):
+                                  hostname=None, executor=None, snapshot=None,
+                                  session=None):
     """
     Migrate all host acknowledgements or just only acks related to one hostname.
 
@@ -95,20 +107,25 @@ def migrate_host_acknowledgements(simulate=True, suffix=MIGRATION_COMMENT_SUFFIX
     :type suffix: str
     :param hostname: hostname to migrate acks for
     :type hostname: str
+    :param executor: WriteExecutor to perform writes with (write serially if not set)
+    :param snapshot: Icinga2Snapshot to check for existing acks (loaded if not set)
+    :param session: MigrationSession to share fetched data with other functions
     :return:
     """
     result = []
-    icinga1 = Icinga1Config()
-    icinga2 = Icinga2Config()
-    migrate_count = 0
+    session = session or MigrationSession()
+    icinga2 = session.icinga2
+    if snapshot is None and not simulate:
+        snapshot = session.snapshot(suffix)
+    writes = []
 
     if hostname:
         icinga1_host_acks = [
-            ack for ack in icinga1.host_acknowledgements
+            ack for ack in session.icinga1_host_acknowledgements()
             if ack['host_name'] == hostname
         ]
     else:
-        icinga1_host_acks = [ack for ack in icinga1.host_acknowledgements]
+        icinga1_host_acks = list(session.icinga1_host_acknowledgements())
 
     for ack in icinga1_host_acks:
         logger.debug(ack)
@@ -117,18 +134,23 @@ def migrate_host_acknowledgements(simulate=True, suffix=MIGRATION_COMMENT_SUFFIX
         if simulate:
             logger.info("Would acknowledge host: {}".format(host_name))
         else:
-            if icinga2.get_acknowledgements(
-                    host_name=host_name,
-                    author=ack['author'],
-                    comment=ack['comment_data'] + suffix):
+            if snapshot.has_acknowledgement(
+                    host_name, None, ack['author'], ack['comment_data'] + suffix):
                 logger.warning("Acknowledgement {} already exists - skipping".format(ack))
             else:
-                result = icinga2.acknowledge_host(
+                future = submit_write(
+                    executor, host_name, icinga2.acknowledge_host,
                     host_name=host_name,
                     author=ack['author'],
                     comment=ack['comment_data'] + suffix
                 )
-                if result:
-                    migrate_count += 1
+                snapshot.track_acknowledgement(
+                    future, host_name, None, ack['author'], ack['comment_data'] + suffix)
+                writes.append((future, "host acknowledgement {}".format(host_name)))
+
+    results = wait_writes(writes)
+    migrate_count = len([result for result in results if result])
+    if results:
+        result = results[-1]
     logger.info("Migrated {} host acknowledgements".format(migrate_count))
     return result
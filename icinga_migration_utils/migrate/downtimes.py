@@ -1,16 +1,15 @@
 import logging
 
-from icinga2api.client import Icinga2ApiException
-from icinga_migration_utils.icinga1.icinga1 import Icinga1Config
-from icinga_migration_utils.icinga2.icinga2 import Icinga2Config
+from icinga_migration_utils.logs import LazyMessage
 from icinga_migration_utils.migrate import MIGRATION_COMMENT_SUFFIX
-from icinga_migration_utils.utils import ndict
+from icinga_migration_utils.migrate.executor import submit_write, wait_writes
+from icinga_migration_utils.session import MigrationSession
 
 logger = logging.getLogger(__name__)
 
 
 def migrate_host_downtimes(simulate=True, suffix=MIGRATION_COMMENT_SUFFIX,
-                           hostname=None):
+                           hostname=None, executor=None, snapshot=None, session=None):
     """
     Migrate host downtimes
 
@@ -18,13 +17,18 @@ def migrate_host_downtimes(simulate=True, suffix=MIGRATION_COMMENT_SUFFIX,
     :param suffix: downtime comment suffix
     :type simulate: bool
     :param hostname: hostname
+    :param executor: WriteExecutor to perform writes with (write serially if not set)
+    :param snapshot: Icinga2Snapshot to check for existing downtimes (loaded if not set)
+    :param session: MigrationSession to share fetched data with other functions
     :return:
     """
-    icinga1 = Icinga1Config()
-    icinga2 = Icinga2Config()
-    icinga2_hosts = icinga2.get_hosts_dict()
+    session = session or MigrationSession()
+    icinga2 = session.icinga2
+    icinga2_hosts = session.icinga2_hosts_dict()
+    if snapshot is None:
+        snapshot = session.snapshot(suffix)
 
-    downtimes = [dt for dt in icinga1.hostdowntimes
+    downtimes = [dt for dt in session.icinga1_hostdowntimes()
                  if 'daily' not in dt['comment'].lower()
                  and 'weekly' not in dt['comment'].lower()]
 
@@ -32,7 +36,7 @@ def migrate_host_downtimes(simulate=True, suffix=MIGRATION_COMMENT_SUFFIX,
         downtimes = [downtime for downtime in downtimes if downtime['host_name'] == hostname]
 
     logger.info("Got {} host downtimes to migrate.".format(len(downtimes)))
-    migrate_count = 0
+    writes = []
 
     for downtime in downtimes:
         dt_hostname = downtime['host_name']
@@ -57,21 +61,21 @@ def migrate_host_downtimes(simulate=True, suffix=MIGRATION_COMMENT_SUFFIX,
             'fixed': fixed,
         }
 
-        try:
-            downtime_exists = icinga2.get_downtimes(**downtime_filter) != []
-        except Icinga2ApiException:
-            downtime_exists = False
-
-        if downtime_exists:
+        if snapshot.has_downtime(dt_hostname, None, author, comment, start_time, end_time):
             logger.warning("Downtime {} already exists, skipping.".format(downtime_filter))
         elif not simulate:
-            migrate_count += 1
-            icinga2.schedule_host_downtime(**downtime_filter)
+            future = submit_write(executor, dt_hostname, icinga2.schedule_host_downtime,
+                                  **downtime_filter)
+            snapshot.track_downtime(future, dt_hostname, None, author, comment, start_time,
+                                    end_time)
+            writes.append((future, "host downtime {}".format(downtime_filter)))
 
+    migrate_count = len(wait_writes(writes))
     logger.info("Migrated {} host downtimes".format(migrate_count))
 
 
-def migrate_service_downtimes(simulate=True, suffix=MIGRATION_COMMENT_SUFFIX, hostname=None):
+def migrate_service_downtimes(simulate=True, suffix=MIGRATION_COMMENT_SUFFIX, hostname=None,
+                              executor=None, snapshot=None, session=None):
     """
     Migrate service downtimes
 
@@ -79,16 +83,21 @@ def migrate_service_downtimes(simulate=True, suffix=MIGRATION_COMMENT_SUFFIX, ho
     :param suffix: downtime comment suffix
     :type simulate: bool
     :param hostname: hostname
+    :param executor: WriteExecutor to perform writes with (write serially if not set)
+    :param snapshot: Icinga2Snapshot to check for existing downtimes (loaded if not set)
+    :param session: MigrationSession to share fetched data with other functions
     :return:
     """
-    icinga1 = Icinga1Config()
-    icinga2 = Icinga2Config()
-    icinga2_hosts = icinga2.get_hosts_dict()
+    session = session or MigrationSession()
+    icinga2 = session.icinga2
+    icinga2_hosts = session.icinga2_hosts_dict()
+    if snapshot is None:
+        snapshot = session.snapshot(suffix)
 
-    icinga1_services = icinga1.get_services_by_hostname()
-    icinga2_services = icinga2.get_services_by_hostname()
+    icinga1_services = session.icinga1_services_by_host()
+    icinga2_service_index = session.icinga2_service_index()
 
-    downtimes = [dt for dt in icinga1.servicedowntimes
+    downtimes = [dt for dt in session.icinga1_servicedowntimes()
                  if 'daily' not in dt['comment'].lower()
                  and 'weekly' not in dt['comment'].lower()]
 
@@ -96,7 +105,7 @@ def migrate_service_downtimes(simulate=True, suffix=MIGRATION_COMMENT_SUFFIX, ho
         downtimes = [downtime for downtime in downtimes if downtime['host_name'] == hostname]
 
     logger.info("Got {} service downtimes to migrate.".format(len(downtimes)))
-    migrate_count = 0
+    writes = []
 
     for downtime in downtimes:
         dt_hostname = downtime['host_name']
@@ -115,11 +124,10 @@ def migrate_service_downtimes(simulate=True, suffix=MIGRATION_COMMENT_SUFFIX, ho
             service for service in icinga1_services[dt_hostname]
             if service['service_description'] == downtime['service_description']][0]
 
-        services_icinga2 = [
-            service for service in icinga2_services[dt_hostname]
-            if service['check_command_extracted'] == service_icinga1['check_command_extracted']
-            or ndict(service)['attrs']['vars']['comment'] == service_icinga1.get('check_command')
-        ]
+        services_icinga2 = icinga2_service_index.find(
+            dt_hostname,
+            check_command_extracted=service_icinga1['check_command_extracted'],
+            comment=service_icinga1.get('check_command'))
         if not services_icinga2:
             logger.error("Service not found: {}!{}"
                          .format(dt_hostname, downtime['service_description']))
@@ -153,31 +161,46 @@ def migrate_service_downtimes(simulate=True, suffix=MIGRATION_COMMENT_SUFFIX, ho
             'downtime_duration': duration,
             'downtime_fixed': fixed,
         }
-        try:
-            downtime_exists = icinga2.get_downtimes(**downtime_filter) != []
-        except Icinga2ApiException:
-            downtime_exists = False
-        if downtime_exists:
+        if snapshot.has_downtime(dt_hostname, service_name, author, comment, start_time,
+                                 end_time):
             logger.warning("Downtime {} already exists, skipping.".format(downtime_filter))
         elif not simulate:
-            migrate_count += 1
-            icinga2.schedule_service_downtime(**downtime_filter)
+            future = submit_write(executor, dt_hostname, icinga2.schedule_service_downtime,
+                                  **downtime_filter)
+            snapshot.track_downtime(future, dt_hostname, service_name, author, comment,
+                                    start_time, end_time)
+            writes.append((future, "service downtime {}".format(downtime_filter)))
         else:
             logger.warning("Would migrate downtime: {}".format(downtime_filter))
 
+    migrate_count = len(wait_writes(writes))
     logger.info("Migrated {} service downtimes".format(migrate_count))
 
 
-def clean_migrated_downtimes(suffix=MIGRATION_COMMENT_SUFFIX):
+def clean_migrated_downtimes(suffix=MIGRATION_COMMENT_SUFFIX, session=None, journal=None):
     """
     Remove all downtimes that have been migrated
+
+    :param suffix: downtime comment suffix
+    :param session: MigrationSession (its downtime snapshot is invalidated)
+    :param journal: MigrationJournal, remove exactly the downtimes it recorded by name
+        instead of all downtimes with a comment ending with suffix
     """
-    icinga2 = Icinga2Config()
+    session = session or MigrationSession()
+    icinga2 = session.icinga2
+    if journal is not None:
+        from icinga_migration_utils.migrate.journal import DOWNTIME_METHODS
+
+        journal.rollback(icinga2, methods=DOWNTIME_METHODS)
+        session.invalidate('snapshot')
+        return
+
     response = icinga2.client.actions.remove_downtime(
         object_type='Downtime',
         filter=r'match("*{}", downtime.comment)'.format(suffix)
     )
-    logger.debug("Got response: {}".format(response))
+    logger.debug(LazyMessage("Got response: {}", response))
 
     if 'results' in response:
         logger.info("Removed {} services".format(len(response['results'])))
+    session.invalidate('snapshot')
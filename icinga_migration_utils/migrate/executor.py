@@ -0,0 +1,266 @@
+"""
+Executor for Icinga2 writes performed by the migrate functions.
+
+Writes run in a worker pool with bounded concurrency and a token bucket rate limit.
+The rate is reduced when Icinga2 gets slow or overloaded (503, timeouts) and
+recovers slowly afterwards. Writes submitted with the same key (hostname) are applied
+in submission order, so a host's notification change is applied before its services'
+changes.
+"""
+import functools
+import logging
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from icinga_migration_utils.logs import operations_logger, timed_operation
+
+logger = logging.getLogger(__name__)
+
+# HTTP status codes indicating an overloaded Icinga2 master
+OVERLOAD_STATUS_CODES = (429, 502, 503, 504)
+
+STATUS_CODE_REGEX = re.compile(r'status (\d{3})')
+
+
+def is_overload_error(error):
+    """
+    Check if error was caused by an overloaded (or unreachable) Icinga2 API
+
+    :param error: exception raised by a write
+    :rtype: bool
+    """
+    from requests.exceptions import ConnectionError, ChunkedEncodingError, Timeout
+
+    if isinstance(error, (ConnectionError, ChunkedEncodingError, Timeout)):
+        return True
+    match = STATUS_CODE_REGEX.search(str(error))
+    return bool(match) and int(match.group(1)) in OVERLOAD_STATUS_CODES
+
+
+class TokenBucket(object):
+    """
+    Thread safe token bucket rate limiter
+    """
+
+    def __init__(self, rate, capacity=None):
+        """
+        :param rate: tokens per second
+        :param capacity: maximum burst (defaults to rate)
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(rate, 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until a token is available
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class WriteExecutor(object):
+    """
+    Run Icinga2 writes concurrently with rate limiting, adaptive backoff and
+    per-key ordering.
+
+    Example:
+        with WriteExecutor(concurrency=8, rate=50) as executor:
+            migrate_host_notification_states(simulate=False, executor=executor)
+            migrate_service_notification_states(simulate=False, executor=executor)
+    """
+
+    def __init__(self, concurrency=4, rate=20.0, burst=None, max_retries=5, backoff=1.0,
+                 max_backoff=60.0, latency_threshold=5.0, min_rate=0.5):
+        """
+        :param concurrency: number of worker threads
+        :param rate: maximum writes per second
+        :param burst: token bucket capacity (defaults to rate)
+        :param max_retries: retries for writes failing with overload errors
+        :param backoff: initial backoff in seconds, doubled for every retry
+        :param max_backoff: maximum backoff in seconds
+        :param latency_threshold: writes slower than this (seconds) reduce the rate
+        :param min_rate: rate never drops below this
+        """
+        self.max_rate = float(rate)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.latency_threshold = latency_threshold
+        self.pool = ThreadPoolExecutor(max_workers=concurrency,
+                                       thread_name_prefix='icinga2-write')
+        self.lock = threading.Lock()
+        self.queues = {}
+        self.futures = []
+        self.stats = {'submitted': 0, 'succeeded': 0, 'failed': 0, 'retried': 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+    @property
+    def rate(self):
+        return self.bucket.rate
+
+    def _set_rate(self, rate):
+        rate = min(self.max_rate, max(self.min_rate, rate))
+        if rate != self.bucket.rate:
+            logger.debug("Write rate: {:.2f}/s".format(rate))
+        self.bucket.rate = rate
+
+    def submit(self, key, func, *args, **kwargs):
+        """
+        Submit write. Writes with the same key are run in submission order.
+
+        :param key: ordering key, usually the hostname
+        :param func: write to perform
+        :return: future
+        :rtype: concurrent.futures.Future
+        """
+        future = Future()
+        with self.lock:
+            self.futures.append(future)
+            self.stats['submitted'] += 1
+            if key in self.queues:
+                self.queues[key].append((future, func, args, kwargs))
+                return future
+            self.queues[key] = deque([(future, func, args, kwargs)])
+        self.pool.submit(self._drain, key)
+        return future
+
+    def _drain(self, key):
+        while True:
+            with self.lock:
+                queue = self.queues[key]
+                if not queue:
+                    del self.queues[key]
+                    return
+                future, func, args, kwargs = queue.popleft()
+
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = self._call(func, *args, **kwargs)
+            except Exception as error:
+                with self.lock:
+                    self.stats['failed'] += 1
+                future.set_exception(error)
+            else:
+                with self.lock:
+                    self.stats['succeeded'] += 1
+                future.set_result(result)
+
+    def _call(self, func, *args, **kwargs):
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            start = time.monotonic()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as error:
+                if not is_overload_error(error) or attempt >= self.max_retries:
+                    raise
+                # multiplicative decrease
+                self._set_rate(self.rate / 2)
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+                attempt += 1
+                with self.lock:
+                    self.stats['retried'] += 1
+                logger.warning("Icinga2 overloaded ({}), retry {}/{} in {:.1f}s"
+                               .format(error, attempt, self.max_retries, delay))
+                time.sleep(delay)
+                continue
+
+            if time.monotonic() - start > self.latency_threshold:
+                self._set_rate(self.rate * 0.8)
+            else:
+                # additive increase
+                self._set_rate(self.rate + self.max_rate / 20)
+            return result
+
+    def wait(self):
+        """
+        Wait for all submitted writes
+
+        :return: statistics (submitted, succeeded, failed, retried)
+        :rtype: dict
+        """
+        with self.lock:
+            futures = list(self.futures)
+        for future in futures:
+            try:
+                future.exception()
+            except Exception:
+                pass
+        return dict(self.stats)
+
+    def shutdown(self):
+        self.wait()
+        self.pool.shutdown()
+
+
+def submit_write(executor, key, func, *args, **kwargs):
+    """
+    Submit write to executor or, without executor, perform it right away.
+    Writes are logged as operations (see logs.operation_log) if enabled.
+
+    :param executor: WriteExecutor or None
+    :param key: ordering key, usually the hostname
+    :param func: write to perform
+    :return: future holding the result of the write
+    :rtype: concurrent.futures.Future
+    """
+    if operations_logger.isEnabledFor(logging.INFO):
+        func = _logged_write(key, func)
+
+    if executor is not None:
+        return executor.submit(key, func, *args, **kwargs)
+
+    future = Future()
+    try:
+        future.set_result(func(*args, **kwargs))
+    except Exception as error:
+        future.set_exception(error)
+    return future
+
+
+def _logged_write(key, func):
+    @functools.wraps(func)
+    def write(*args, **kwargs):
+        with timed_operation(getattr(func, '__name__', 'write'), key, args=args):
+            return func(*args, **kwargs)
+    return write
+
+
+def wait_writes(writes):
+    """
+    Wait for writes and log failed ones.
+
+    :param writes: (future, description) tuples
+    :return: results of successful writes
+    :rtype: list
+    """
+    results = []
+    for future, description in writes:
+        try:
+            results.append(future.result())
+        except Exception as error:
+            logger.error("Could not migrate {}. Error: {}".format(description, error))
+    return results
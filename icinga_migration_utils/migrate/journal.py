@@ -0,0 +1,413 @@
+"""
+Checkpoint journal for resumable migrations.
+
+The journal is an append-only file recording every completed Icinga2 write of the
+migrate functions, one JSON object per line:
+
+    {"type": "write", "time": ..., "key": "host1", "method": "schedule_service_downtime",
+     "params": {...}, "response": {...}}
+    {"type": "rollback", "time": ..., "entries": ["<method> <params>", ...]}
+
+Runs using the journal skip the writes it already holds, so a run interrupted by an
+API timeout or a killed shell can simply be started again with the same journal.
+The journal also knows exactly which objects were created: rollback removes them by
+name in bulk requests instead of matching the comments of all downtimes.
+
+    journal = MigrationJournal('migration.journal')
+    migrate_service_downtimes(simulate=False, executor=journal.wrap(executor),
+                              snapshot=journal.snapshot())
+    ...
+    journal.rollback(session.icinga2)
+"""
+import functools
+import inspect
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from icinga_migration_utils.icinga2.icinga2 import OBJECT_NAME_REGEX
+from icinga_migration_utils.logs import LazyMessage
+from icinga_migration_utils.migrate import MIGRATION_COMMENT_SUFFIX
+from icinga_migration_utils.migrate.snapshot import Icinga2Snapshot
+
+logger = logging.getLogger(__name__)
+
+# Journal entry types
+WRITE = 'write'
+ROLLBACK = 'rollback'
+
+DOWNTIME_METHODS = ('schedule_host_downtime', 'schedule_service_downtime')
+ACKNOWLEDGEMENT_METHODS = ('acknowledge_host', 'acknowledge_service')
+NOTIFICATION_METHODS = ('set_host_notifications', 'set_service_notifications')
+
+# Objects per rollback request
+ROLLBACK_BATCH_SIZE = 500
+
+DOWNTIME_NAME_REGEX = re.compile(r"downtime '([^']+)'")
+
+
+def entry_id(method, params):
+    """
+    Identity of a write: method and its parameters
+
+    :param method: Icinga2Config method name
+    :param params: parameters by name
+    :rtype: str
+    """
+    return '{} {}'.format(method, json.dumps(params, sort_keys=True, separators=(',', ':')))
+
+
+def _completed(response):
+    """
+    Check if the response of a write reports success. Acknowledgements return a boolean,
+    other writes the API response.
+    """
+    if isinstance(response, dict):
+        return bool(response.get('results'))
+    return bool(response)
+
+
+def _downtime_names(response):
+    names = []
+    for result in (response or {}).get('results', []):
+        name = result.get('name')
+        if not name:
+            match = DOWNTIME_NAME_REGEX.search(result.get('status', ''))
+            name = match.group(1) if match else None
+        if name:
+            names.append(name)
+    return names
+
+
+def _succeeded_names(response, regex):
+    """
+    Names of the objects a request succeeded for (result code 200)
+    """
+    names = set()
+    for result in (response or {}).get('results', []):
+        if result.get('code') != 200:
+            continue
+        match = regex.search(result.get('status', ''))
+        name = match.group(1) if match else result.get('name')
+        if name:
+            names.add(name)
+    return names
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class MigrationJournal(object):
+    """
+    Append-only journal of completed writes
+    """
+
+    def __init__(self, path, sync=False):
+        """
+        :param path: journal file, entries of previous runs are loaded
+        :param sync: fsync after every entry (survives a crash of the machine, not only
+            of the process)
+        """
+        self.path = path
+        self.sync = sync
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            self._load()
+        self.f = open(path, 'a')
+
+    def _load(self):
+        with open(self.path) as f:
+            for number, line in enumerate(f, 1):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # last line of a run killed while writing
+                    logger.warning("Ignoring incomplete journal line {} of {}"
+                                   .format(number, self.path))
+                    continue
+                if entry['type'] == WRITE:
+                    self.entries[entry_id(entry['method'], entry['params'])] = entry
+                elif entry['type'] == ROLLBACK:
+                    for rolled_back in entry['entries']:
+                        self.entries.pop(rolled_back, None)
+        logger.info("Loaded {} completed writes from journal {}"
+                    .format(len(self.entries), self.path))
+
+    def _append(self, entry):
+        self.f.write(json.dumps(entry, separators=(',', ':'), default=str) + '\n')
+        self.f.flush()
+        if self.sync:
+            os.fsync(self.f.fileno())
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def completed(self, method, params):
+        """
+        :return: journal entry of a completed write or None
+        :rtype: dict
+        """
+        return self.entries.get(entry_id(method, params))
+
+    def record(self, key, method, params, response):
+        """
+        Record a completed write
+
+        :param key: object (ordering key) of the write, usually the hostname
+        :param method: Icinga2Config method name
+        :param params: parameters by name
+        :param response: result of the write
+        """
+        entry = {'type': WRITE, 'time': int(time.time()), 'key': key, 'method': method,
+                 'params': params, 'response': response}
+        with self.lock:
+            self._append(entry)
+            self.entries[entry_id(method, params)] = entry
+
+    def wrap(self, executor=None):
+        """
+        :param executor: WriteExecutor performing the writes (write serially if not set)
+        :return: executor skipping journaled writes and recording completed ones
+        :rtype: JournalExecutor
+        """
+        return JournalExecutor(self, executor)
+
+    def snapshot(self, suffix=MIGRATION_COMMENT_SUFFIX, snapshot=None):
+        """
+        Snapshot of the downtimes and acknowledgements created by journaled writes,
+        built without API requests
+
+        :param suffix: migration comment suffix
+        :param snapshot: add the journaled objects to this snapshot (e.g. loaded from
+            Icinga2) instead of a new one
+        :rtype: Icinga2Snapshot
+        """
+        if snapshot is None:
+            snapshot = Icinga2Snapshot(None, suffix)
+        for entry in self._entries(DOWNTIME_METHODS + ACKNOWLEDGEMENT_METHODS):
+            params = dict((name[len('downtime_'):] if name.startswith('downtime_') else name,
+                           value) for name, value in entry['params'].items())
+            if entry['method'] in DOWNTIME_METHODS:
+                snapshot.add_downtime(params['host_name'], params.get('service_name'),
+                                      params['author'], params['comment'],
+                                      params['start_time'], params['end_time'])
+            else:
+                snapshot.add_acknowledgement(params['host_name'], params.get('service_name'),
+                                             params['author'], params['comment'])
+        return snapshot
+
+    def _entries(self, methods):
+        with self.lock:
+            return [entry for entry in self.entries.values() if entry['method'] in methods]
+
+    def _rolled_back(self, entries):
+        with self.lock:
+            self._append({'type': ROLLBACK, 'time': int(time.time()),
+                          'entries': [entry_id(entry['method'], entry['params'])
+                                      for entry in entries]})
+            for entry in entries:
+                self.entries.pop(entry_id(entry['method'], entry['params']), None)
+
+    def rollback(self, icinga2, methods=None, batch_size=ROLLBACK_BATCH_SIZE):
+        """
+        Undo journaled writes: remove the created downtimes by name and the
+        acknowledgements of the journaled objects, re-enable disabled notifications.
+        Rolled back writes are recorded and performed again by the next run. Writes
+        Icinga2 did not confirm to have undone (e.g. downtimes without a name in their
+        response) stay in the journal.
+
+        :param icinga2: Icinga2Config
+        :param methods: only roll back writes of these methods (default: all)
+        :param batch_size: maximum objects per request
+        :return: number of rolled back writes by method
+        :rtype: OrderedDict
+        """
+        counts = OrderedDict()
+        for method in DOWNTIME_METHODS + ACKNOWLEDGEMENT_METHODS + NOTIFICATION_METHODS:
+            if methods is not None and method not in methods:
+                continue
+            entries = self._entries((method,))
+            if not entries:
+                continue
+            count = 0
+            for chunk in _chunks(entries, batch_size):
+                if method in DOWNTIME_METHODS:
+                    rolled_back = self._remove_downtimes(icinga2, chunk)
+                elif method == 'acknowledge_host':
+                    rolled_back = self._remove_host_acknowledgements(icinga2, chunk)
+                elif method == 'acknowledge_service':
+                    rolled_back = self._remove_service_acknowledgements(icinga2, chunk)
+                else:
+                    rolled_back = self._restore_notifications(icinga2, method, chunk)
+                if rolled_back:
+                    self._rolled_back(rolled_back)
+                count += len(rolled_back)
+            counts[method] = count
+            logger.info("Rolled back {} {} writes".format(count, method))
+            if count < len(entries):
+                logger.error("{} {} writes not rolled back, kept in the journal"
+                             .format(len(entries) - count, method))
+        return counts
+
+    @staticmethod
+    def _remove_downtimes(icinga2, entries):
+        """
+        :return: entries with removed downtimes
+        :rtype: list
+        """
+        named = []
+        for entry in entries:
+            entry_names = _downtime_names(entry['response'])
+            if entry_names:
+                named.append((entry, entry_names))
+            else:
+                logger.error("No downtime name in response of {} {}, not removed"
+                             .format(entry['method'], entry['params']))
+        if not named:
+            return []
+        # downtime.name is the short name, downtime.__name the full object name
+        response = icinga2.client.actions.remove_downtime(
+            object_type='Downtime',
+            filter='downtime.__name in names',
+            filter_vars={'names': [name for _, entry_names in named for name in entry_names]}
+        )
+        logger.debug(LazyMessage("Got response: {}", response))
+        removed = _succeeded_names(response, DOWNTIME_NAME_REGEX)
+        return [entry for entry, entry_names in named
+                if all(name in removed for name in entry_names)]
+
+    @staticmethod
+    def _remove_host_acknowledgements(icinga2, entries):
+        """
+        :return: entries with removed acknowledgements
+        :rtype: list
+        """
+        response = icinga2.client.actions.remove_acknowledgement(
+            object_type='Host',
+            filter='host.name in hostnames',
+            filter_vars={'hostnames': sorted(set(entry['params']['host_name']
+                                                 for entry in entries))}
+        )
+        logger.debug(LazyMessage("Got response: {}", response))
+        removed = _succeeded_names(response, OBJECT_NAME_REGEX)
+        return [entry for entry in entries if entry['params']['host_name'] in removed]
+
+    @staticmethod
+    def _remove_service_acknowledgements(icinga2, entries):
+        """
+        :return: entries with removed acknowledgements
+        :rtype: list
+        """
+        services = OrderedDict()
+        for entry in entries:
+            services.setdefault(entry['params']['host_name'], set()).add(
+                entry['params']['service_name'])
+        removed = set()
+        for host_name, service_names in services.items():
+            response = icinga2.client.actions.remove_acknowledgement(
+                object_type='Service',
+                filter='host.name==hostname && service.name in servicenames',
+                filter_vars={'hostname': host_name, 'servicenames': sorted(service_names)}
+            )
+            logger.debug(LazyMessage("Got response: {}", response))
+            removed |= _succeeded_names(response, OBJECT_NAME_REGEX)
+        return [entry for entry in entries
+                if '{}!{}'.format(entry['params']['host_name'],
+                                  entry['params']['service_name']) in removed]
+
+    @staticmethod
+    def _restore_notifications(icinga2, method, entries):
+        """
+        :return: entries with restored notification states
+        :rtype: list
+        """
+        restored = set()
+        for enabled in (True, False):
+            params = [entry['params'] for entry in entries
+                      if entry['params']['enabled'] == enabled]
+            if not params:
+                continue
+            if method == 'set_host_notifications':
+                response = icinga2.update_objects(
+                    'Host', 'host.name in hostnames',
+                    {'hostnames': [p['hostname'] for p in params]},
+                    {'enable_notifications': not enabled})
+                restored |= _succeeded_names(response, OBJECT_NAME_REGEX)
+            else:
+                services = OrderedDict()
+                for p in params:
+                    services.setdefault(p['hostname'], set()).add(p['servicename'])
+                for hostname, servicenames in services.items():
+                    response = icinga2.update_objects(
+                        'Service', 'host.name==hostname && service.name in servicenames',
+                        {'hostname': hostname, 'servicenames': sorted(servicenames)},
+                        {'enable_notifications': not enabled})
+                    restored |= _succeeded_names(response, OBJECT_NAME_REGEX)
+        if method == 'set_host_notifications':
+            return [entry for entry in entries if entry['params']['hostname'] in restored]
+        return [entry for entry in entries
+                if '{}!{}'.format(entry['params']['hostname'],
+                                  entry['params']['servicename']) in restored]
+
+
+class JournalExecutor(object):
+    """
+    Executor (see executor.submit_write) skipping writes completed according to the
+    journal and recording the writes it performs
+    """
+
+    def __init__(self, journal, executor=None):
+        """
+        :param journal: MigrationJournal
+        :param executor: WriteExecutor performing the writes (write serially if not set)
+        """
+        self.journal = journal
+        self.executor = executor
+        self.skipped = 0
+        self.lock = threading.Lock()
+
+    def submit(self, key, func, *args, **kwargs):
+        method = getattr(func, '__name__', None)
+        params = dict(inspect.signature(func).bind(*args, **kwargs).arguments)
+        entry = self.journal.completed(method, params)
+        if entry is not None:
+            logger.debug("Skipping journaled write {} {}".format(method, key))
+            with self.lock:
+                self.skipped += 1
+            future = Future()
+            future.set_result(entry['response'])
+            return future
+
+        @functools.wraps(func)
+        def write(*args, **kwargs):
+            response = func(*args, **kwargs)
+            if _completed(response):
+                self.journal.record(key, method, params, response)
+            return response
+
+        # writes are logged by the submit_write call of the migrate function already
+        if self.executor is not None:
+            return self.executor.submit(key, write, *args, **kwargs)
+        future = Future()
+        try:
+            future.set_result(write(*args, **kwargs))
+        except Exception as error:
+            future.set_exception(error)
+        return future
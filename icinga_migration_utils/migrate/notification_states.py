@@ -1,15 +1,15 @@
 import logging
 
-from icinga_migration_utils.icinga1.icinga1 import Icinga1Config
-from icinga_migration_utils.icinga2.icinga2 import Icinga2Config
+from icinga_migration_utils.logs import LazyYaml
 from icinga_migration_utils.migrate import MIGRATION_COMMENT_SUFFIX
-from icinga_migration_utils.utils import pretty_print_dict
+from icinga_migration_utils.migrate.executor import submit_write, wait_writes
+from icinga_migration_utils.session import MigrationSession
 
 logger = logging.getLogger(__name__)
 
 
 def migrate_host_notification_states(simulate=True, suffix=MIGRATION_COMMENT_SUFFIX,
-                                     hostname=None):
+                                     hostname=None, executor=None, session=None):
     """
     Migrate enable_notifications for hosts.
     States are only migrated if host notifications are enabled but host status notifications
@@ -21,22 +21,27 @@ def migrate_host_notification_states(simulate=True, suffix=MIGRATION_COMMENT_SUF
     @type suffix: str
     @param hostname: Host (leave empty for all hosts)
     @type hostname: str
+    @param executor: WriteExecutor to perform writes with (write serially if not set)
+    @type executor: WriteExecutor
+    @param session: MigrationSession to share fetched data with other functions
+    @type session: MigrationSession
 
     :return:
     """
-    icinga1 = Icinga1Config()
-    icinga2 = Icinga2Config()
+    session = session or MigrationSession()
+    icinga2 = session.icinga2
 
-    icinga2_hosts = [host['name'] for host in icinga2.get_hosts()]
+    icinga2_hosts = session.icinga2_hosts_dict()
 
-    icinga1_host_dict = icinga1.get_hosts_dict()
+    icinga1_host_dict = session.icinga1_hosts_dict()
 
     if hostname:
         hostnames = [hostname]
     else:
         hostnames = icinga1_host_dict.keys()
 
-    icinga1_status_dict = icinga1.get_hoststatus_by_host()
+    icinga1_status_dict = session.icinga1_hoststatus_by_host()
+    writes = []
 
     for hostname in hostnames:
         if hostname not in icinga1_host_dict:
@@ -51,21 +56,21 @@ def migrate_host_notification_states(simulate=True, suffix=MIGRATION_COMMENT_SUF
                 logger.debug(icinga1_status_dict[hostname])
                 logger.info("Disabling notifications for host: {}".format(hostname))
                 if not simulate:
-                    try:
-                        response = icinga2.set_host_notifications(
-                            hostname, False,
-                            notes='Migrated notification state from Icinga1' + suffix)
-                        logger.debug(response)
-                    except Exception as error:
-                        logger.error("Could not migrate host notification state for host {}. "
-                                     "Error: {}"
-                                     .format(hostname, error))
+                    future = submit_write(
+                        executor, hostname, icinga2.set_host_notifications,
+                        hostname, False,
+                        notes='Migrated notification state from Icinga1' + suffix)
+                    writes.append((future, "host notification state for host {}"
+                                   .format(hostname)))
+
+    for response in wait_writes(writes):
+        logger.debug(response)
 
     return icinga1_status_dict
 
 
 def migrate_service_notification_states(simulate=True, suffix=MIGRATION_COMMENT_SUFFIX,
-                                        hostname=None):
+                                        hostname=None, executor=None, session=None):
     """
     Migrate enable_notifications for service states.
     Should be run after host notification states have been migrated.
@@ -84,25 +89,29 @@ def migrate_service_notification_states(simulate=True, suffix=MIGRATION_COMMENT_
     @type suffix: str
     @param hostname: Host (leave empty for all hosts)
     @type hostname: str
+    @param executor: WriteExecutor to perform writes with (write serially if not set)
+    @type executor: WriteExecutor
+    @param session: MigrationSession to share fetched data with other functions
+    @type session: MigrationSession
 
     :return:
     """
-    icinga1 = Icinga1Config()
-    icinga2 = Icinga2Config()
+    session = session or MigrationSession()
+    icinga2 = session.icinga2
 
-    services_icinga1 = icinga1.get_services_by_hostname()
-    services_icinga2 = icinga2.get_services_by_hostname()
+    services_icinga1 = session.icinga1_services_by_host()
+    icinga2_service_index = session.icinga2_service_index()
 
-    icinga2_hosts = icinga2.get_hosts_dict()
+    icinga2_hosts = session.icinga2_hosts_dict()
 
-    icinga1_status_dict = icinga1.get_servicestatus_by_host()
+    icinga1_status_dict = session.icinga1_servicestatus_by_host()
 
     if hostname:
         hostnames = [hostname]
     else:
-        hostnames = [host['host_name'] for host in icinga1.get_hosts()]
+        hostnames = [host['host_name'] for host in session.icinga1_hosts()]
 
-    count = 0
+    writes = []
 
     for hostname in hostnames:
         if hostname not in icinga2_hosts:
@@ -113,21 +122,19 @@ def migrate_service_notification_states(simulate=True, suffix=MIGRATION_COMMENT_
 
         for service in services:
             logger.debug(service['check_command'])
-            logger.debug(pretty_print_dict(service, '    '))
+            logger.debug(LazyYaml(service, '    '))
             service_state = [state for state in service_states
                              if state['check_command'] == service['check_command']]
             if service_state:
                 service_state = service_state[0]
-                logger.debug("Got service state:\n{}".format(
-                    pretty_print_dict(service_state, '    ')))
+                logger.debug("Got service state:")
+                logger.debug(LazyYaml(service_state, '    '))
 
                 if service['notifications_enabled'] == '1' \
                         and service_state['notifications_enabled'] == '0':
 
-                    icinga2_service = [
-                        x for x in services_icinga2[hostname]
-                        if x['check_command_extracted'] == service['check_command_extracted']
-                    ]
+                    icinga2_service = icinga2_service_index.find(
+                        hostname, check_command_extracted=service['check_command_extracted'])
                     if len(icinga2_service) == 1:
                         icinga2_service = icinga2_service[0]
                         service_name = icinga2_service['attrs']['name']
@@ -136,23 +143,24 @@ def migrate_service_notification_states(simulate=True, suffix=MIGRATION_COMMENT_
                                          .format(hostname, service_name))
 
                             if not simulate:
-                                try:
-                                    response = icinga2.set_service_notifications(
-                                        hostname,
-                                        service_name, False,
-                                        notes='Migrated notification state from Icinga1' + suffix)
-                                    logger.info("Disabled service notifications for host {}, "
-                                                "service {}".format(hostname, service_name))
-                                    count += 1
-                                    logger.debug(response)
-                                except Exception as error:
-                                    logger.error("Could not migrate host notification state "
-                                                 "for host {}, service {}. Error: {}"
-                                                 .format(hostname, service_name, error))
+                                logger.info("Disabling service notifications for host {}, "
+                                            "service {}".format(hostname, service_name))
+                                future = submit_write(
+                                    executor, hostname, icinga2.set_service_notifications,
+                                    hostname,
+                                    service_name, False,
+                                    notes='Migrated notification state from Icinga1' + suffix)
+                                writes.append((future, "service notification state for host "
+                                                       "{}, service {}"
+                                               .format(hostname, service_name)))
                         else:
                             logger.debug("{}!{}: service notifications already disabled"
                                          .format(hostname, service_name))
                     elif len(icinga2_service) == 0:
                         logger.error("Service {}!{} not found".format(
                             hostname, service['check_command_extracted']))
-    logger.info("{} notifications disabled".format(count))
+
+    responses = wait_writes(writes)
+    for response in responses:
+        logger.debug(response)
+    logger.info("{} notifications disabled".format(len(responses)))
@@ -0,0 +1,293 @@
+"""
+Run the migration stages as a DAG.
+
+Stages run as soon as the stages they depend on have finished, independent stages run
+concurrently. All stages share one MigrationSession, so the Icinga1 caches are parsed
+and Icinga2 objects fetched once, and one WriteExecutor (if set), so writes of all
+stages are rate limited together. The data sets the stages need are prefetched in the
+background when the pipeline starts: the first stages write while the data of the
+later stages is still loading.
+
+Example:
+    with WriteExecutor(concurrency=8, rate=50) as executor:
+        pipeline = MigrationPipeline(simulate=False, executor=executor)
+        results = pipeline.run()
+    print(format_report(results, pipeline.session))
+"""
+import functools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from icinga_migration_utils.migrate import MIGRATION_COMMENT_SUFFIX
+from icinga_migration_utils.migrate.acknowledgements import (migrate_host_acknowledgements,
+                                                             migrate_service_acknowledgements)
+from icinga_migration_utils.migrate.downtimes import (migrate_host_downtimes,
+                                                      migrate_service_downtimes)
+from icinga_migration_utils.migrate.notification_states import (
+    migrate_host_notification_states, migrate_service_notification_states)
+from icinga_migration_utils.migrate.snapshot import Icinga2Snapshot
+from icinga_migration_utils.session import MigrationSession
+
+logger = logging.getLogger(__name__)
+
+# Stage results
+OK = 'ok'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+
+class Stage(object):
+    """
+    Migration stage: a migrate function called with simulate, suffix, hostname,
+    executor and session.
+    """
+
+    def __init__(self, name, func, depends=(), data=()):
+        """
+        :param name: stage name
+        :param func: migrate function
+        :param depends: names of stages that must have finished successfully before
+        :param data: session data sets the stage reads (prefetched), e.g. 'icinga2_hosts_dict'
+        """
+        self.name = name
+        self.func = func
+        self.depends = tuple(depends)
+        self.data = tuple(data)
+
+    def __repr__(self):
+        return 'Stage({})'.format(self.name)
+
+
+STAGES = [
+    Stage('host_notification_states', migrate_host_notification_states,
+          data=['icinga1_hosts_dict', 'icinga1_hoststatus_by_host', 'icinga2_hosts_dict']),
+    Stage('service_notification_states', migrate_service_notification_states,
+          depends=['host_notification_states'],
+          data=['icinga1_services_by_host', 'icinga1_servicestatus_by_host', 'icinga1_hosts',
+                'icinga2_hosts_dict', 'icinga2_service_index']),
+    Stage('host_downtimes', migrate_host_downtimes,
+          data=['icinga1_hostdowntimes', 'icinga2_hosts_dict', 'snapshot']),
+    Stage('service_downtimes', migrate_service_downtimes,
+          data=['icinga1_servicedowntimes', 'icinga2_hosts_dict', 'snapshot',
+                'icinga1_services_by_host', 'icinga2_service_index']),
+    Stage('host_acknowledgements', migrate_host_acknowledgements,
+          data=['icinga1_host_acknowledgements', 'snapshot']),
+    Stage('service_acknowledgements', migrate_service_acknowledgements,
+          data=['icinga1_service_acknowledgements', 'icinga1_services_by_host',
+                'icinga2_service_index', 'icinga2_hosts_dict', 'snapshot']),
+]
+
+
+class StageResult(object):
+    """
+    Result of a stage: status (OK, FAILED, SKIPPED), duration in seconds, write counts
+    """
+
+    def __init__(self, name, status=SKIPPED, duration=0.0, writes=None, error=None,
+                 result=None):
+        self.name = name
+        self.status = status
+        self.duration = duration
+        self.writes = writes or {'submitted': 0, 'succeeded': 0, 'failed': 0}
+        self.error = error
+        self.result = result
+
+    def __repr__(self):
+        return 'StageResult({}, {})'.format(self.name, self.status)
+
+
+class _StageWrites(object):
+    """
+    Executor passed to a stage: counts the writes of the stage and submits them to the
+    shared executor (or performs them right away, like submit_write)
+    """
+
+    def __init__(self, executor):
+        self.executor = executor
+        self.lock = threading.Lock()
+        self.stats = {'submitted': 0, 'succeeded': 0, 'failed': 0}
+
+    def _count(self, counter):
+        with self.lock:
+            self.stats[counter] += 1
+
+    def submit(self, key, func, *args, **kwargs):
+        @functools.wraps(func)
+        def write(*args, **kwargs):
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                self._count('failed')
+                raise
+            self._count('succeeded')
+            return result
+
+        self._count('submitted')
+        if self.executor is not None:
+            return self.executor.submit(key, write, *args, **kwargs)
+        future = Future()
+        try:
+            future.set_result(write(*args, **kwargs))
+        except Exception as error:
+            future.set_exception(error)
+        return future
+
+
+def _check_stages(stages):
+    names = set()
+    for stage in stages:
+        if stage.name in names:
+            raise ValueError("Duplicate stage {}".format(stage.name))
+        missing = [name for name in stage.depends if name not in names]
+        if missing:
+            raise ValueError("Stage {} depends on unknown or later stages: {}"
+                             .format(stage.name, ', '.join(missing)))
+        names.add(stage.name)
+
+
+class MigrationPipeline(object):
+    """
+    Run migration stages concurrently in dependency order
+    """
+
+    def __init__(self, stages=None, simulate=True, suffix=MIGRATION_COMMENT_SUFFIX,
+                 hostname=None, session=None, executor=None, concurrency=3,
+                 prefetch=True, journal=None, resume_without_reads=False):
+        """
+        :param stages: stages in a dependency respecting order (defaults to STAGES)
+        :param simulate: simulate, don't write
+        :param suffix: migration comment suffix
+        :param hostname: only migrate this host
+        :param session: MigrationSession (new session if not set)
+        :param executor: WriteExecutor shared by all stages (write serially if not set)
+        :param concurrency: maximum number of stages running at the same time
+        :param prefetch: load the data sets of all stages in the background right away
+        :param journal: MigrationJournal, skip the writes it holds and record new ones.
+            Its downtimes and acknowledgements are added to the snapshot loaded from Icinga2.
+        :param resume_without_reads: build the snapshot from the journal only, without
+            loading it from Icinga2. Only safe if all migrated objects were created by
+            journaled writes.
+        """
+        self.stages = list(STAGES if stages is None else stages)
+        _check_stages(self.stages)
+        self.simulate = simulate
+        self.suffix = suffix
+        self.hostname = hostname
+        self.session = session or MigrationSession()
+        self.executor = executor
+        self.concurrency = concurrency
+        self.prefetch = prefetch
+        self.journal = journal
+        self.resume_without_reads = resume_without_reads
+        if journal is not None and resume_without_reads:
+            self.session.seed(('snapshot', suffix), journal.snapshot(suffix))
+        elif journal is not None:
+            self.session.set_loader(('snapshot', suffix), self._load_snapshot)
+
+    def _load_snapshot(self):
+        snapshot = Icinga2Snapshot(self.session.icinga2, self.suffix).load()
+        return self.journal.snapshot(self.suffix, snapshot=snapshot)
+
+    def _load(self, name):
+        if name == 'snapshot':
+            return self.session.snapshot(self.suffix)
+        return getattr(self.session, name)()
+
+    def _prefetch(self, pool):
+        names = OrderedDict()
+        for stage in sorted(self.stages, key=lambda stage: len(stage.depends)):
+            for name in stage.data:
+                # seeded from the journal
+                if name == 'snapshot' and self.journal is not None \
+                        and self.resume_without_reads:
+                    continue
+                names[name] = None
+        futures = [pool.submit(self._load, name) for name in names]
+        logger.debug("Prefetching {}".format(', '.join(names)))
+        return futures
+
+    def _run_stage(self, stage):
+        executor = self.executor
+        if self.journal is not None and not self.simulate:
+            executor = self.journal.wrap(executor)
+        writes = _StageWrites(executor)
+        start = time.monotonic()
+        logger.info("Stage {} started".format(stage.name))
+        try:
+            result = stage.func(simulate=self.simulate, suffix=self.suffix,
+                                hostname=self.hostname, executor=writes, session=self.session)
+        except Exception as error:
+            logger.exception("Stage {} failed".format(stage.name))
+            return StageResult(stage.name, FAILED, time.monotonic() - start, writes.stats,
+                               error=error)
+        duration = time.monotonic() - start
+        logger.info("Stage {} finished in {:.1f}s, {} writes"
+                    .format(stage.name, duration, writes.stats['succeeded']))
+        return StageResult(stage.name, OK, duration, writes.stats, result=result)
+
+    def run(self):
+        """
+        Run all stages. Stages depending on a failed stage are skipped.
+
+        :return: StageResult by stage name, in stage order
+        :rtype: OrderedDict
+        """
+        results = OrderedDict((stage.name, StageResult(stage.name)) for stage in self.stages)
+        pending = list(self.stages)
+        running = {}
+        done = set()
+
+        loader = ThreadPoolExecutor(max_workers=2, thread_name_prefix='migration-load')
+        pool = ThreadPoolExecutor(max_workers=self.concurrency,
+                                  thread_name_prefix='migration-stage')
+        try:
+            if self.prefetch:
+                self._prefetch(loader)
+            while pending or running:
+                for stage in list(pending):
+                    if any(results[name].status != OK and name in done
+                           for name in stage.depends):
+                        logger.warning("Skipping stage {}: dependency failed"
+                                       .format(stage.name))
+                        pending.remove(stage)
+                        done.add(stage.name)
+                    elif all(name in done for name in stage.depends):
+                        pending.remove(stage)
+                        running[pool.submit(self._run_stage, stage)] = stage
+                if not running:
+                    continue
+                finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage = running.pop(future)
+                    results[stage.name] = future.result()
+                    done.add(stage.name)
+        finally:
+            pool.shutdown()
+            loader.shutdown(wait=False)
+        return results
+
+
+def format_report(results, session=None):
+    """
+    Format stage results (and data set load times of the session) as text table
+
+    :param results: StageResult by stage name (see MigrationPipeline.run)
+    :param session: MigrationSession used by the pipeline
+    :rtype: str
+    """
+    lines = ['{:<30} {:<8} {:>9} {:>9} {:>9}'.format(
+        'stage', 'status', 'seconds', 'writes', 'failed')]
+    for result in results.values():
+        lines.append('{:<30} {:<8} {:>9.2f} {:>9} {:>9}'.format(
+            result.name, result.status, result.duration, result.writes['succeeded'],
+            result.writes['failed']))
+    if session is not None and session.load_times:
+        lines.append('')
+        lines.append('{:<30} {:>9}'.format('data set', 'seconds'))
+        for key, duration in session.load_times.items():
+            lines.append('{:<30} {:>9.2f}'.format(
+                key if isinstance(key, str) else key[0], duration))
+    return '\n'.join(lines)
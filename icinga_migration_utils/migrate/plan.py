@@ -0,0 +1,297 @@
+"""
+Plan the migration offline, apply it later.
+
+plan_migration runs the migrate functions (see pipeline.STAGES) with an executor that
+records the Icinga2 writes instead of performing them. The writes, with their matched
+Icinga2 service names, and the warnings of the run (services not found, ambiguous
+matches, objects already migrated) are written to a plan file, one JSON object per
+line (gzip compressed if the file name ends with .gz):
+
+    {"type": "header", "version": 1, "suffix": ..., "hostname": ..., "created": ...}
+    {"type": "write", "stage": ..., "method": "schedule_service_downtime", "params": {...}}
+    {"type": "note", "stage": ..., "level": "ERROR", "message": "AMBIGUOUS - ..."}
+
+apply_plan streams the plan and performs the writes with the bulk methods of
+Icinga2Config, without reading or matching anything again:
+
+    plan_migration('migration.plan.gz')        # before the maintenance window
+    apply_plan('migration.plan.gz')            # in the maintenance window
+"""
+import gzip
+import inspect
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from icinga_migration_utils.icinga2.icinga2 import BULK_CHUNK_SIZE
+from icinga_migration_utils.migrate import MIGRATION_COMMENT_SUFFIX
+from icinga_migration_utils.migrate.executor import submit_write
+from icinga_migration_utils.session import MigrationSession
+
+logger = logging.getLogger(__name__)
+
+PLAN_VERSION = 1
+
+# Plan entry types
+HEADER = 'header'
+WRITE = 'write'
+NOTE = 'note'
+
+# Icinga2Config write methods that can be planned, their parameters are stored by name
+PLAN_METHODS = ('set_host_notifications', 'set_service_notifications',
+                'schedule_host_downtime', 'schedule_service_downtime',
+                'acknowledge_host', 'acknowledge_service')
+
+# Objects per bulk call when applying
+APPLY_BATCH_SIZE = 5000
+
+# Parameters naming the object of a write, grouped by Icinga2Config._bulk
+HOST_PARAMS = ('hostname', 'host_name')
+SERVICE_PARAMS = ('servicename', 'service_name')
+
+
+class PlanError(Exception):
+    pass
+
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't')
+    return open(path, mode)
+
+
+def _dump(entry):
+    return json.dumps(entry, separators=(',', ':')) + '\n'
+
+
+class PlanRecorder(object):
+    """
+    Executor (see executor.submit_write) writing submitted writes to a plan instead
+    of performing them
+    """
+
+    def __init__(self, f):
+        """
+        :param f: plan file handle
+        """
+        self.f = f
+        self.stage = None
+        self.counts = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, key, func, *args, **kwargs):
+        method = getattr(func, '__name__', None)
+        if method not in PLAN_METHODS:
+            raise PlanError("Cannot plan write {}".format(method))
+        params = inspect.signature(func).bind(*args, **kwargs).arguments
+        with self.lock:
+            self.f.write(_dump({'type': WRITE, 'stage': self.stage, 'method': method,
+                                'params': dict(params)}))
+            self.counts[self.stage] = self.counts.get(self.stage, 0) + 1
+        # Writes are not performed, results are unknown
+        future = Future()
+        future.set_result(None)
+        return future
+
+    def note(self, level, message):
+        with self.lock:
+            self.f.write(_dump({'type': NOTE, 'stage': self.stage, 'level': level,
+                                'message': message}))
+
+
+class _NoteHandler(logging.Handler):
+    """
+    Record warnings of the migrate functions as plan notes
+    """
+
+    def __init__(self, recorder):
+        super(_NoteHandler, self).__init__(logging.WARNING)
+        self.recorder = recorder
+
+    def emit(self, record):
+        try:
+            self.recorder.note(record.levelname, record.getMessage())
+        except Exception:
+            self.handleError(record)
+
+
+def plan_migration(path, stages=None, hostname=None, suffix=MIGRATION_COMMENT_SUFFIX,
+                   session=None):
+    """
+    Compute the Icinga2 writes of the migration and write them to a plan file
+
+    :param path: plan file (.gz: compressed)
+    :param stages: stages to plan (defaults to pipeline.STAGES)
+    :param hostname: only plan this host
+    :param suffix: migration comment suffix
+    :param session: MigrationSession (new session if not set)
+    :return: number of planned writes by stage
+    :rtype: OrderedDict
+    """
+    from icinga_migration_utils.migrate.pipeline import STAGES
+
+    session = session or MigrationSession()
+    migrate_logger = logging.getLogger('icinga_migration_utils.migrate')
+    with _open(path, 'w') as f:
+        f.write(_dump({'type': HEADER, 'version': PLAN_VERSION, 'suffix': suffix,
+                       'hostname': hostname, 'created': int(time.time())}))
+        recorder = PlanRecorder(f)
+        handler = _NoteHandler(recorder)
+        migrate_logger.addHandler(handler)
+        try:
+            for stage in (STAGES if stages is None else stages):
+                recorder.stage = stage.name
+                recorder.counts[stage.name] = 0
+                stage.func(simulate=False, suffix=suffix, hostname=hostname,
+                           executor=recorder, session=session)
+        finally:
+            migrate_logger.removeHandler(handler)
+    logger.info("Planned {} writes: {}".format(
+        sum(recorder.counts.values()),
+        ', '.join('{} {}'.format(count, stage) for stage, count in recorder.counts.items())))
+    return recorder.counts
+
+
+def read_plan(path):
+    """
+    Read plan entries (streamed)
+
+    :param path: plan file
+    :return: header, iterator of write and note entries
+    :rtype: tuple
+    """
+    f = _open(path, 'r')
+    header = json.loads(f.readline() or 'null')
+    if not header or header.get('type') != HEADER or header.get('version') != PLAN_VERSION:
+        f.close()
+        raise PlanError("{} is not a migration plan (version {})".format(path, PLAN_VERSION))
+
+    def entries():
+        with f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    return header, entries()
+
+
+def _group(params_list, attrs):
+    groups = OrderedDict()
+    for params in params_list:
+        groups.setdefault(tuple(params[attr] for attr in attrs), []).append(params)
+    return groups.items()
+
+
+def _requests(method, params_list):
+    """
+    Split writes of one method into the bulk requests Icinga2Config._bulk performs for
+    them: writes with identical parameters (of the same host for services), at most
+    BULK_CHUNK_SIZE objects each. Each request is submitted as a separate write, so a
+    retried write does not send the other requests again.
+
+    :return: lists of parameters
+    :rtype: list
+    """
+    if 'service' in method:
+        object_params = SERVICE_PARAMS
+    else:
+        object_params = HOST_PARAMS
+    groups = OrderedDict()
+    for params in params_list:
+        group = tuple(sorted((name, value) for name, value in params.items()
+                             if name not in object_params))
+        groups.setdefault(group, []).append(params)
+    return [group[i:i + BULK_CHUNK_SIZE] for group in groups.values()
+            for i in range(0, len(group), BULK_CHUNK_SIZE)]
+
+
+def _apply_batch(icinga2, method, params_list):
+    """
+    Perform writes of one method with the bulk methods of Icinga2Config
+
+    :return: results per object
+    :rtype: dict
+    """
+    results = {}
+    if method == 'set_host_notifications':
+        for (enabled, notes), group in _group(params_list, ('enabled', 'notes')):
+            results.update(icinga2.set_hosts_notifications(
+                [params['hostname'] for params in group], enabled, notes))
+    elif method == 'set_service_notifications':
+        for (enabled, notes), group in _group(params_list, ('enabled', 'notes')):
+            results.update(icinga2.set_services_notifications(
+                [(params['hostname'], params['servicename']) for params in group],
+                enabled, notes))
+    elif method == 'schedule_host_downtime':
+        results.update(icinga2.schedule_host_downtimes(params_list))
+    elif method == 'schedule_service_downtime':
+        results.update(icinga2.schedule_service_downtimes([
+            dict((key[len('downtime_'):] if key.startswith('downtime_') else key, value)
+                 for key, value in params.items())
+            for params in params_list]))
+    elif method == 'acknowledge_host':
+        results.update(icinga2.acknowledge_hosts(params_list))
+    elif method == 'acknowledge_service':
+        results.update(icinga2.acknowledge_services(params_list))
+    else:
+        raise PlanError("Cannot apply write {}".format(method))
+    return results
+
+
+def apply_plan(path, session=None, executor=None, batch_size=APPLY_BATCH_SIZE):
+    """
+    Perform the writes of a plan. Writes are applied in plan order, consecutive writes
+    of the same stage and method are combined into bulk requests.
+
+    :param path: plan file
+    :param session: MigrationSession providing the Icinga2Config (nothing is fetched)
+    :param executor: WriteExecutor for rate limiting and retries (write serially if not set)
+    :param batch_size: maximum objects per bulk call
+    :return: {stage: {'succeeded': count, 'failed': count}}
+    :rtype: OrderedDict
+    """
+    session = session or MigrationSession()
+    header, entries = read_plan(path)
+    logger.info("Applying plan {} created {}".format(path, header.get('created')))
+
+    stats = OrderedDict()
+    batch = []
+    batch_key = None
+
+    def flush():
+        if not batch:
+            return
+        stage, method = batch_key
+        writes = [(submit_write(executor, method, _apply_batch, session.icinga2, method,
+                                params_list), params_list)
+                  for params_list in _requests(method, batch)]
+        stage_stats = stats.setdefault(stage, {'succeeded': 0, 'failed': 0})
+        for future, params_list in writes:
+            try:
+                results = future.result()
+            except Exception as error:
+                logger.error("Could not apply {} {} writes of stage {}. Error: {}"
+                             .format(len(params_list), method, stage, error))
+                results = {}
+            succeeded = len([result for result in results.values()
+                             if result and result.get('code') == 200])
+            stage_stats['succeeded'] += succeeded
+            stage_stats['failed'] += len(params_list) - succeeded
+        del batch[:]
+
+    for entry in entries:
+        if entry['type'] != WRITE:
+            continue
+        key = (entry['stage'], entry['method'])
+        if key != batch_key or len(batch) >= batch_size:
+            flush()
+            batch_key = key
+        batch.append(entry['params'])
+    flush()
+
+    for stage, stage_stats in stats.items():
+        logger.info("Applied {} writes of stage {} ({} failed)"
+                    .format(stage_stats['succeeded'], stage, stage_stats['failed']))
+    return stats
@@ -0,0 +1,126 @@
+"""
+Snapshot of existing Icinga2 downtimes and comments, used by the migrations to check
+if an object has already been migrated without querying the API for every item.
+"""
+import logging
+import threading
+
+from icinga_migration_utils.migrate import MIGRATION_COMMENT_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+
+def _key(host_name, service_name, author, comment, start_time=None, end_time=None):
+    if start_time is not None:
+        start_time = int(float(start_time))
+    if end_time is not None:
+        end_time = int(float(end_time))
+    return host_name, service_name or None, author, comment, start_time, end_time
+
+
+def _succeeded(future):
+    """
+    Check if a write succeeded: no exception, not rejected by Icinga2 (acknowledgements
+    return False, downtimes a response without results)
+    """
+    if future.cancelled() or future.exception() is not None:
+        return False
+    result = future.result()
+    if isinstance(result, dict):
+        return bool(result.get('results'))
+    return result is not False
+
+
+class Icinga2Snapshot(object):
+    """
+    Downtimes and comments (acknowledgements) existing in Icinga2, indexed by
+    (host, service, author, comment, start, end).
+    Comments are indexed without start and end time. Objects of submitted writes are
+    pending (reported as existing) until the write succeeded or failed.
+    """
+
+    def __init__(self, icinga2, suffix=MIGRATION_COMMENT_SUFFIX):
+        """
+        :param icinga2: Icinga2Config
+        :param suffix: only load downtimes/comments ending with suffix (None: load all)
+        """
+        self.icinga2 = icinga2
+        self.suffix = suffix
+        self.downtimes = set()
+        self.comments = set()
+        self.pending = set()
+        self.lock = threading.Lock()
+
+    def _list(self, object_type, text_attr, attrs):
+        kwargs = {'object_type': object_type, 'attrs': attrs}
+        if self.suffix:
+            kwargs['filter'] = 'match(pattern, {}.{})'.format(object_type.lower(), text_attr)
+            kwargs['filter_vars'] = {'pattern': '*' + self.suffix}
+        return self.icinga2.get_objects_list(**kwargs)
+
+    def load(self):
+        """
+        Load downtimes and comments (one request each)
+
+        :return: self
+        """
+        downtimes = self._list('Downtime', 'comment', [
+            'host_name', 'service_name', 'author', 'comment', 'start_time', 'end_time'])
+        comments = self._list('Comment', 'text', [
+            'host_name', 'service_name', 'author', 'text'])
+
+        with self.lock:
+            self.downtimes = set(
+                _key(d['attrs']['host_name'], d['attrs']['service_name'], d['attrs']['author'],
+                     d['attrs']['comment'], d['attrs']['start_time'], d['attrs']['end_time'])
+                for d in downtimes)
+            self.comments = set(
+                _key(c['attrs']['host_name'], c['attrs']['service_name'], c['attrs']['author'],
+                     c['attrs']['text'])
+                for c in comments)
+        logger.info("Loaded {} downtimes and {} comments from Icinga2"
+                    .format(len(self.downtimes), len(self.comments)))
+        return self
+
+    def _track(self, future, objects, kind, key):
+        with self.lock:
+            self.pending.add((kind, key))
+
+        def done(future):
+            with self.lock:
+                self.pending.discard((kind, key))
+                if _succeeded(future):
+                    objects.add(key)
+        future.add_done_callback(done)
+
+    def has_downtime(self, host_name, service_name, author, comment, start_time, end_time):
+        key = _key(host_name, service_name, author, comment, start_time, end_time)
+        return key in self.downtimes or ('downtime', key) in self.pending
+
+    def add_downtime(self, host_name, service_name, author, comment, start_time, end_time):
+        with self.lock:
+            self.downtimes.add(
+                _key(host_name, service_name, author, comment, start_time, end_time))
+
+    def track_downtime(self, future, host_name, service_name, author, comment, start_time,
+                       end_time):
+        """
+        Add downtime when its write (future) succeeded
+        """
+        key = _key(host_name, service_name, author, comment, start_time, end_time)
+        self._track(future, self.downtimes, 'downtime', key)
+
+    def has_acknowledgement(self, host_name, service_name, author, comment):
+        key = _key(host_name, service_name, author, comment)
+        return key in self.comments or ('comment', key) in self.pending
+
+    def add_acknowledgement(self, host_name, service_name, author, comment):
+        with self.lock:
+            self.comments.add(_key(host_name, service_name, author, comment))
+
+    def track_acknowledgement(self, future, host_name, service_name, author, comment):
+        """
+        Add acknowledgement when its write (future) succeeded
+        """
+        key = _key(host_name, service_name, author, comment)
+        self._track(future, self.comments, 'comment', key)
@@ -0,0 +1,236 @@
+"""
+Session shared by migrate and compare functions.
+
+A session owns one Icinga1Config and one Icinga2Config and memoizes the data sets the
+functions derive from them (hosts, services and status by host, the Icinga2 service
+index, the snapshot of migrated downtimes and comments). Running several functions
+with the same session parses the Icinga1 caches and fetches Icinga2 services once:
+
+    session = MigrationSession()
+    migrate_host_notification_states(simulate=False, session=session)
+    migrate_service_notification_states(simulate=False, session=session)
+    migrate_service_downtimes(simulate=False, session=session)
+
+Data is fetched when first needed and not refreshed afterwards, call invalidate()
+to fetch it again. Different data sets can be loaded concurrently (e.g. prefetched by
+the migration pipeline), a data set is loaded once even if requested by several threads.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from icinga_migration_utils.matching import ServiceIndex
+
+logger = logging.getLogger(__name__)
+
+
+class MigrationSession(object):
+    """
+    Icinga1 and Icinga2 views with memoized derived structures
+    """
+
+    def __init__(self, icinga1=None, icinga2=None):
+        """
+        :param icinga1: Icinga1Config (built on first use if not set)
+        :param icinga2: Icinga2Config (built on first use if not set)
+        """
+        self._icinga1 = icinga1
+        self._icinga2 = icinga2
+        self._cache = {}
+        self._locks = {}
+        self._loaders = {}
+        # Icinga1Config parses the cache files on first access and is not thread safe
+        self._icinga1_lock = threading.Lock()
+        self.lock = threading.RLock()
+        self.load_times = OrderedDict()
+
+    @property
+    def icinga1(self):
+        if self._icinga1 is None:
+            from icinga_migration_utils.icinga1.icinga1 import Icinga1Config
+            with self.lock:
+                if self._icinga1 is None:
+                    self._icinga1 = Icinga1Config()
+        return self._icinga1
+
+    @property
+    def icinga2(self):
+        if self._icinga2 is None:
+            from icinga_migration_utils.icinga2.icinga2 import Icinga2Config
+            with self.lock:
+                if self._icinga2 is None:
+                    self._icinga2 = Icinga2Config()
+        return self._icinga2
+
+    def _memoize(self, key, func, *args, **kwargs):
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        with self.lock:
+            key_lock = self._locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key not in self._cache:
+                logger.debug("Session: loading {}".format(key))
+                start = time.monotonic()
+                loader = self._loaders.get(key)
+                self._cache[key] = loader() if loader else func(*args, **kwargs)
+                self.load_times[key] = time.monotonic() - start
+            return self._cache[key]
+
+    def _icinga1_loader(self, method):
+        def load():
+            with self._icinga1_lock:
+                return getattr(self.icinga1, method)()
+        return load
+
+    def _icinga1_attribute(self, name):
+        def load():
+            with self._icinga1_lock:
+                return getattr(self.icinga1, name)
+        return load
+
+    def seed(self, key, value):
+        """
+        Set a data set instead of loading it
+
+        :param key: data set, e.g. ('snapshot', suffix)
+        :param value: data
+        """
+        with self.lock:
+            self._cache[key] = value
+
+    def set_loader(self, key, func):
+        """
+        Load a data set with func instead of the default loader (also after it was
+        invalidated)
+
+        :param key: data set, e.g. ('snapshot', suffix)
+        :param func: loader, called without arguments
+        """
+        with self.lock:
+            self._loaders[key] = func
+
+    def invalidate(self, *keys):
+        """
+        Drop memoized data sets, all if no key is given
+
+        :param keys: data sets, e.g. 'icinga2_services_by_host'
+        """
+        with self.lock:
+            if not keys:
+                self._cache.clear()
+            for key in list(self._cache):
+                if key in keys or (isinstance(key, tuple) and key[0] in keys):
+                    del self._cache[key]
+
+    def icinga1_hosts(self):
+        """
+        :return: Icinga1 hosts
+        :rtype: list
+        """
+        return self._memoize('icinga1_hosts', self._icinga1_loader('get_hosts'))
+
+    def icinga1_hosts_dict(self):
+        """
+        :return: Icinga1 hosts by hostname
+        :rtype: dict
+        """
+        return self._memoize('icinga1_hosts_dict', self._icinga1_loader('get_hosts_dict'))
+
+    def icinga1_services(self):
+        """
+        :return: Icinga1 services
+        :rtype: list
+        """
+        return self._memoize('icinga1_services', self._icinga1_loader('get_services'))
+
+    def icinga1_services_by_host(self):
+        """
+        :return: Icinga1 services by hostname
+        :rtype: dict
+        """
+        return self._memoize('icinga1_services_by_host',
+                             self._icinga1_loader('get_services_by_hostname'))
+
+    def icinga1_hoststatus_by_host(self):
+        """
+        :return: Icinga1 host status by hostname
+        :rtype: dict
+        """
+        return self._memoize('icinga1_hoststatus_by_host',
+                             self._icinga1_loader('get_hoststatus_by_host'))
+
+    def icinga1_servicestatus_by_host(self):
+        """
+        :return: Icinga1 service status by hostname
+        :rtype: dict
+        """
+        return self._memoize('icinga1_servicestatus_by_host',
+                             self._icinga1_loader('get_servicestatus_by_host'))
+
+    def icinga1_hostdowntimes(self):
+        """
+        :return: Icinga1 host downtimes
+        :rtype: list
+        """
+        return self._memoize('icinga1_hostdowntimes', self._icinga1_attribute('hostdowntimes'))
+
+    def icinga1_servicedowntimes(self):
+        """
+        :return: Icinga1 service downtimes
+        :rtype: list
+        """
+        return self._memoize('icinga1_servicedowntimes',
+                             self._icinga1_attribute('servicedowntimes'))
+
+    def icinga1_host_acknowledgements(self):
+        """
+        :return: Icinga1 host acknowledgements
+        :rtype: list
+        """
+        return self._memoize('icinga1_host_acknowledgements',
+                             self._icinga1_attribute('host_acknowledgements'))
+
+    def icinga1_service_acknowledgements(self):
+        """
+        :return: Icinga1 service acknowledgements
+        :rtype: list
+        """
+        return self._memoize('icinga1_service_acknowledgements',
+                             self._icinga1_attribute('service_acknowledgements'))
+
+    def icinga2_hosts_dict(self):
+        """
+        :return: Icinga2 hosts by hostname (lazy, attributes are loaded on first access)
+        :rtype: dict
+        """
+        return self._memoize('icinga2_hosts_dict', self.icinga2.get_hosts_dict, lazy=True)
+
+    def icinga2_services_by_host(self):
+        """
+        :return: Icinga2 services by hostname
+        :rtype: dict
+        """
+        return self._memoize('icinga2_services_by_host', self.icinga2.get_services_by_hostname)
+
+    def icinga2_service_index(self):
+        """
+        :return: index of Icinga2 services by hostname
+        :rtype: ServiceIndex
+        """
+        return self._memoize('icinga2_service_index', lambda: ServiceIndex(
+            self.icinga2_services_by_host()))
+
+    def snapshot(self, suffix):
+        """
+        Snapshot of migrated downtimes and comments, updated by the migrate functions
+        for their writes
+
+        :param suffix: migration comment suffix
+        :rtype: Icinga2Snapshot
+        """
+        from icinga_migration_utils.migrate.snapshot import Icinga2Snapshot
+        return self._memoize(('snapshot', suffix),
+                             lambda: Icinga2Snapshot(self.icinga2, suffix).load())
@@ -1,13 +1,12 @@
 import collections
 import datetime
+import functools
+import json
 import logging
+import math
+import re
 import textwrap
 
-from boltons.iterutils import remap
-from nested_dict import nested_dict
-
-from ruamel import yaml
-
 
 logger = logging.getLogger(__name__)
 
@@ -29,7 +28,7 @@ def format_date(datetime_obj):
 def ndict(data):
     """
     Create a defaultdict-like dictionary that allows accessing nested keys without getting
-    KeyErrors or TypeErrors.
+    KeyErrors or TypeErrors. Copies data - use getter/getpath for lookups in loops.
 
     Regular dict:
     {'a': 'a', 'b': None}['c'] => KeyError
@@ -39,15 +38,64 @@ def ndict(data):
     {'a': 'a', 'b': None}['c'] => {}
     {'a': 'a', 'b': None}['b']['c'] => {}
 
+    Dictionary subclasses (e.g. lazily hydrated Icinga2 attributes) are copied as plain
+    dictionaries with the keys they hold, attributes are not hydrated.
+
     :param data: dictionary data to convert
     :type data: dict
     :return:
     """
-    data = remap(data, lambda p, k, v: v is not None)
+    from boltons.iterutils import default_enter, remap
+    from nested_dict import nested_dict
+
+    def enter(path, key, value):
+        if isinstance(value, dict) and type(value) is not dict:
+            return {}, iter(dict(value).items())
+        return default_enter(path, key, value)
+
+    data = remap(data, lambda p, k, v: v is not None, enter=enter)
     return nested_dict(data)
 
 
-def pretty_print_dict(d, indent=''):
+@functools.lru_cache(maxsize=None)
+def getter(path):
+    """
+    Compile getter for a dotted path of nested keys. Works on the original objects (no
+    copy), returns the default instead of raising KeyError or TypeError (like ndict).
+
+    Example:
+        get_comment = getter('attrs.vars.comment')
+        get_comment(service)                => value or None
+        get_comment(service, default='')   => value or ''
+
+    :param path: dotted path, e.g. 'attrs.vars.comment'
+    :return: callable(obj, default=None)
+    """
+    keys = tuple(path.split('.'))
+
+    def get(obj, default=None):
+        for key in keys:
+            try:
+                obj = obj[key]
+            except (KeyError, TypeError, IndexError):
+                return default
+        return obj
+    return get
+
+
+def getpath(obj, path, default=None):
+    """
+    Get value of a dotted path of nested keys (see getter)
+
+    :param obj: dictionary
+    :param path: dotted path, e.g. 'attrs.vars.nosla'
+    :param default: value if path does not exist
+    :return: value or default
+    """
+    return getter(path)(obj, default)
+
+
+def pretty_print_dict(d, indent='', use_ruamel=False):
     """
     Pretty print dictionary
 
@@ -55,14 +103,134 @@ def pretty_print_dict(d, indent=''):
     :type d: dict
     :param indent: indentation
     :type indent: str
+    :param use_ruamel: dump with ruamel.yaml instead of the fast emitter (see emit_yaml)
     :return:
     """
+    if not use_ruamel:
+        return emit_yaml(d, indent)
+    from ruamel import yaml
+
     d = collections.OrderedDict(sorted(d.items()))
     d = dict(d)
     pretty_service = yaml.dump(d, None, default_flow_style=False)
     return textwrap.indent(pretty_service, indent)
 
 
+# Strings that would be loaded as another type (bool, null, number, date) if unquoted
+YAML_RESERVED_REGEX = re.compile(
+    r'^(?:yes|Yes|YES|no|No|NO|true|True|TRUE|false|False|FALSE|on|On|ON|off|Off|OFF'
+    r'|null|Null|NULL|~|=|<<'
+    r'|[-+]?(?:0[xXoObB][0-9a-fA-F_]+|\.?[0-9][0-9_:,.eE+-]*|\.(?:inf|Inf|INF|nan|NaN|NAN))'
+    r'|[0-9]{4}-[0-9]{1,2}-[0-9]{1,2}.*)$')
+YAML_PLAIN_REGEX = re.compile(r'^[A-Za-z0-9_./(][^\x00-\x1f\x7f:#]*$')
+
+
+def _yaml_scalar(value):
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        if math.isnan(value):
+            return '.nan'
+        if math.isinf(value):
+            return '.inf' if value > 0 else '-.inf'
+        return repr(value)
+    value = str(value)
+    if YAML_PLAIN_REGEX.match(value) and not YAML_RESERVED_REGEX.match(value) \
+            and value == value.strip():
+        return value
+    if value.isprintable():
+        return "'" + value.replace("'", "''") + "'"
+    return json.dumps(value)
+
+
+def _emit_yaml(value, indent, lines):
+    if isinstance(value, dict):
+        for key, item in sorted(value.items(), key=lambda entry: str(entry[0])):
+            prefix = indent + _yaml_scalar(key) + ':'
+            if isinstance(item, (dict, list)) and item:
+                lines.append(prefix)
+                # lists are not indented relative to their key
+                _emit_yaml(item, indent + '  ' if isinstance(item, dict) else indent, lines)
+            else:
+                lines.append(prefix + ' ' + _emit_yaml_inline(item))
+    else:
+        for item in value:
+            if isinstance(item, (dict, list)) and item:
+                item_lines = []
+                _emit_yaml(item, indent + '  ', item_lines)
+                lines.append(indent + '- ' + item_lines[0][len(indent) + 2:])
+                lines.extend(item_lines[1:])
+            else:
+                lines.append(indent + '- ' + _emit_yaml_inline(item))
+
+
+def _emit_yaml_inline(value):
+    if isinstance(value, dict):
+        return '{}'
+    if isinstance(value, list):
+        return '[]'
+    return _yaml_scalar(value)
+
+
+def emit_yaml(d, indent=''):
+    """
+    Fast YAML emitter for records of strings, numbers, lists and dicts.
+    Produces the block layout of yaml.dump(d, default_flow_style=False) with sorted keys,
+    strings are quoted more conservatively.
+
+    :param d: dictionary
+    :type d: dict
+    :param indent: indentation
+    :type indent: str
+    :return: YAML document
+    :rtype: str
+    """
+    if not d:
+        return indent + '{}\n'
+    lines = []
+    _emit_yaml(d, indent, lines)
+    return '\n'.join(lines) + '\n'
+
+
+class BatchWriter(object):
+    """
+    Collect output and write it to stream in batches
+
+    Example:
+        with BatchWriter(sys.stdout) as writer:
+            writer.write('line\n')
+    """
+
+    def __init__(self, stream, batch_size=1000):
+        """
+        :param stream: file handle
+        :param batch_size: number of writes to collect
+        """
+        self.stream = stream
+        self.batch_size = batch_size
+        self.chunks = []
+
+    def write(self, text):
+        self.chunks.append(text)
+        if len(self.chunks) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.chunks:
+            self.stream.write(''.join(self.chunks))
+            self.chunks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.flush()
+
+
 def unixtimestamp_tostr(timestamp):
     """
     Convert unix timestamp to string
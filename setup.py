@@ -18,5 +18,8 @@ setup(
         'progressbar2',
         'ruamel.yaml',
     ],
+    extras_require={
+        'columnar': ['numpy'],
+    },
     include_package_data=True
 )
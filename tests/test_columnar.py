@@ -0,0 +1,34 @@
+import pytest
+
+from icinga_migration_utils.compare.columnar import (HOST_ATTRIBUTES, MINUTES,
+                                                     AttributeMapping, align_hosts,
+                                                     diff_columns)
+
+
+def test_align_hosts():
+    pairs, missing = align_hosts(
+        {'host2': {'host_name': 'host2'}, 'host1': {'host_name': 'host1'}},
+        {'host1': {'attrs': {'name': 'host1'}}})
+    assert pairs == [('host1', {'host_name': 'host1'}, {'name': 'host1'})]
+    assert missing == ['host2']
+
+
+def test_diff_columns():
+    pytest.importorskip('numpy')
+    pairs = [
+        ('host1', {'check_interval': '5', 'max_check_attempts': '3', 'retry_interval': '1'},
+         {'check_interval': 300.0, 'max_check_attempts': 3.0, 'retry_interval': 60.0}),
+        ('host2', {'check_interval': '1', 'max_check_attempts': '3', 'retry_interval': '1'},
+         {'check_interval': 300.0, 'max_check_attempts': 5.0, 'retry_interval': 60.0}),
+        ('host3', {'check_interval': '5', 'max_check_attempts': '3'},
+         {'check_interval': 300.0, 'max_check_attempts': 3.0}),
+    ]
+    attributes = HOST_ATTRIBUTES + [
+        AttributeMapping('notification_interval', icinga2_attr='interval',
+                         icinga1_factor=MINUTES)]
+    result = diff_columns(pairs, attributes)
+
+    assert result['check_interval'] == [('host2', '1', 300.0)]
+    assert result['max_check_attempts'] == [('host2', '3', 5.0)]
+    assert result['retry_interval'] == []
+    assert result['notification_interval'] == []
@@ -0,0 +1,196 @@
+import io
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from icinga_migration_utils import defaults
+from icinga_migration_utils.compare.compare import (JSONL, compare_acknowledged_problems,
+                                                    compare_contacts, compare_hosts,
+                                                    compare_services)
+from icinga_migration_utils.compare.sinks import JsonlSink
+from icinga_migration_utils.icinga2.lazy import lazy_list
+from icinga_migration_utils.session import MigrationSession
+
+
+class FakeIcinga1(object):
+    contacts = [{'contact_name': 'alice', 'email': 'alice@example.com'},
+                {'contact_name': 'bob', 'email': 'bob@example.com'}]
+
+
+class FakeIcinga2(object):
+    def get_users(self):
+        return [{'name': 'alice', 'attrs': {'name': 'alice', 'email': 'alice@example.com'}}]
+
+
+def test_import_without_config(tmpdir):
+    env = dict(os.environ, HOME=str(tmpdir), ICINGADIFF_CONFIG=str(tmpdir.join('missing')))
+    code = ("import sys, icinga_migration_utils.compare.compare, "
+            "icinga_migration_utils.migrate.notification_states; "
+            "print(sorted(name for name in ('icinga2api', 'requests', 'progressbar', 'ruamel',"
+            " 'boltons') if name in sys.modules))")
+    output = subprocess.check_output([sys.executable, '-c', code], env=env,
+                                     cwd=os.path.dirname(os.path.dirname(__file__)))
+    assert output.decode().strip() == '[]'
+
+
+def test_shared_defaults(monkeypatch):
+    built = []
+
+    def build():
+        built.append(1)
+        return FakeIcinga2()
+
+    defaults.reset_defaults()
+    monkeypatch.setattr(defaults, '_build_icinga1', FakeIcinga1)
+    monkeypatch.setattr(defaults, '_build_icinga2', build)
+    try:
+        assert compare_contacts()['missing'] == ['bob']
+        compare_contacts(icinga1=FakeIcinga1())
+        assert len(built) == 1
+        assert defaults.default_icinga2() is defaults.default_icinga2()
+    finally:
+        defaults.reset_defaults()
+
+
+class LazyHostsIcinga2(object):
+    hosts = [{'name': 'host1', 'attrs': {'name': 'host1', 'check_interval': 300.0,
+                                         'max_check_attempts': 3.0, 'retry_interval': 60.0,
+                                         'vars': {'os': 'Linux'}}}]
+
+    def get_objects_list(self, object_type, attrs, **query):
+        return [{'name': host['name'],
+                 'attrs': dict((attr, host['attrs'][attr]) for attr in attrs)}
+                for host in self.hosts]
+
+    def get_hosts_dict(self, lazy=False):
+        return dict((host['attrs']['name'], host)
+                    for host in lazy_list(self, 'Host', ['name']))
+
+
+class HostsIcinga1(object):
+    def get_hosts_dict(self):
+        return {'host1': {'host_name': 'host1', 'notes': 'no-sla', 'check_interval': '5',
+                          'max_check_attempts': '3', 'retry_interval': '1'}}
+
+
+def test_compare_hosts_lazy_nosla():
+    session = MigrationSession(HostsIcinga1(), LazyHostsIcinga2())
+
+    result = compare_hosts(session=session)
+    assert result['nosla'] == ['host1']
+    assert not result['missing'] and not result['check_interval']
+
+    stream = io.StringIO()
+    assert compare_hosts(session=session, sink=JsonlSink(stream)) == {'nosla': 1}
+    assert json.loads(stream.getvalue())['differences'] == {'nosla': ['host1']}
+
+
+def icinga1_service(hostname, check_command, notifications_enabled='1', notes=None):
+    service = {'host_name': hostname, 'service_description': check_command,
+               'check_command': 'check_nrpe!' + check_command,
+               'check_command_extracted': check_command,
+               'notifications_enabled': notifications_enabled}
+    if notes:
+        service['notes'] = notes
+    return service
+
+
+def icinga2_service(hostname, name, check_command, enable_notifications=True, vars=None):
+    return {'name': '{}!{}'.format(hostname, name), 'check_command_extracted': check_command,
+            'attrs': {'name': name, 'host_name': hostname, 'check_command': 'nrpe',
+                      'enable_notifications': enable_notifications, 'vars': vars}}
+
+
+class ServicesIcinga1(object):
+    def get_services_by_hostname(self):
+        return defaultdict(list, dict(
+            ('host{}'.format(i), [icinga1_service('host{}'.format(i), 'check_disk'),
+                                  icinga1_service('host{}'.format(i), 'check_load')])
+            for i in range(4)))
+
+    def get_servicestatus_by_host(self):
+        return {}
+
+
+class ServicesIcinga2(object):
+    def get_hosts_dict(self, lazy=False):
+        return dict(('host{}'.format(i), {}) for i in range(4))
+
+    def get_services_by_hostname(self):
+        # host0 matches, host1 lacks check_load, host2 and host3 differ in notifications
+        return {
+            'host0': [icinga2_service('host0', 'disk', 'check_disk'),
+                      icinga2_service('host0', 'load', 'check_load')],
+            'host1': [icinga2_service('host1', 'disk', 'check_disk')],
+            'host2': [icinga2_service('host2', 'disk', 'check_disk', False),
+                      icinga2_service('host2', 'load', 'check_load')],
+            'host3': [icinga2_service('host3', 'disk', 'check_disk'),
+                      icinga2_service('host3', 'load', 'check_load', False)],
+        }
+
+
+def test_compare_services_stream_to_sinks(tmpdir):
+    path = str(tmpdir.join('services.jsonl'))
+    session = MigrationSession(ServicesIcinga1(), ServicesIcinga2())
+    with JsonlSink(path, batch_size=1) as sink:
+        counts = compare_services(output=str(tmpdir.join('services.txt')), processes=2,
+                                  skip_identical=False, sink=sink, session=session)
+    assert counts == {'icinga1_missing_icinga2': 1, 'notification_states': 2}
+
+    records = [json.loads(line) for line in open(path)]
+    assert [record['name'] for record in records] == ['host1', 'host2', 'host3']
+    assert records[0]['differences'] == {'icinga1_missing_icinga2': ['check_load']}
+    assert json.load(open(str(tmpdir.join('services.txt.json'))))['host3'][
+        'notification_states'] == [
+        {'command': 'check_nrpe!check_load - check_load', 'icinga1': True, 'icinga2': False}]
+
+    # without output and sink the differences are returned
+    diff = compare_services(processes=2, skip_identical=False, session=session)
+    assert sorted(diff) == ['host1', 'host2', 'host3']
+    assert diff['host1']['icinga1_missing_icinga2'] == ['check_load']
+
+
+class AcksIcinga1(object):
+    status = [
+        {'object_type': 'hoststatus', 'host_name': 'host1',
+         'problem_has_been_acknowledged': '1'},
+        {'object_type': 'servicestatus', 'host_name': 'host1', 'service_description': 'check_disk',
+         'problem_has_been_acknowledged': '1'},
+        {'object_type': 'servicestatus', 'host_name': 'host2',
+         'service_description': 'check_load', 'problem_has_been_acknowledged': '1'},
+        {'object_type': 'servicestatus', 'host_name': 'host2',
+         'service_description': 'check_ping', 'problem_has_been_acknowledged': '0'},
+    ]
+
+    def get_services(self):
+        return [icinga1_service('host1', 'check_disk'),
+                icinga1_service('host2', 'check_load')]
+
+
+class AcksIcinga2(object):
+    def get_services_by_hostname(self):
+        return {'host1': [icinga2_service('host1', 'disk', 'check_disk')],
+                'host2': [icinga2_service('host2', 'load', 'check_load')]}
+
+    def get_acknowledgements(self):
+        return [{'name': 'host1!disk!c1',
+                 'attrs': {'host_name': 'host1', 'service_name': 'disk'}},
+                {'name': 'host3!c2', 'attrs': {'host_name': 'host3', 'service_name': ''}}]
+
+
+def test_compare_acknowledged_problems_jsonl(tmpdir):
+    path = str(tmpdir.join('acks.jsonl'))
+    session = MigrationSession(AcksIcinga1(), AcksIcinga2())
+
+    count = compare_acknowledged_problems(output=path, output_format=JSONL, session=session)
+
+    records = [json.loads(line) for line in open(path)]
+    assert count == len(records) == 4
+    assert [(record['host_name'], record['service_name'], len(record['icinga1']),
+             len(record['icinga2'])) for record in records] == [
+        ('host1', None, 1, 0),
+        ('host1', 'disk', 1, 1),
+        ('host2', 'load', 1, 0),
+        ('host3', None, 0, 1)]
@@ -0,0 +1,119 @@
+import os
+
+from icinga_migration_utils.compare.compare import _iter_services_diffs, diff_host_services
+from icinga_migration_utils.icinga1.icinga1 import Icinga1Config
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def icinga1_service(check_command, notifications_enabled='1', notes=None):
+    service = {'host_name': 'host1', 'service_description': check_command.upper(),
+               'check_command': 'check_nrpe!' + check_command,
+               'check_command_extracted': check_command,
+               'notifications_enabled': notifications_enabled}
+    if notes:
+        service['notes'] = notes
+    return service
+
+
+def icinga1_state(check_command, notifications_enabled):
+    return {'check_command': 'check_nrpe!' + check_command,
+            'service_description': check_command.upper(),
+            'notifications_enabled': notifications_enabled}
+
+
+def icinga2_service(check_command, enable_notifications=True, vars=None, **attrs):
+    service_attrs = {'name': check_command, 'enable_notifications': enable_notifications,
+                     'vars': vars}
+    service_attrs.update(attrs)
+    return {'name': 'host1!' + check_command, 'check_command_extracted': check_command,
+            'attrs': service_attrs}
+
+
+def test_missing_services():
+    diff = diff_host_services([icinga1_service('check_disk'), icinga1_service('check_load')],
+                              [], [icinga2_service('check_disk')])
+    assert diff == {'icinga1_missing_icinga2': ['check_load']}
+
+
+def test_match_by_comment():
+    icinga2_services = [icinga2_service('check_disk'),
+                        icinga2_service('load', vars={'comment': 'check_load'})]
+    icinga1_services = [icinga1_service('check_disk'), icinga1_service('check_load')]
+    assert diff_host_services(icinga1_services, [], icinga2_services) == {}
+
+    # a comment matches one Icinga1 service only
+    diff = diff_host_services(icinga1_services + [icinga1_service('check_load')], [],
+                              icinga2_services)
+    assert diff == {'icinga1_missing_icinga2': ['check_load']}
+
+
+def test_notification_states_from_status():
+    icinga1_services = [icinga1_service('check_disk', notifications_enabled='1')]
+    icinga2_services = [icinga2_service('check_disk', enable_notifications=True)]
+    assert diff_host_services(icinga1_services, [], icinga2_services) == {}
+
+    diff = diff_host_services(icinga1_services, [icinga1_state('check_disk', '0')],
+                              icinga2_services)
+    assert diff == {'notification_states': [
+        {'command': 'check_nrpe!check_disk - CHECK_DISK', 'icinga1': False, 'icinga2': True}]}
+
+
+def test_notification_states_from_config():
+    diff = diff_host_services([icinga1_service('check_disk', notifications_enabled='0')], [],
+                              [icinga2_service('check_disk', enable_notifications=True)])
+    assert diff['notification_states'][0]['icinga1'] is False
+
+    # runtime changes in Icinga2 are ignored, the original state is compared
+    icinga2_services = [icinga2_service(
+        'check_disk', enable_notifications=True,
+        original_attributes={'enable_notifications': False})]
+    assert diff_host_services([icinga1_service('check_disk', notifications_enabled='0')], [],
+                              icinga2_services) == {}
+
+    # objects never modified at runtime have no original attributes
+    icinga2_services = [icinga2_service('check_disk', enable_notifications=False,
+                                        original_attributes=None)]
+    assert diff_host_services([icinga1_service('check_disk', notifications_enabled='0')], [],
+                              icinga2_services) == {}
+
+
+def test_notification_states_from_object_cache():
+    # Icinga1 services have notifications_enabled ('0'/'1'), no enable_notifications
+    icinga1 = Icinga1Config(objects_files=os.path.join(FIXTURES, 'objects_monitoring01.cache'),
+                            status_files=os.path.join(FIXTURES, 'status_monitoring01.cache'))
+    icinga1_services = icinga1.get_services()
+    assert icinga1_services[0]['notifications_enabled'] == '1'
+    assert 'enable_notifications' not in icinga1_services[0]
+
+    icinga2_services = [icinga2_service('check_zabbixagent', enable_notifications=False,
+                                        vars={'nosla': True})]
+    diff = diff_host_services(icinga1_services, [], icinga2_services)
+    assert diff == {'notification_states': [
+        {'command': 'check_nrpe_1arg!check_zabbixagent - Zabbix Agent TCP',
+         'icinga1': True, 'icinga2': False}]}
+
+
+def test_nosla():
+    icinga1_services = [icinga1_service('check_disk', notes='no-sla')]
+    assert diff_host_services(icinga1_services, [], [
+        icinga2_service('check_disk', vars={'nosla': True})]) == {}
+
+    diff = diff_host_services(icinga1_services, [], [icinga2_service('check_disk')])
+    assert diff == {'nosla_diff': [
+        {'command': 'check_nrpe!check_disk - CHECK_DISK', 'icinga1': True, 'icinga2': False}]}
+
+
+def test_process_pool_results_match():
+    hosts = []
+    for i in range(6):
+        icinga1_services = [icinga1_service('check_disk', str(i % 2)),
+                            icinga1_service('check_load')]
+        icinga2_services = [icinga2_service('check_disk')] if i % 3 else []
+        hosts.append(('host{}'.format(i), icinga1_services, [], icinga2_services))
+
+    in_process = list(_iter_services_diffs(hosts, {}, hosts))
+    pooled = list(_iter_services_diffs(hosts, {}, hosts, processes=2))
+    assert pooled == in_process
+    assert [hostname for hostname, _ in pooled] == ['host{}'.format(i) for i in range(6)]
+    assert in_process[0][1] == {'icinga1_missing_icinga2': ['check_disk', 'check_load']}
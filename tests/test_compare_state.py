@@ -0,0 +1,38 @@
+from icinga_migration_utils.compare.state import CompareState, host_input_digest
+
+
+def test_host_input_digest():
+    icinga1_host = {'check_interval': '5', 'last_update': '1'}
+    icinga2_host = {'attrs': {'check_interval': 300.0, 'last_check': 1.0}}
+    digest = host_input_digest(icinga1_host, icinga2_host)
+
+    icinga1_host['last_update'] = '2'
+    icinga2_host['attrs']['last_check'] = 2.0
+    assert host_input_digest(icinga1_host, icinga2_host) == digest
+    icinga2_host['attrs']['check_interval'] = 60.0
+    assert host_input_digest(icinga1_host, icinga2_host) != digest
+    assert host_input_digest(icinga1_host, None) != digest
+
+
+def test_compare_state(tmpdir):
+    path = str(tmpdir.join('services.txt.state.json'))
+    state = CompareState(path)
+    assert state.reuse({'host1': 'a'}) == {}
+
+    delta = state.update({'host1': 'a', 'host2': 'b', 'host3': 'c'},
+                         {'host1': {'missing': ['ping']}, 'host2': {'missing': ['ssh']}})
+    assert delta == {'new': {'host1': {'missing': ['ping']}, 'host2': {'missing': ['ssh']}},
+                     'changed': {}, 'resolved': []}
+    state.save()
+
+    state = CompareState(path)
+    digests = {'host1': 'a', 'host2': 'changed', 'host3': 'changed', 'host4': 'd'}
+    assert state.reuse(digests) == {'host1': {'missing': ['ping']}}
+
+    delta = state.update(digests, {'host1': {'missing': ['ping']},
+                                   'host3': {'missing': ['disk']}})
+    assert delta == {'new': {'host3': {'missing': ['disk']}}, 'changed': {},
+                     'resolved': ['host2']}
+    assert sorted(CompareState(path).hosts) == ['host1', 'host2', 'host3']
+    state.save()
+    assert sorted(CompareState(path).hosts) == ['host1', 'host2', 'host3', 'host4']
@@ -0,0 +1,61 @@
+from icinga_migration_utils.compare.contacts import (diff_contacts, normalize_email,
+                                                     normalize_pager)
+
+
+def user(name, pager=None, email=None):
+    return {'name': name, 'attrs': {'name': name, 'pager': pager, 'email': email}}
+
+
+def test_normalize():
+    assert normalize_pager('0049 171-123 456') == '49171123456'
+    assert normalize_pager('+49 (171) 123456') == '49171123456'
+    assert normalize_pager('') is None
+    assert normalize_email(' John.Doe@Example.com ') == 'john.doe@example.com'
+
+
+def test_diff_contacts():
+    icinga1_contacts = [
+        {'contact_name': 'alice', 'pager': '0049171111', 'email': 'alice@example.com'},
+        {'contact_name': 'bob', 'pager': '0049172222', 'email': 'bob@example.com'},
+        {'contact_name': 'carol', 'email': 'Carol@example.com'},
+        {'contact_name': 'dave', 'email': 'dave@example.com'},
+        {'contact_name': 'eve', 'email': 'eve@example.com'},
+    ]
+    icinga2_users = [
+        user('alice', '49171111', 'alice@example.com'),
+        user('bob', '49170000', 'robert@example.com'),
+        user('c.smith', None, 'carol@example.com'),
+        user('eve', None, 'eve@example.org'),
+    ]
+    diff = diff_contacts(icinga1_contacts, icinga2_users)
+
+    assert diff['missing'] == ['dave']
+    assert diff['renamed'] == [('carol', 'c.smith', 'email')]
+    assert diff['wrong_pager'] == [('bob', '49172222', '49170000')]
+    # found by normalized email, the case difference is still reported
+    assert diff['wrong_email'] == [('bob', 'bob@example.com', 'robert@example.com'),
+                                   ('carol', 'Carol@example.com', 'carol@example.com'),
+                                   ('eve', 'eve@example.com', 'eve@example.org')]
+
+
+def test_diff_contacts_normalize():
+    icinga1_contacts = [
+        {'contact_name': 'alice', 'pager': '0049 171-111', 'email': 'Alice@example.com '},
+        {'contact_name': 'bob', 'pager': '0049172222', 'email': 'bob@example.com'},
+        {'contact_name': 'carol', 'pager': '0049173333'},
+    ]
+    icinga2_users = [
+        user('alice', '+49171111', 'alice@example.com'),
+        user('bob', '49172222', 'bob@example.com'),
+        user('carol', '49170000'),
+    ]
+    # exact comparison reports formatting differences
+    diff = diff_contacts(icinga1_contacts, icinga2_users)
+    assert diff['wrong_pager'] == [('alice', '49 171-111', '+49171111'),
+                                   ('carol', '49173333', '49170000')]
+    assert diff['wrong_email'] == [('alice', 'Alice@example.com ', 'alice@example.com')]
+
+    # separators, prefix, case and whitespace differences are hidden
+    diff = diff_contacts(icinga1_contacts, icinga2_users, normalize=True)
+    assert diff['wrong_pager'] == [('carol', '49173333', '49170000')]
+    assert diff['wrong_email'] == []
@@ -0,0 +1,50 @@
+import random
+
+from icinga_migration_utils.compare.downtimes import match_downtimes
+from icinga_migration_utils.intervals import IntervalIndex
+from icinga_migration_utils.migrate import MIGRATION_COMMENT_SUFFIX
+
+
+def test_interval_index():
+    random.seed(1)
+    intervals = []
+    for _ in range(500):
+        start = random.randint(0, 10000)
+        intervals.append((start, start + random.randint(0, 2000)))
+    index = IntervalIndex(intervals, lambda interval: interval)
+
+    for _ in range(200):
+        start = random.randint(-100, 12000)
+        end = start + random.randint(0, 500)
+        expected = sorted(i for i in intervals if i[0] <= end and i[1] >= start)
+        assert sorted(index.overlapping(start, end)) == expected
+    assert sorted(index.at(5000)) == sorted(i for i in intervals if i[0] <= 5000 <= i[1])
+    assert IntervalIndex([], lambda interval: interval).overlapping(0, 10) == []
+
+
+def icinga2_downtime(host_name, service_name, comment, start_time, end_time):
+    return {'attrs': {'host_name': host_name, 'service_name': service_name,
+                      'comment': comment, 'start_time': float(start_time),
+                      'end_time': float(end_time)}}
+
+
+def test_match_downtimes():
+    icinga1 = [
+        {'host_name': 'host1', 'comment': 'upgrade', 'start_time': '100', 'end_time': '200'},
+        {'host_name': 'host1', 'service_description': 'Disk', 'comment': 'disk',
+         'start_time': '100', 'end_time': '200'},
+        {'host_name': 'host2', 'comment': 'move', 'start_time': '100', 'end_time': '200'},
+        {'host_name': 'host3', 'comment': 'gone', 'start_time': '100', 'end_time': '200'},
+    ]
+    icinga2 = [
+        icinga2_downtime('host1', '', 'upgrade' + MIGRATION_COMMENT_SUFFIX, 100, 200),
+        icinga2_downtime('host1', 'disk', 'disk', 150, 300),
+        icinga2_downtime('host2', '', 'other', 100, 200),
+        icinga2_downtime('host2', '', 'move', 300, 400),
+    ]
+    result = match_downtimes(icinga1, icinga2, {('host1', 'Disk'): 'disk'})
+
+    assert result['exact'] == [(icinga1[0], icinga2[0])]
+    assert result['partial'] == [(icinga1[1], icinga2[1])]
+    assert result['icinga1_unmatched'] == [icinga1[2], icinga1[3]]
+    assert result['icinga2_unmatched'] == [icinga2[2], icinga2[3]]
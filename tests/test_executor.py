@@ -0,0 +1,69 @@
+import threading
+import time
+
+from requests.exceptions import Timeout
+
+from icinga_migration_utils.migrate.executor import (TokenBucket, WriteExecutor,
+                                                     is_overload_error, submit_write)
+
+
+def test_per_key_ordering():
+    applied = []
+    lock = threading.Lock()
+
+    def write(key, value):
+        time.sleep(0.001 * (value % 3))
+        with lock:
+            applied.append((key, value))
+        return value
+
+    with WriteExecutor(concurrency=4, rate=1000) as executor:
+        futures = [executor.submit(key, write, key, value)
+                   for value in range(20) for key in ('host1', 'host2', 'host3')]
+        stats = executor.wait()
+
+    assert stats['succeeded'] == 60
+    assert [future.result() for future in futures[:3]] == [0, 0, 0]
+    for key in ('host1', 'host2', 'host3'):
+        assert [value for k, value in applied if k == key] == list(range(20))
+
+
+def test_retry_on_overload():
+    calls = []
+
+    def write():
+        calls.append(1)
+        if len(calls) < 3:
+            raise Exception('Request "/v1/actions" failed with status 503: unavailable')
+        return 'ok'
+
+    with WriteExecutor(rate=1000, backoff=0.001) as executor:
+        future = executor.submit('host1', write)
+        assert future.result() == 'ok'
+        assert executor.stats['retried'] == 2
+        assert executor.rate < 1000
+
+
+def test_no_retry_on_other_errors():
+    with WriteExecutor(rate=1000, backoff=0.001) as executor:
+        future = executor.submit('host1', lambda: 1 / 0)
+        assert isinstance(future.exception(), ZeroDivisionError)
+        assert executor.stats['failed'] == 1
+
+
+def test_is_overload_error():
+    assert is_overload_error(Timeout())
+    assert is_overload_error(Exception('failed with status 504: gateway timeout'))
+    assert not is_overload_error(Exception('failed with status 404: not found'))
+
+
+def test_submit_write_without_executor():
+    assert submit_write(None, 'host1', lambda x: x * 2, 21).result() == 42
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=100, capacity=1)
+    start = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    assert time.monotonic() - start >= 0.04
@@ -0,0 +1,51 @@
+from icinga_migration_utils.compare.fingerprint import (changed_hosts, fleet_fingerprint,
+                                                       host_fingerprints,
+                                                       service_fingerprints)
+from icinga_migration_utils.matching import annotate_icinga1_service, annotate_icinga2_service
+
+
+def icinga1_service(check_command, description, notifications_enabled='1', **kwargs):
+    return annotate_icinga1_service(dict(
+        host_name='host1', check_command=check_command, service_description=description,
+        notifications_enabled=notifications_enabled, **kwargs))
+
+
+def icinga2_service(name, check_command, enable_notifications=True, **variables):
+    return annotate_icinga2_service({'name': 'host1!' + name, 'attrs': {
+        'name': name, 'check_command': check_command,
+        'enable_notifications': enable_notifications, 'vars': variables}})
+
+
+def test_host_fingerprints():
+    icinga1_hosts = {
+        'host1': {'check_interval': '5', 'max_check_attempts': '3', 'retry_interval': '1'},
+        'host2': {'check_interval': '5', 'max_check_attempts': '3', 'retry_interval': '1',
+                  'notes': 'no-sla'},
+    }
+    icinga2_hosts = {
+        'host1': {'attrs': {'check_interval': 300.0, 'max_check_attempts': 3.0,
+                            'retry_interval': 60.0, 'vars': None}},
+        'host2': {'attrs': {'check_interval': 300.0, 'max_check_attempts': 3.0,
+                            'retry_interval': 60.0, 'vars': {}}},
+    }
+    icinga1_fingerprints, icinga2_fingerprints = host_fingerprints(icinga1_hosts, icinga2_hosts)
+    assert changed_hosts(icinga1_fingerprints, icinga2_fingerprints) == {'host2'}
+
+    icinga2_hosts['host2']['attrs']['vars']['nosla'] = True
+    icinga1_fingerprints, icinga2_fingerprints = host_fingerprints(icinga1_hosts, icinga2_hosts)
+    assert fleet_fingerprint(icinga1_fingerprints) == fleet_fingerprint(icinga2_fingerprints)
+
+
+def test_service_fingerprints():
+    icinga1_services = [icinga1_service('check_nrpe!check_disk', 'Disk'),
+                        icinga1_service('check_tcp!22', 'SSH', notes='no-sla')]
+    states = [{'check_command': 'check_tcp!22', 'service_description': 'SSH',
+               'notifications_enabled': '0'}]
+    icinga2_services = [icinga2_service('ssh', 'check_tcp', False, nosla=True),
+                        icinga2_service('disk', 'nrpe', nrpe_command='check_disk')]
+    hosts = [('host1', icinga1_services, states, icinga2_services),
+             ('host2', [], [], [icinga2_service('ping', 'ping4')])]
+
+    icinga1_fingerprints, icinga2_fingerprints = service_fingerprints(hosts)
+    assert changed_hosts(icinga1_fingerprints, icinga2_fingerprints) == {'host2'}
+    assert changed_hosts(icinga1_fingerprints, {}) == {'host1', 'host2'}
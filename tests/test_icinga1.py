@@ -91,3 +91,12 @@ def test_icinga1_queries():
     result = config.get_services(host_name='host2', check_command=service3['check_command'])
     assert len(result) == 1
     assert result[0] == service3
+
+
+def test_downtimes_active():
+    config = Icinga1Config(objects_files=sample_objects, status_files=sample_status)
+    downtimes = config.hostdowntimes + config.servicedowntimes
+    timestamp = int(downtimes[0]['start_time'])
+    assert downtimes[0] in config.get_downtimes_active_at(timestamp)
+    assert config.get_downtimes_within(0, 1) == []
+    assert len(config.get_downtimes_within(0, 2 ** 40)) == len(downtimes)
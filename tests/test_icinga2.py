@@ -0,0 +1,233 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from icinga_migration_utils.icinga2.icinga2 import Icinga2Config, Icinga2Error
+
+CONFIG = {'icinga2_web': {'url': 'https://localhost:5665/v1', 'username': 'root',
+                          'password': 'secret'}}
+
+
+class FakeActions(object):
+    def __init__(self):
+        self.calls = []
+
+    def acknowledge_problem(self, object_type, filter, filter_vars, author, comment):
+        self.calls.append((object_type, filter, filter_vars, author, comment))
+        names = ['{}!{}'.format(filter_vars['hostname'], service)
+                 for service in filter_vars.get('servicenames', [])]
+        names = names or filter_vars['hostnames']
+        return {'results': [
+            {'code': 200,
+             'status': "Successfully acknowledged problem for object '{}'.".format(name)}
+            for name in names if not name.endswith('missing')]}
+
+
+class FakeObjects(object):
+    def __init__(self):
+        self.calls = []
+
+    def list(self, object_type, **kwargs):
+        self.calls.append((object_type, kwargs))
+        if object_type == 'Host':
+            return [{'name': 'host1', 'attrs': {'name': 'host1', 'address': '10.0.0.1'}}]
+        return [
+            {'name': 'host1!ping', 'attrs': {'name': 'ping', 'host_name': 'host1'}},
+            {'name': 'host1!disk', 'attrs': {'name': 'disk', 'host_name': 'host1'}},
+        ]
+
+
+class FakeClient(object):
+    def __init__(self):
+        self.actions = FakeActions()
+        self.objects = FakeObjects()
+
+
+def test_acknowledge_services_bulk():
+    icinga2 = Icinga2Config(config=CONFIG, client=FakeClient())
+    acks = [
+        {'host_name': 'host1', 'service_name': 'ping', 'author': 'a', 'comment': 'c'},
+        {'host_name': 'host1', 'service_name': 'disk', 'author': 'a', 'comment': 'c'},
+        {'host_name': 'host1', 'service_name': 'missing', 'author': 'a', 'comment': 'c'},
+        {'host_name': 'host1', 'service_name': 'load', 'author': 'b', 'comment': 'c'},
+        {'host_name': 'host2', 'service_name': 'ping', 'author': 'a', 'comment': 'c'},
+    ]
+    results = icinga2.acknowledge_services(acks)
+
+    calls = icinga2.client.actions.calls
+    assert len(calls) == 3
+    assert calls[0] == ('Service', 'host.name==hostname && service.name in servicenames',
+                        {'hostname': 'host1', 'servicenames': ['ping', 'disk', 'missing']},
+                        'a', 'c')
+    assert list(results) == [('host1', 'ping'), ('host1', 'disk'), ('host1', 'missing'),
+                             ('host1', 'load'), ('host2', 'ping')]
+    assert results[('host1', 'missing')] is None
+    assert results[('host2', 'ping')]['code'] == 200
+
+
+def test_acknowledge_hosts_bulk():
+    icinga2 = Icinga2Config(config=CONFIG, client=FakeClient())
+    results = icinga2.acknowledge_hosts([
+        {'host_name': 'host1', 'author': 'a', 'comment': 'c'},
+        {'host_name': 'host2', 'author': 'a', 'comment': 'c'},
+    ])
+    assert icinga2.client.actions.calls == [
+        ('Host', 'host.name in hostnames', {'hostnames': ['host1', 'host2']}, 'a', 'c')]
+    assert all(result['code'] == 200 for result in results.values())
+
+
+def test_local_joins():
+    config = {'icinga2_web': dict(CONFIG['icinga2_web'], local_joins=True)}
+    icinga2 = Icinga2Config(config=config, client=FakeClient())
+
+    services = icinga2.get_services_by_hostname()
+    assert [service['attrs']['name'] for service in services['host1']] == ['ping', 'disk']
+    assert services['host1'][0]['joins'] == {'host': {'address': '10.0.0.1', 'name': 'host1'}}
+    icinga2.get_services(attrs=['name'])
+
+    calls = icinga2.client.objects.calls
+    assert [call[0] for call in calls] == ['Service', 'Host', 'Service']
+    assert 'joins' not in calls[0][1]
+    assert calls[2][1]['attrs'] == ['name', 'host_name']
+
+
+def test_endpoint_pool_failover():
+    from requests.exceptions import ConnectionError
+    from icinga_migration_utils.icinga2.endpoints import Endpoint, EndpointPool
+
+    class Status(object):
+        def list(self):
+            return {}
+
+    class EndpointClient(object):
+        status = Status()
+
+        def __init__(self, name, fail=False):
+            self.name = name
+            self.fail = fail
+
+    def request(client):
+        if client.fail:
+            raise ConnectionError('connection refused')
+        return client.name
+
+    clients = [EndpointClient('master1'), EndpointClient('master2')]
+    pool = EndpointPool([Endpoint(client.name, client) for client in clients],
+                        health_check_interval=0)
+    assert [pool.call(request) for _ in range(4)] == ['master1', 'master2'] * 2
+
+    clients[0].fail = True
+    pool.health_check_interval = 60
+    assert [pool.call(request) for _ in range(3)] == ['master2'] * 3
+    assert not pool.endpoints[0].healthy
+
+    clients[0].fail = False
+    pool.health_check_interval = 0
+    assert sorted(pool.call(request) for _ in range(2)) == ['master1', 'master2']
+    assert pool.endpoints[0].healthy
+
+
+def test_multiple_endpoints(monkeypatch):
+    monkeypatch.setattr('icinga2api.client.Client',
+                        lambda url, **kwargs: FakeClient())
+    config = {'icinga2_web': dict(CONFIG['icinga2_web'],
+                                  url='https://master1:5665/v1, https://master2:5665/v1',
+                                  primary_url='https://master2:5665/v1')}
+    icinga2 = Icinga2Config(config=config)
+    assert icinga2.url == 'https://master2:5665/v1'
+    assert [endpoint.url for endpoint in icinga2.endpoints.endpoints] == [
+        'https://master2:5665/v1', 'https://master1:5665/v1']
+    assert icinga2.endpoints.endpoints[0].client is icinga2.client
+
+    icinga2.get_hosts()
+    icinga2.get_hosts()
+    assert len(icinga2.endpoints.endpoints[0].client.objects.calls) == 1
+    assert len(icinga2.endpoints.endpoints[1].client.objects.calls) == 1
+
+
+class NotificationObjects(object):
+    def __init__(self):
+        self.calls = []
+
+    def list(self, object_type, **kwargs):
+        self.calls.append(object_type)
+        if object_type == 'User':
+            return [{'name': name, 'attrs': {'name': name, 'email': name + '@example.com',
+                                             'groups': groups}}
+                    for name, groups in (('alice', ['ops']), ('bob', ['ops', 'dev']),
+                                         ('carol', None))]
+        if object_type == 'Notification':
+            return [
+                {'attrs': {'host_name': 'host1', 'service_name': 'disk',
+                           'users': ['carol'], 'user_groups': ['dev']}},
+                {'attrs': {'host_name': 'host1', 'service_name': '',
+                           'users': None, 'user_groups': ['ops', 'unknown']}},
+            ]
+        return [{'name': 'host1!ping', 'attrs': {
+            'name': 'ping', 'host_name': 'host1',
+            'vars': {'notifications': {'users': ['alice', 'nobody']}}}}]
+
+
+def test_service_notification_contacts():
+    client = FakeClient()
+    client.objects = NotificationObjects()
+    icinga2 = Icinga2Config(config=CONFIG, client=client)
+
+    contacts = icinga2.get_service_notification_contacts(hostname='host1')
+    assert [user['name'] for user in contacts['host1!disk']['users']] == ['carol', 'bob']
+    assert [user['name'] for user in contacts['host1']['users']] == ['alice', 'bob']
+    assert [user['name'] for user in contacts['host1!ping']['users']] == ['alice']
+    # user records are shared
+    assert contacts['host1']['users'][1] is contacts['host1!disk']['users'][1]
+
+    icinga2.get_service_notification_contacts(hostname='host1')
+    assert client.objects.calls.count('User') == 1
+
+
+class ObjectsHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        body = json.loads(self.rfile.read(length))
+        self.server.requests.append((self.path, self.headers['Authorization'], body))
+        status, response = self.server.responses.pop(0)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(response).encode('utf-8'))
+
+    def log_message(self, *args):
+        pass
+
+
+def test_update_objects():
+    server = HTTPServer(('127.0.0.1', 0), ObjectsHandler)
+    server.requests = []
+    server.responses = [
+        (200, {'results': [{'code': 200, 'name': 'host1', 'type': 'Host',
+                            'status': 'Attributes updated.'}]}),
+        (503, {'error': 503, 'status': 'Service unavailable'}),
+    ]
+    thread = threading.Thread(target=lambda: [server.handle_request() for _ in range(2)])
+    thread.start()
+
+    config = {'icinga2_web': dict(CONFIG['icinga2_web'], url='http://127.0.0.1:{}/v1'
+                                  .format(server.server_port))}
+    icinga2 = Icinga2Config(config=config, client=FakeClient())
+    results = icinga2.set_hosts_notifications(['host1', 'host2'], False, 'migrated')
+    with pytest.raises(Icinga2Error, match='status 503'):
+        icinga2.update_objects('Service', 'host.name==hostname', {'hostname': 'host1'},
+                               {'enable_active_checks': True})
+    thread.join()
+    server.server_close()
+
+    path, authorization, body = server.requests[0]
+    assert path == '/v1/objects/hosts'
+    assert authorization.startswith('Basic ')
+    assert body == {'filter': 'host.name in hostnames', 'filter_vars': {
+        'hostnames': ['host1', 'host2']}, 'attrs': {'enable_notifications': False,
+                                                    'notes': 'migrated'}}
+    assert results['host1']['code'] == 200
+    assert results['host2'] is None
+    assert server.requests[1][0] == '/v1/objects/services'
@@ -0,0 +1,52 @@
+from icinga_migration_utils.icinga2.lazy import lazy_list
+
+SERVICES = [
+    {'name': 'host1!ping', 'attrs': {'name': 'ping', 'host_name': 'host1',
+                                     'check_command': 'ping4', 'vars': {'comment': 'x'}}},
+    {'name': 'host1!disk', 'attrs': {'name': 'disk', 'host_name': 'host1',
+                                     'check_command': 'disk', 'vars': None}},
+]
+
+
+class FakeIcinga2(object):
+    def __init__(self):
+        self.queries = []
+
+    def get_objects_list(self, object_type, attrs, **query):
+        self.queries.append((attrs, query))
+        if 'invalid' in attrs:
+            raise Exception('Invalid attribute specified: invalid')
+        names = query.get('filter_vars', {}).get('names')
+        return [{'name': service['name'],
+                 'attrs': dict((attr, service['attrs'][attr]) for attr in attrs)}
+                for service in SERVICES if names is None or service['name'] in names]
+
+
+def test_lazy_hydration():
+    icinga2 = FakeIcinga2()
+    services = lazy_list(icinga2, 'Service', ['name', 'host_name'], joins=['host.name'])
+    assert len(icinga2.queries) == 1
+    assert dict(services[0]['attrs']) == {'name': 'ping', 'host_name': 'host1'}
+
+    # one request for all services of the listing, joins are not repeated
+    assert services[0]['attrs']['check_command'] == 'ping4'
+    assert services[1]['attrs']['check_command'] == 'disk'
+    assert icinga2.queries[1] == (['check_command'], {})
+
+    assert services[1]['attrs'].get('vars') is None
+    assert 'vars' in services[0]['attrs']
+    assert len(icinga2.queries) == 3
+
+    # invalid attributes are tried once and stay missing
+    assert services[0]['attrs'].get('invalid', 'default') == 'default'
+    assert 'invalid' not in services[1]['attrs']
+    assert len(icinga2.queries) == 4
+
+
+def test_lazy_hydration_pending_subset():
+    icinga2 = FakeIcinga2()
+    services = lazy_list(icinga2, 'Service', ['name'])
+    dict.__setitem__(services[0]['attrs'], 'host_name', 'host1')
+    assert services[1]['attrs']['host_name'] == 'host1'
+    assert icinga2.queries[1] == (['host_name'], {
+        'filter': 'service.__name in names', 'filter_vars': {'names': ['host1!disk']}})
@@ -0,0 +1,134 @@
+import copy
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from icinga_migration_utils.icinga2.icinga2 import Icinga2Config
+from icinga_migration_utils.icinga2.mirror import Icinga2Mirror
+
+OBJECTS = {
+    'Host': [
+        {'name': 'host1', 'type': 'Host',
+         'attrs': {'name': 'host1', 'address': '10.0.0.1', 'state': 0}},
+    ],
+    'Service': [
+        {'name': 'host1!ping', 'type': 'Service',
+         'attrs': {'name': 'ping', 'host_name': 'host1', 'state': 0, 'acknowledgement': 0}},
+    ],
+    'Downtime': [],
+    'Comment': [],
+}
+
+EVENTS = [
+    {'type': 'StateChange', 'host': 'host1', 'service': 'ping', 'state': 2, 'state_type': 1,
+     'check_result': {'output': 'CRITICAL'}},
+    {'type': 'AcknowledgementSet', 'host': 'host1', 'service': 'ping',
+     'acknowledgement_type': 1},
+    {'type': 'DowntimeAdded', 'downtime': {
+        '__name': 'host1!ping!dt1', 'name': 'dt1', 'host_name': 'host1',
+        'service_name': 'ping', 'author': 'jdoe', 'comment': 'maintenance'}},
+    {'type': 'ObjectDeleted', 'object_type': 'Host', 'object_name': 'host2'},
+]
+
+
+class FakeObjects(object):
+    def list(self, object_type, name=None, **kwargs):
+        return [copy.deepcopy(obj) for obj in OBJECTS[object_type]
+                if not name or obj['name'] == name]
+
+
+class FakeClient(object):
+    objects = FakeObjects()
+
+
+class EventStreamHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        self.server.subscriptions.append(json.loads(self.rfile.read(length)))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        for event in EVENTS:
+            self.wfile.write(json.dumps(event).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+def get_icinga2(url):
+    config = {'icinga2_web': {'url': url, 'username': 'root', 'password': 'secret'}}
+    return Icinga2Config(config=config, client=FakeClient())
+
+
+def test_mirror_event_stream():
+    server = HTTPServer(('127.0.0.1', 0), EventStreamHandler)
+    server.subscriptions = []
+    thread = threading.Thread(target=server.handle_request)
+    thread.start()
+
+    icinga2 = get_icinga2('http://127.0.0.1:{}/v1'.format(server.server_port))
+    mirror = Icinga2Mirror(icinga2, queue='test')
+    mirror.follow(reconnect=False)
+    thread.join()
+    server.server_close()
+
+    assert server.subscriptions[0]['queue'] == 'test'
+    assert 'DowntimeAdded' in server.subscriptions[0]['types']
+    assert mirror.events_applied == 4
+
+    icinga2.mirror = mirror
+    service = icinga2.get_services(host_name='host1')[0]
+    assert service['attrs']['state'] == 2
+    assert service['attrs']['acknowledgement'] == 1
+    assert service['joins']['host']['address'] == '10.0.0.1'
+
+    downtimes = icinga2.get_downtimes(host_name='host1', service_name='ping')
+    assert [downtime['name'] for downtime in downtimes] == ['host1!ping!dt1']
+    assert icinga2.get_downtimes(host_name='host1', author='someone') == []
+
+
+def test_mirror_object_events():
+    mirror = Icinga2Mirror(get_icinga2('http://localhost/v1'))
+    mirror.load()
+    mirror.apply_event({'type': 'ObjectDeleted', 'object_type': 'Service',
+                        'object_name': 'host1!ping'})
+    assert mirror.get_services() == []
+    mirror.apply_event({'type': 'ObjectCreated', 'object_type': 'Service',
+                        'object_name': 'host1!ping'})
+    assert len(mirror.get_services(host_address='10.0.0.1')) == 1
+    mirror.apply_event({'type': 'CommentAdded', 'comment': {
+        'name': 'c1', 'host_name': 'host1', 'author': 'jdoe', 'text': 'ack'}})
+    assert len(mirror.get_acknowledgements(host_name='host1', comment='ack')) == 1
+    mirror.apply_event({'type': 'CommentRemoved', 'comment': {
+        'name': 'c1', 'host_name': 'host1'}})
+    assert mirror.get_acknowledgements() == []
+
+
+def test_mirror_returns_copies():
+    mirror = Icinga2Mirror(get_icinga2('http://localhost/v1'))
+    mirror.load()
+    service = mirror.get_services(host_name='host1')[0]
+    mirror.apply_event({'type': 'StateChange', 'host': 'host1', 'service': 'ping',
+                        'state': 2, 'state_type': 1})
+    assert service['attrs']['state'] == 0
+    assert service['joins']['host']['name'] == 'host1'
+    assert 'joins' not in mirror.services['host1!ping']
+    assert mirror.get_services()[0]['attrs']['state'] == 2
+
+
+def test_mirror_fetches_without_lock():
+    mirror = Icinga2Mirror(get_icinga2('http://localhost/v1'))
+    mirror.load()
+    fetch = mirror._fetch
+    readers = []
+
+    def fetch_and_read(*args):
+        reader = threading.Thread(target=lambda: readers.append(mirror.get_hosts()))
+        reader.start()
+        reader.join(1)
+        return fetch(*args)
+
+    mirror._fetch = fetch_and_read
+    mirror.apply_event({'type': 'ObjectCreated', 'object_type': 'Host', 'object_name': 'host1'})
+    assert len(readers) == 1
@@ -0,0 +1,179 @@
+from icinga_migration_utils.migrate import MIGRATION_COMMENT_SUFFIX
+from icinga_migration_utils.migrate.downtimes import (clean_migrated_downtimes,
+                                                      migrate_host_downtimes)
+from icinga_migration_utils.migrate.journal import MigrationJournal
+from icinga_migration_utils.migrate.pipeline import OK, STAGES, MigrationPipeline
+from icinga_migration_utils.session import MigrationSession
+
+
+def host_downtime(host_name, start_time):
+    return {'host_name': host_name, 'author': 'alice', 'comment': 'maintenance',
+            'start_time': str(start_time), 'end_time': str(start_time + 3600),
+            'duration': '3600', 'fixed': '1'}
+
+
+class FakeIcinga1(object):
+    hostdowntimes = [host_downtime('host1', 1000), host_downtime('host2', 2000)]
+
+
+class FakeActions(object):
+    def __init__(self, missing=()):
+        self.missing = missing
+        self.removed = []
+        self.acknowledgements_removed = []
+
+    def remove_downtime(self, **kwargs):
+        self.removed.append(kwargs)
+        return {'results': [
+            {'code': 200, 'status': "Successfully removed downtime '{}'.".format(name)}
+            for name in kwargs['filter_vars']['names'] if name not in self.missing]}
+
+    def remove_acknowledgement(self, **kwargs):
+        self.acknowledgements_removed.append(kwargs)
+        return {'results': [
+            {'code': 200,
+             'status': "Successfully removed acknowledgement for object '{}'.".format(name)}
+            for name in kwargs['filter_vars']['hostnames'] if name not in self.missing]}
+
+
+class FakeClient(object):
+    def __init__(self, missing=()):
+        self.actions = FakeActions(missing)
+
+
+class FakeIcinga2(object):
+    def __init__(self, fail=(), missing=(), downtimes=None):
+        self.fail = fail
+        self.writes = []
+        self.client = FakeClient(missing)
+        # downtimes existing in Icinga2, API reads fail if not set
+        self.downtimes = downtimes
+
+    def get_hosts_dict(self, lazy=False):
+        return {'host1': {}, 'host2': {}}
+
+    def get_objects_list(self, object_type, **kwargs):
+        if self.downtimes is None:
+            raise AssertionError('API read')
+        return self.downtimes if object_type == 'Downtime' else []
+
+    def schedule_host_downtime(self, host_name, author, comment, start_time, end_time,
+                               duration, fixed):
+        if host_name in self.fail:
+            raise IOError('Read timed out')
+        self.writes.append(host_name)
+        name = '{}!{}'.format(host_name, len(self.writes))
+        return {'results': [{'code': 200, 'name': name,
+                             'status': "Successfully scheduled downtime '{}'".format(name)}]}
+
+
+def run(path, icinga2):
+    with MigrationJournal(str(path)) as journal:
+        session = MigrationSession(FakeIcinga1(), icinga2)
+        migrate_host_downtimes(simulate=False, executor=journal.wrap(),
+                               snapshot=journal.snapshot(), session=session)
+        return len(journal)
+
+
+def test_resume_and_rollback(tmpdir):
+    path = tmpdir.join('migration.journal')
+
+    assert run(path, FakeIcinga2(fail=['host2'])) == 1
+
+    icinga2 = FakeIcinga2()
+    assert run(path, icinga2) == 2
+    assert icinga2.writes == ['host2']
+
+    icinga2 = FakeIcinga2()
+    assert run(path, icinga2) == 2
+    assert icinga2.writes == []
+
+    with MigrationJournal(str(path)) as journal:
+        clean_migrated_downtimes(session=MigrationSession(FakeIcinga1(), icinga2),
+                                 journal=journal)
+    assert icinga2.client.actions.removed == [{
+        'object_type': 'Downtime', 'filter': 'downtime.__name in names',
+        'filter_vars': {'names': ['host1!1', 'host2!1']}}]
+
+    icinga2 = FakeIcinga2()
+    assert run(path, icinga2) == 2
+    assert icinga2.writes == ['host1', 'host2']
+
+
+def test_pipeline_resume_without_reads(tmpdir):
+    path = str(tmpdir.join('migration.journal'))
+    stages = [stage for stage in STAGES if stage.name == 'host_downtimes']
+
+    with MigrationJournal(path) as journal:
+        session = MigrationSession(FakeIcinga1(), FakeIcinga2(fail=['host2'], downtimes=[]))
+        MigrationPipeline(stages, simulate=False, session=session, journal=journal).run()
+
+    icinga2 = FakeIcinga2()
+    with MigrationJournal(path) as journal:
+        session = MigrationSession(FakeIcinga1(), icinga2)
+        results = MigrationPipeline(stages, simulate=False, session=session,
+                                    journal=journal, resume_without_reads=True).run()
+        assert len(journal) == 2
+    assert results['host_downtimes'].status == OK
+    assert icinga2.writes == ['host2']
+
+
+def test_pipeline_skips_downtimes_existing_in_icinga2(tmpdir):
+    path = str(tmpdir.join('migration.journal'))
+    stages = [stage for stage in STAGES if stage.name == 'host_downtimes']
+    # created by a run without journal
+    existing = [{'attrs': {'host_name': 'host1', 'service_name': '', 'author': 'alice',
+                           'comment': 'maintenance' + MIGRATION_COMMENT_SUFFIX,
+                           'start_time': 1000.0, 'end_time': 4600.0}}]
+
+    icinga2 = FakeIcinga2(fail=['host2'], downtimes=existing)
+    with MigrationJournal(path) as journal:
+        session = MigrationSession(FakeIcinga1(), icinga2)
+        MigrationPipeline(stages, simulate=False, session=session, journal=journal).run()
+        assert len(journal) == 0
+    assert icinga2.writes == []
+
+    icinga2 = FakeIcinga2(downtimes=existing)
+    with MigrationJournal(path) as journal:
+        session = MigrationSession(FakeIcinga1(), icinga2)
+        MigrationPipeline(stages, simulate=False, session=session, journal=journal).run()
+        assert len(journal) == 1
+    assert icinga2.writes == ['host2']
+
+
+def test_rollback_keeps_unnamed_downtimes(tmpdir):
+    path = str(tmpdir.join('migration.journal'))
+    icinga2 = FakeIcinga2()
+    with MigrationJournal(path) as journal:
+        params = dict(host_name='host1', author='alice', comment='maintenance',
+                      start_time=1000, end_time=4600, duration=3600, fixed=True)
+        journal.record('host1', 'schedule_host_downtime', params,
+                       {'results': [{'code': 200, 'status': 'Scheduled'}]})
+        journal.record('host2', 'schedule_host_downtime', dict(params, host_name='host2'),
+                       icinga2.schedule_host_downtime(**dict(params, host_name='host2')))
+
+        assert journal.rollback(icinga2) == {'schedule_host_downtime': 1}
+    assert icinga2.client.actions.removed[0]['filter_vars'] == {'names': ['host2!1']}
+    with MigrationJournal(path) as journal:
+        assert [entry['key'] for entry in journal.entries.values()] == ['host1']
+
+
+def test_rollback_keeps_writes_not_undone(tmpdir):
+    path = str(tmpdir.join('migration.journal'))
+    # Icinga2 does not report host2 as removed (e.g. no longer existing)
+    icinga2 = FakeIcinga2(missing=['host2!2', 'host2'])
+    with MigrationJournal(path) as journal:
+        params = dict(host_name='host1', author='alice', comment='maintenance',
+                      start_time=1000, end_time=4600, duration=3600, fixed=True)
+        for host_name in ('host1', 'host2'):
+            journal.record(host_name, 'schedule_host_downtime',
+                           dict(params, host_name=host_name),
+                           icinga2.schedule_host_downtime(**dict(params, host_name=host_name)))
+            journal.record(host_name, 'acknowledge_host',
+                           {'host_name': host_name, 'author': 'alice', 'comment': 'ack'}, True)
+
+        assert journal.rollback(icinga2) == {'schedule_host_downtime': 1,
+                                             'acknowledge_host': 1}
+    with MigrationJournal(path) as journal:
+        assert [(entry['method'], entry['key']) for entry in journal.entries.values()] == [
+            ('schedule_host_downtime', 'host2'), ('acknowledge_host', 'host2')]
@@ -0,0 +1,51 @@
+import json
+import logging
+
+import pytest
+
+from icinga_migration_utils.logs import (LazyMessage, LazyYaml, log_operation, operation_log,
+                                         timed_operation)
+from icinga_migration_utils.migrate.executor import submit_write
+
+
+class Unformattable(object):
+    def __str__(self):
+        raise AssertionError('formatted although debug is disabled')
+
+
+def test_lazy_formatting(caplog):
+    logger = logging.getLogger('tests.logs')
+    with caplog.at_level(logging.INFO, logger='tests.logs'):
+        logger.debug(LazyMessage("Got response: {}", Unformattable()))
+        logger.debug(LazyYaml({'a': Unformattable()}))
+    assert caplog.records == []
+
+    with caplog.at_level(logging.DEBUG, logger='tests.logs'):
+        logger.debug(LazyMessage("Got response: {}", {'results': []}))
+        logger.debug(LazyYaml({'b': 2, 'a': '1'}, '  '))
+    assert caplog.messages == ["Got response: {'results': []}", "  a: '1'\n  b: 2"]
+
+
+def test_operation_log(tmpdir):
+    path = str(tmpdir.join('operations.jsonl'))
+    log_operation('set_host_notifications', 'host1')
+
+    def write(hostname, enabled):
+        return {'results': [{'code': 200}]}
+
+    with operation_log(path):
+        submit_write(None, 'host1', write, 'host1', False)
+        with pytest.raises(ValueError):
+            with timed_operation('schedule_host_downtime', 'host2'):
+                raise ValueError('not found')
+        log_operation('skipped', 'host3', result='skipped', level=logging.DEBUG)
+    log_operation('set_host_notifications', 'host4')
+
+    with open(path) as f:
+        entries = [json.loads(line) for line in f]
+    assert [(entry['operation'], entry['object'], entry['result']) for entry in entries] == [
+        ('write', 'host1', 'ok'), ('schedule_host_downtime', 'host2', 'error')]
+    assert entries[0]['args'] == ['host1', False]
+    assert entries[0]['duration'] >= 0
+    assert entries[1]['level'] == 'ERROR'
+    assert entries[1]['error'] == 'not found'
@@ -0,0 +1,31 @@
+from icinga_migration_utils.matching import ServiceIndex, extract_check_command
+
+
+def icinga2_service(name, check_command, **variables):
+    return {'name': 'host1!' + name,
+            'attrs': {'name': name, 'check_command': check_command, 'vars': variables}}
+
+
+def test_extract_check_command():
+    assert extract_check_command('check_nrpe!check_disk!-w 10%') == 'check_disk'
+    assert extract_check_command('check_tcp!22') == 'check_tcp'
+    assert extract_check_command('check_ping_100_20!100.0,20%!500.0,60%') == 'ping'
+    assert extract_check_command('nrpe', 'check_disk') == 'check_disk'
+    assert extract_check_command('ping') == 'ping'
+    assert extract_check_command(None) is None
+
+
+def test_service_index():
+    disk = icinga2_service('disk', 'nrpe', nrpe_command='check_disk')
+    ping = icinga2_service('ping', 'ping4', comment='check_ping_100_20!100.0,20%')
+    ping6 = icinga2_service('ping6', 'ping6', comment='ping')
+    index = ServiceIndex({'host1': [disk, ping, ping6]})
+
+    assert disk['check_command_extracted'] == 'check_disk'
+    assert index.find('host1', check_command_extracted='check_disk') == [disk]
+    assert index.find('host2', check_command_extracted='check_disk') == []
+    assert index.find('host1', comment='check_ping_100_20!100.0,20%') == [ping]
+    # ambiguous: ping4 by check command, ping6 by comment - returned in Icinga2 order
+    assert index.find('host1', check_command_extracted='ping4', comment='ping') == [ping, ping6]
+    assert index.find('host1', check_command_extracted='ping6', comment='ping') == [ping6]
+    assert index.find('host1', check_command_extracted=None, comment=None) == []
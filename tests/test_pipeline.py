@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pytest
+
+from icinga_migration_utils.migrate.executor import WriteExecutor, submit_write, wait_writes
+from icinga_migration_utils.migrate.pipeline import (FAILED, OK, SKIPPED, MigrationPipeline,
+                                                     Stage, format_report)
+from icinga_migration_utils.session import MigrationSession
+
+
+class FakeSession(MigrationSession):
+    def __init__(self):
+        super(FakeSession, self).__init__(icinga1=object(), icinga2=object())
+        self.loaded = []
+
+    def icinga2_hosts_dict(self):
+        def load():
+            self.loaded.append('icinga2_hosts_dict')
+            return {'host1': {}}
+        return self._memoize('icinga2_hosts_dict', load)
+
+
+def test_pipeline():
+    events = []
+    lock = threading.Lock()
+    both_running = threading.Event()
+
+    def stage(name, writes=0, fail=False, wait_for=None):
+        def migrate(simulate, suffix, hostname, executor, session):
+            with lock:
+                events.append(('start', name))
+            session.icinga2_hosts_dict()
+            if wait_for is not None:
+                assert wait_for.wait(5)
+            futures = [(submit_write(executor, 'host1', lambda i: i, i), name)
+                       for i in range(writes)]
+            results = wait_writes(futures)
+            if fail:
+                raise ValueError('failed')
+            with lock:
+                events.append(('end', name))
+            return results
+        return migrate
+
+    def downtimes(**kwargs):
+        both_running.set()
+        return stage('downtimes')(**kwargs)
+
+    stages = [
+        Stage('hosts', stage('hosts', writes=2, wait_for=both_running),
+              data=['icinga2_hosts_dict']),
+        Stage('services', stage('services', writes=3), depends=['hosts']),
+        Stage('downtimes', downtimes),
+        Stage('acks', stage('acks', fail=True)),
+        Stage('acks_cleanup', stage('acks_cleanup'), depends=['acks']),
+    ]
+    session = FakeSession()
+    with WriteExecutor(rate=1000) as executor:
+        results = MigrationPipeline(stages, simulate=False, session=session,
+                                    executor=executor).run()
+
+    assert [result.status for result in results.values()] == [OK, OK, OK, FAILED, SKIPPED]
+    assert results['hosts'].writes == {'submitted': 2, 'succeeded': 2, 'failed': 0}
+    assert results['services'].result == [0, 1, 2]
+    assert events.index(('end', 'hosts')) < events.index(('start', 'services'))
+    assert ('start', 'acks_cleanup') not in events
+    assert session.loaded == ['icinga2_hosts_dict']
+
+    report = format_report(results, session).splitlines()
+    assert report[1].split() == ['hosts', 'ok', report[1].split()[2], '2', '0']
+    assert report[-1].split()[0] == 'icinga2_hosts_dict'
+
+
+def test_pipeline_validates_order():
+    with pytest.raises(ValueError):
+        MigrationPipeline([Stage('services', time.sleep, depends=['hosts'])],
+                          session=FakeSession())
@@ -0,0 +1,148 @@
+import json
+from collections import defaultdict
+
+from icinga_migration_utils.icinga2.icinga2 import Icinga2Config
+from icinga_migration_utils.migrate.executor import WriteExecutor
+from icinga_migration_utils.migrate.pipeline import STAGES
+from icinga_migration_utils.migrate.plan import apply_plan, plan_migration, read_plan
+from icinga_migration_utils.session import MigrationSession
+
+
+def icinga1_service(check_command, notifications_enabled='1'):
+    return {'host_name': 'host1', 'service_description': check_command,
+            'check_command': 'check_nrpe!' + check_command,
+            'check_command_extracted': check_command,
+            'notifications_enabled': notifications_enabled}
+
+
+class FakeIcinga1(object):
+    host_acknowledgements = [{'host_name': 'host1', 'author': 'alice', 'comment_data': 'down'}]
+
+    def get_hosts(self):
+        return [{'host_name': 'host1', 'notifications_enabled': '1'}]
+
+    def get_hosts_dict(self):
+        return {'host1': {'host_name': 'host1', 'notifications_enabled': '1'}}
+
+    def get_hoststatus_by_host(self):
+        return {'host1': {'host_name': 'host1', 'notifications_enabled': '0'}}
+
+    def get_services_by_hostname(self):
+        return defaultdict(list, host1=[icinga1_service('check_disk'),
+                                        icinga1_service('check_load')])
+
+    def get_servicestatus_by_host(self):
+        return defaultdict(list, host1=[icinga1_service('check_disk', '0'),
+                                        icinga1_service('check_load', '0')])
+
+
+class FakeIcinga2(object):
+    def __init__(self):
+        self.calls = []
+
+    def get_hosts_dict(self, lazy=False):
+        return {'host1': {'name': 'host1', 'attrs': {'name': 'host1'}}}
+
+    def get_services_by_hostname(self):
+        return {'host1': [{'name': 'host1!disk', 'attrs': {
+            'name': 'disk', 'check_command': 'nrpe', 'enable_notifications': True,
+            'vars': {'nrpe_command': 'check_disk'}}}]}
+
+    def get_objects_list(self, **kwargs):
+        return []
+
+    # single writes are only recorded while planning
+    def set_host_notifications(self, hostname, enabled, notes):
+        raise AssertionError('write performed')
+
+    def set_service_notifications(self, hostname, servicename, enabled, notes):
+        raise AssertionError('write performed')
+
+    def acknowledge_host(self, host_name, author, comment):
+        raise AssertionError('write performed')
+
+    def set_hosts_notifications(self, hostnames, enabled, notes):
+        self.calls.append(('set_hosts_notifications', hostnames, enabled))
+        return dict((hostname, {'code': 200}) for hostname in hostnames)
+
+    def set_services_notifications(self, services, enabled, notes):
+        self.calls.append(('set_services_notifications', services, enabled))
+        return dict((service, {'code': 200}) for service in services)
+
+    def acknowledge_hosts(self, acknowledgements):
+        self.calls.append(('acknowledge_hosts', acknowledgements))
+        return dict((ack['host_name'], None) for ack in acknowledgements)
+
+
+def test_plan_and_apply(tmpdir):
+    path = str(tmpdir.join('migration.plan.gz'))
+    stages = [stage for stage in STAGES if stage.name in (
+        'host_notification_states', 'service_notification_states', 'host_acknowledgements')]
+    counts = plan_migration(path, stages=stages,
+                            session=MigrationSession(FakeIcinga1(), FakeIcinga2()))
+    assert list(counts.values()) == [1, 1, 1]
+
+    header, entries = read_plan(path)
+    entries = list(entries)
+    assert header['suffix'] == ' [ICINGA1_MIGRATION]'
+    assert [(entry['type'], entry['stage']) for entry in entries] == [
+        ('write', 'host_notification_states'), ('write', 'service_notification_states'),
+        ('note', 'service_notification_states'), ('write', 'host_acknowledgements')]
+    assert entries[1]['params'] == {
+        'hostname': 'host1', 'servicename': 'disk', 'enabled': False,
+        'notes': 'Migrated notification state from Icinga1 [ICINGA1_MIGRATION]'}
+    assert entries[2]['message'] == 'Service host1!check_load not found'
+
+    icinga2 = FakeIcinga2()
+    stats = apply_plan(path, session=MigrationSession(icinga2=icinga2))
+    assert icinga2.calls == [
+        ('set_hosts_notifications', ['host1'], False),
+        ('set_services_notifications', [('host1', 'disk')], False),
+        ('acknowledge_hosts', [{'host_name': 'host1', 'author': 'alice',
+                                'comment': 'down [ICINGA1_MIGRATION]'}])]
+    assert json.loads(json.dumps(stats)) == {
+        'host_notification_states': {'succeeded': 1, 'failed': 0},
+        'service_notification_states': {'succeeded': 1, 'failed': 0},
+        'host_acknowledgements': {'succeeded': 0, 'failed': 1}}
+
+
+class FlakyActions(object):
+    def __init__(self):
+        self.calls = 0
+        self.scheduled = []
+
+    def schedule_downtime(self, object_type, filter, filter_vars, **params):
+        self.calls += 1
+        if self.calls == 2:
+            raise Exception('Icinga2 returned status 503')
+        self.scheduled.extend(filter_vars['hostnames'])
+        return {'results': [{'code': 200, 'status': "Scheduled downtime for object '{}'."
+                             .format(hostname)} for hostname in filter_vars['hostnames']]}
+
+
+def flaky_icinga2():
+    icinga2 = Icinga2Config.__new__(Icinga2Config)
+    icinga2.client = type('Client', (object,), {'actions': FlakyActions()})()
+    return icinga2
+
+
+def test_apply_retries_single_request(tmpdir):
+    path = str(tmpdir.join('migration.plan'))
+    with open(path, 'w') as f:
+        f.write(json.dumps({'type': 'header', 'version': 1}) + '\n')
+        for start_time, host_name in enumerate(['host1', 'host2', 'host3']):
+            f.write(json.dumps({'type': 'write', 'stage': 'host_downtimes',
+                                'method': 'schedule_host_downtime', 'params': {
+                                    'host_name': host_name, 'author': 'alice',
+                                    'comment': 'maintenance', 'start_time': start_time,
+                                    'end_time': 3600, 'duration': 3600, 'fixed': True}})
+                    + '\n')
+
+    icinga2 = flaky_icinga2()
+    with WriteExecutor(backoff=0) as executor:
+        stats = apply_plan(path, session=MigrationSession(icinga2=icinga2),
+                           executor=executor)
+    # the failed request is retried alone, the others are sent once
+    assert sorted(icinga2.client.actions.scheduled) == ['host1', 'host2', 'host3']
+    assert icinga2.client.actions.calls == 4
+    assert stats == {'host_downtimes': {'succeeded': 3, 'failed': 0}}
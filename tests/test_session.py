@@ -0,0 +1,108 @@
+import os
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from icinga_migration_utils.migrate.notification_states import (
+    migrate_host_notification_states, migrate_service_notification_states)
+from icinga_migration_utils.session import MigrationSession
+
+ICINGA1_SERVICE = {'host_name': 'host1', 'service_description': 'Disk',
+                   'check_command': 'check_nrpe!check_disk',
+                   'check_command_extracted': 'check_disk', 'notifications_enabled': '1'}
+
+
+class FakeIcinga1(object):
+    def __init__(self):
+        self.calls = Counter()
+
+    def get_hosts(self):
+        self.calls['get_hosts'] += 1
+        return [{'host_name': 'host1', 'notifications_enabled': '1'}]
+
+    def get_hosts_dict(self):
+        self.calls['get_hosts_dict'] += 1
+        return {'host1': {'host_name': 'host1', 'notifications_enabled': '1'}}
+
+    def get_hoststatus_by_host(self):
+        self.calls['get_hoststatus_by_host'] += 1
+        return {'host1': {'host_name': 'host1', 'notifications_enabled': '0'}}
+
+    def get_services_by_hostname(self):
+        self.calls['get_services_by_hostname'] += 1
+        return defaultdict(list, host1=[dict(ICINGA1_SERVICE)])
+
+    def get_servicestatus_by_host(self):
+        self.calls['get_servicestatus_by_host'] += 1
+        return defaultdict(list, host1=[dict(ICINGA1_SERVICE, notifications_enabled='0')])
+
+
+class FakeIcinga2(object):
+    def __init__(self):
+        self.calls = Counter()
+        self.writes = []
+
+    def get_hosts_dict(self, lazy=False):
+        self.calls['get_hosts_dict'] += 1
+        return {'host1': {'name': 'host1', 'attrs': {'name': 'host1'}}}
+
+    def get_services_by_hostname(self):
+        self.calls['get_services_by_hostname'] += 1
+        return {'host1': [{'name': 'host1!disk', 'attrs': {
+            'name': 'disk', 'check_command': 'nrpe', 'enable_notifications': True,
+            'vars': {'nrpe_command': 'check_disk'}}}]}
+
+    def set_host_notifications(self, hostname, enabled, notes):
+        self.writes.append(('host', hostname, enabled))
+        return {'results': [{'code': 200}]}
+
+    def set_service_notifications(self, hostname, service_name, enabled, notes):
+        self.writes.append(('service', hostname, service_name, enabled))
+        return {'results': [{'code': 200}]}
+
+
+def test_session_fetches_once():
+    icinga1 = FakeIcinga1()
+    icinga2 = FakeIcinga2()
+    session = MigrationSession(icinga1, icinga2)
+
+    migrate_host_notification_states(simulate=False, session=session)
+    migrate_service_notification_states(simulate=False, session=session)
+    migrate_service_notification_states(simulate=True, session=session)
+
+    assert icinga2.writes == [('host', 'host1', False), ('service', 'host1', 'disk', False)]
+    assert set(icinga1.calls.values()) == {1}
+    assert icinga2.calls == {'get_hosts_dict': 1, 'get_services_by_hostname': 1}
+
+    session.invalidate('icinga2_services_by_host', 'icinga2_service_index')
+    migrate_service_notification_states(simulate=True, session=session)
+    assert icinga2.calls['get_services_by_hostname'] == 2
+    assert icinga2.calls['get_hosts_dict'] == 1
+
+
+def test_concurrent_icinga1_loads(tmpdir, monkeypatch):
+    from icinga_migration_utils.icinga1 import icinga1 as icinga1_module
+
+    fixture = os.path.join(os.path.dirname(__file__), 'fixtures', 'status_monitoring01.cache')
+    content = open(fixture).read()
+    for number in (1, 2):
+        tmpdir.join('status_monitoring0{}.cache'.format(number)).write(
+            content.replace('awesome.host', 'host{}'.format(number)))
+
+    parse = icinga1_module.parse_icinga_cache
+
+    def slow_parse(*args):
+        time.sleep(0.05)
+        return parse(*args)
+
+    monkeypatch.setattr(icinga1_module, 'parse_icinga_cache', slow_parse)
+    icinga1 = icinga1_module.Icinga1Config(
+        status_files=str(tmpdir.join('status_monitoring*.cache')))
+    session = MigrationSession(icinga1, FakeIcinga2())
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        status = pool.submit(session.icinga1_hoststatus_by_host)
+        time.sleep(0.02)
+        downtimes = pool.submit(session.icinga1_hostdowntimes)
+        status.result()
+        assert sorted(dt['host_name'] for dt in downtimes.result()) == ['host1', 'host2']
@@ -0,0 +1,60 @@
+import csv
+import io
+import json
+
+from icinga_migration_utils.compare.sinks import (CsvSink, JsonlSink, JsonSink, MultiSink,
+                                                  TextSink, open_sink)
+
+SERVICES_DIFF = {'icinga1_missing_icinga2': ['check_disk'],
+                 'notification_states': [
+                     {'command': 'check_tcp!22 - SSH', 'icinga1': False, 'icinga2': True}]}
+
+
+def test_json_sink(tmpdir):
+    path = str(tmpdir.join('services.txt.json'))
+    with JsonSink(path, batch_size=1) as sink:
+        sink.write('services', 'host1', SERVICES_DIFF)
+        # written as soon as the batch is full
+        assert open(path).read().startswith('{"host1": ')
+        sink.write('services', 'host2', {'icinga1_missing_icinga2': ['ping']})
+    result = json.load(open(path))
+    assert list(result) == ['host1', 'host2']
+    assert result['host1'] == dict(host_name='host1', **SERVICES_DIFF)
+
+    with JsonSink(path):
+        pass
+    assert json.load(open(path)) == {}
+
+
+def test_jsonl_and_csv_sinks(tmpdir):
+    jsonl_path = str(tmpdir.join('hosts.jsonl'))
+    csv_path = str(tmpdir.join('hosts.csv'))
+    with MultiSink([open_sink(jsonl_path), open_sink(csv_path)]) as sink:
+        assert isinstance(sink.sinks[0], JsonlSink)
+        assert isinstance(sink.sinks[1], CsvSink)
+        sink.write('hosts', 'host1', {'missing': ['host1']})
+        sink.write('hosts', 'host2', {'check_interval': [('host2', '5', 60.0)],
+                                      'nosla': ['host2']})
+        sink.write('services', 'host3', SERVICES_DIFF)
+
+    records = [json.loads(line) for line in open(jsonl_path)]
+    assert [record['name'] for record in records] == ['host1', 'host2', 'host3']
+    assert records[1]['differences']['check_interval'] == [['host2', '5', 60.0]]
+
+    rows = list(csv.reader(open(csv_path)))
+    assert rows[0] == ['compare', 'name', 'difference', 'object', 'icinga1', 'icinga2']
+    assert rows[1:4] == [['hosts', 'host1', 'missing', 'host1', '', ''],
+                         ['hosts', 'host2', 'check_interval', 'host2', '5', '60.0'],
+                         ['hosts', 'host2', 'nosla', 'host2', '', '']]
+    assert rows[5] == ['services', 'host3', 'notification_states', 'check_tcp!22 - SSH',
+                       'False', 'True']
+
+
+def test_text_sink():
+    stream = io.StringIO()
+    sink = TextSink(stream)
+    sink.write('contacts', 'alice', {'wrong_pager': [('alice', '49171', '49172')]})
+    assert stream.getvalue() == ''
+    sink.close()
+    assert stream.getvalue() == 'alice\n  wrong_pager: alice (Icinga1: 49171, Icinga2: 49172)\n'
+    assert not stream.closed
@@ -0,0 +1,57 @@
+from concurrent.futures import Future
+
+from icinga_migration_utils.migrate import MIGRATION_COMMENT_SUFFIX
+from icinga_migration_utils.migrate.snapshot import Icinga2Snapshot
+
+
+class FakeIcinga2(object):
+    def __init__(self):
+        self.queries = []
+
+    def get_objects_list(self, object_type, **kwargs):
+        self.queries.append((object_type, kwargs))
+        if object_type == 'Downtime':
+            return [{'attrs': {
+                'host_name': 'host1', 'service_name': 'ping', 'author': 'jdoe',
+                'comment': 'maintenance' + MIGRATION_COMMENT_SUFFIX,
+                'start_time': 1476092609.0, 'end_time': 1633859009.0}}]
+        return [{'attrs': {
+            'host_name': 'host1', 'service_name': '', 'author': 'jdoe',
+            'text': 'known issue' + MIGRATION_COMMENT_SUFFIX}}]
+
+
+def test_snapshot():
+    icinga2 = FakeIcinga2()
+    snapshot = Icinga2Snapshot(icinga2).load()
+
+    assert [query[0] for query in icinga2.queries] == ['Downtime', 'Comment']
+    assert icinga2.queries[0][1]['filter'] == 'match(pattern, downtime.comment)'
+    assert icinga2.queries[1][1]['filter_vars'] == {'pattern': '*' + MIGRATION_COMMENT_SUFFIX}
+
+    comment = 'maintenance' + MIGRATION_COMMENT_SUFFIX
+    assert snapshot.has_downtime('host1', 'ping', 'jdoe', comment, '1476092609', 1633859009)
+    assert not snapshot.has_downtime('host1', None, 'jdoe', comment, 1476092609, 1633859009)
+    assert snapshot.has_acknowledgement(
+        'host1', None, 'jdoe', 'known issue' + MIGRATION_COMMENT_SUFFIX)
+
+    snapshot.add_downtime('host1', None, 'jdoe', comment, 1476092609, 1633859009)
+    assert snapshot.has_downtime('host1', None, 'jdoe', comment, 1476092609, 1633859009)
+
+
+def test_snapshot_tracks_writes():
+    snapshot = Icinga2Snapshot(FakeIcinga2())
+    writes = [Future(), Future(), Future()]
+    snapshot.track_downtime(writes[0], 'host1', None, 'jdoe', 'a', 0, 60)
+    snapshot.track_downtime(writes[1], 'host2', None, 'jdoe', 'a', 0, 60)
+    snapshot.track_acknowledgement(writes[2], 'host3', None, 'jdoe', 'b')
+
+    # pending writes are not submitted twice
+    assert snapshot.has_downtime('host1', None, 'jdoe', 'a', 0, 60)
+
+    writes[0].set_result({'results': [{'code': 200}]})
+    writes[1].set_exception(IOError('Read timed out'))
+    writes[2].set_result(False)
+    assert snapshot.has_downtime('host1', None, 'jdoe', 'a', 0, 60)
+    assert not snapshot.has_downtime('host2', None, 'jdoe', 'a', 0, 60)
+    assert not snapshot.has_acknowledgement('host3', None, 'jdoe', 'b')
+    assert not snapshot.pending
@@ -0,0 +1,57 @@
+import io
+
+from ruamel.yaml import YAML
+
+from icinga_migration_utils.utils import (BatchWriter, emit_yaml, getpath, getter,
+                                          pretty_print_dict)
+
+
+def test_emit_yaml():
+    record = {
+        'service_description': 'Disk', 'check_command': 'check_nrpe!check_disk!-w 10%',
+        'check_interval': '5.000000', 'notifications_enabled': '1', 'notes': 'no-sla',
+        'stalking_options': 'n', 'comment': "it's: a #comment", 'empty': '', 'flag': 'on',
+        'multiline': 'a\nb', 'attrs': {'vars': {'list': ['a', {'b': 1}], 'empty': {}},
+                                       'enable_notifications': True, 'last_check': 1.5,
+                                       'notes_url': None},
+    }
+    document = emit_yaml(record)
+    assert YAML(typ='safe', pure=True).load(document) == record
+    assert document.splitlines()[:9] == [
+        'attrs:',
+        '  enable_notifications: true',
+        '  last_check: 1.5',
+        '  notes_url: null',
+        '  vars:',
+        '    empty: {}',
+        '    list:',
+        '    - a',
+        '    - b: 1',
+    ]
+    assert "check_interval: '5.000000'" in document
+    assert 'check_command: check_nrpe!check_disk!-w 10%' in document
+    assert pretty_print_dict({'b': 'x', 'a': '1'}, '  ') == "  a: '1'\n  b: x\n"
+
+
+def test_batch_writer():
+    stream = io.StringIO()
+    with BatchWriter(stream, batch_size=2) as writer:
+        writer.write('a')
+        assert stream.getvalue() == ''
+        writer.write('b')
+        assert stream.getvalue() == 'ab'
+        writer.write('c')
+    assert stream.getvalue() == 'abc'
+
+
+def test_getpath():
+    service = {'attrs': {'vars': {'comment': 'check_disk', 'list': ['a']}, 'notes': None}}
+    get_comment = getter('attrs.vars.comment')
+    assert get_comment is getter('attrs.vars.comment')
+    assert get_comment(service) == 'check_disk'
+    assert getpath(service, 'attrs.vars') is service['attrs']['vars']
+    assert getpath(service, 'attrs.vars.nosla') is None
+    assert getpath(service, 'attrs.notes.url', False) is False
+    assert getpath(service, 'attrs.vars.comment.x') is None
+    assert getpath(service, 'attrs.vars.list.0') is None
+    assert getpath({'attrs': {'vars': None}}, 'attrs.vars.notifications.users') is None